@@ -14,6 +14,8 @@ Aquamind 系统协调器 (AquamindOrchestrator)
 import sys
 import os
 import re
+import time
+import types
 from datetime import datetime
 from typing import Dict, Any, Optional
 
@@ -23,21 +25,51 @@ if root_dir not in sys.path:
     sys.path.append(root_dir)
 
 from Agent.ToxicityAgent import ToxicityAgent
-from Agent.ControlAgent import ControlAgent
+from Agent.ControlAgent import ControlAgent, SUB_AGENT_NAMES
 from LLM.llm_interface import LLMInterface
+from cache import ResponseCache, make_cache_key
+from config import system_config
+from utils_report import get_report_writer
 
-# 尝试导入进阶智能体
-try:
-    from Agent.TurntableAgent import TurntableAgent
-    from Agent.MBRAgent import MBRAgent
-    from Agent.RegenerationAgent import RegenerationAgent
-    from Agent.DiagnosticAgent import DiagnosticAgent
-    from Agent.FeedbackAgent import FeedbackAgent
-    from Knowledge.knowledge_base import get_knowledge_base
-    HAS_ADVANCED_AGENTS = True
-except ImportError:
-    HAS_ADVANCED_AGENTS = False
-    get_knowledge_base = None
+# 进阶智能体延迟导入：首次创建协调器时才加载（None 表示尚未尝试）
+HAS_ADVANCED_AGENTS = None
+TurntableAgent = None
+MBRAgent = None
+RegenerationAgent = None
+DiagnosticAgent = None
+FeedbackAgent = None
+get_knowledge_base = None
+
+
+def _load_advanced_agents() -> bool:
+    """尝试导入进阶智能体，返回是否可用（仅首次调用时执行导入）"""
+    global HAS_ADVANCED_AGENTS, TurntableAgent, MBRAgent, RegenerationAgent
+    global DiagnosticAgent, FeedbackAgent, get_knowledge_base
+    
+    if HAS_ADVANCED_AGENTS is not None:
+        return HAS_ADVANCED_AGENTS
+    
+    try:
+        from Agent.TurntableAgent import TurntableAgent
+        from Agent.MBRAgent import MBRAgent
+        from Agent.RegenerationAgent import RegenerationAgent
+        from Agent.DiagnosticAgent import DiagnosticAgent
+        from Agent.FeedbackAgent import FeedbackAgent
+        from Knowledge.knowledge_base import get_knowledge_base
+        HAS_ADVANCED_AGENTS = True
+    except ImportError:
+        HAS_ADVANCED_AGENTS = False
+        get_knowledge_base = None
+    
+    return HAS_ADVANCED_AGENTS
+
+# 意图 -> ControlAgent 需要调用的子控制智能体
+INTENT_SUB_AGENTS = {
+    "control_turntable": frozenset({"turntable"}),
+    "control_mbr": frozenset({"mbr"}),
+    "check_regeneration": frozenset({"regeneration"}),
+    "full_analysis": SUB_AGENT_NAMES,
+}
 
 
 class AquamindOrchestrator:
@@ -48,39 +80,63 @@ class AquamindOrchestrator:
     兼容旧版API，同时支持进阶功能。
     """
     
+    # 诊断报告缓存有效期（秒），避免频繁轮询状态时重复生成诊断
+    DIAGNOSTIC_CACHE_TTL = 5.0
+    
     def __init__(self):
         """初始化协调器"""
         self.llm_interface = LLMInterface()
+        _load_advanced_agents()
         
-        # 核心智能体
-        self.toxicity_agent = ToxicityAgent(self.llm_interface)
-        self.control_agent = ControlAgent(self.llm_interface)
+        # 知识库只获取一次，注入到所有子智能体
+        self.kb = get_knowledge_base() if get_knowledge_base else None
+        
+        # 系统状态（内部可变字典，对外暴露只读视图；与 ControlAgent 共享）
+        self._system_state_dict = {
+            "toxicity": 2.0,
+            "toxicity_level": "中",
+            "turntable_frequency": 25.0,
+            "mbr_tmp": 20.0,
+            "carbon_efficiency": 85.0,
+            "last_update": None
+        }
+        self.system_state = types.MappingProxyType(self._system_state_dict)
         
         # 进阶智能体（如果可用）
         if HAS_ADVANCED_AGENTS:
-            self.turntable_agent = TurntableAgent(self.llm_interface)
-            self.mbr_agent = MBRAgent(self.llm_interface)
-            self.regeneration_agent = RegenerationAgent(self.llm_interface)
-            self.diagnostic_agent = DiagnosticAgent(self.llm_interface)
-            self.feedback_agent = FeedbackAgent(self.llm_interface)
-            self.kb = get_knowledge_base() if get_knowledge_base else None
+            self.turntable_agent = TurntableAgent(self.llm_interface, kb=self.kb)
+            self.mbr_agent = MBRAgent(self.llm_interface, kb=self.kb)
+            self.regeneration_agent = RegenerationAgent(self.llm_interface, kb=self.kb)
+            self.diagnostic_agent = DiagnosticAgent(self.llm_interface, kb=self.kb)
+            self.feedback_agent = FeedbackAgent(self.llm_interface, kb=self.kb)
         else:
             self.turntable_agent = None
             self.mbr_agent = None
             self.regeneration_agent = None
             self.diagnostic_agent = None
             self.feedback_agent = None
-            self.kb = None
         
-        # 系统状态
-        self.system_state = {
-            "toxicity": 2.0,
-            "toxicity_level": "中",
-            "turntable_frequency": 25.0,
-            "mbr_tmp": 20.0,
-            "carbon_efficiency": 85.0,
-            "last_update": None
-        }
+        # 核心智能体（ControlAgent 复用上面的子控制智能体实例）
+        self.toxicity_agent = ToxicityAgent(self.llm_interface, kb=self.kb)
+        self.control_agent = ControlAgent(
+            self.llm_interface,
+            kb=self.kb,
+            turntable_agent=self.turntable_agent,
+            mbr_agent=self.mbr_agent,
+            regeneration_agent=self.regeneration_agent,
+            system_state=self._system_state_dict
+        )
+        
+        # 规划结果缓存: 相同工况复用毒性预测/控制建议结果
+        self.plan_cache = ResponseCache(
+            "orchestrator_plans", ttl=system_config.PLAN_CACHE_TTL, persistent=True
+        )
+        
+        # 报告后台写盘（各总控智能体共用，见 utils_report；进程退出前会完成已提交的写入）
+        self._report_writer = get_report_writer()
+        
+        # 最近一次诊断报告缓存: (生成时刻 monotonic, 报告字典)
+        self._diagnostic_cache: Optional[tuple] = None
         
         print("[AquamindOrchestrator] 系统初始化完成")
         
@@ -150,12 +206,13 @@ class AquamindOrchestrator:
         else:
             return "general_query"
 
-    def run(self, user_input: str) -> str:
+    def run(self, user_input: str, persist: bool = True) -> str:
         """
         执行主流程
         
         Args:
             user_input: 用户输入的自然语言请求
+            persist: 是否将报告保存到 Report 目录；为 False 时仅返回报告内容
             
         Returns:
             str: 最终生成的报告路径或内容摘要
@@ -172,7 +229,64 @@ class AquamindOrchestrator:
         print(f"[{timestamp}] 识别意图: {intent}")
         print(f"[{timestamp}] 识别关键信息: 工艺={treatment_process}, 预测时间={time_frame}")
         
-        # 2. 调用 ToxicityAgent
+        # 2. 查询规划缓存，相同工况直接复用上一次的智能体结果
+        cache_key = self._plan_cache_key(user_input, parsed_params, intent)
+        plan = self.plan_cache.get(cache_key) if cache_key else None
+        
+        if plan is None:
+            plan = self._plan(user_input, intent, treatment_process, time_frame, timestamp)
+            if isinstance(plan, str):
+                return plan
+            if cache_key:
+                self.plan_cache.set(cache_key, plan)
+        else:
+            print(f"[{timestamp}] 命中规划缓存，跳过智能体调度")
+        
+        toxicity_result = plan["toxicity_result"]
+        control_suggestion = plan["control_suggestion"]
+        advanced_results = plan["advanced_results"]
+        
+        # 更新系统状态
+        self._system_state_dict["toxicity"] = toxicity_result.get("toxicity_value", 2.0)
+        self._system_state_dict["toxicity_level"] = toxicity_result.get("toxicity_level", "中")
+        self._system_state_dict["last_update"] = timestamp
+        
+        # 3. 生成报告
+        report = self._generate_report(
+            user_input, parsed_params, toxicity_result, 
+            control_suggestion, advanced_results, intent, persist=persist
+        )
+        
+        return report
+
+    def _plan_cache_key(self, user_input: str, params: Dict[str, Any], intent: str) -> Optional[str]:
+        """
+        计算规划缓存键
+        
+        规划结果含基于完整输入文本的LLM分析，键包含规范化（合并空白）后的输入文本、
+        未量化的全部提取参数及模型名称：仅措辞相同且读数完全一致的请求复用结果，
+        不会跨越毒性等级阈值。反馈类请求需逐条记录，不参与缓存，返回 None。
+        """
+        if intent == "collect_feedback":
+            return None
+        
+        return make_cache_key(
+            " ".join(user_input.split()), params, intent,
+            self.llm_interface.qwen_model_name,
+            self._system_state_dict.get("mbr_tmp"),
+            self._system_state_dict.get("carbon_efficiency")
+        )
+    
+    def _plan(self, user_input: str, intent: str, treatment_process: str,
+              time_frame: str, timestamp: str):
+        """
+        调度各智能体生成分析与控制结果
+        
+        Returns:
+            Dict: toxicity_result / control_suggestion / advanced_results；
+            流程中断时返回说明字符串
+        """
+        # 1. 调用 ToxicityAgent
         print(f"[{timestamp}] 正在调度 ToxicityAgent 进行毒性预测...")
         toxicity_result = self.toxicity_agent.run(user_input)
         
@@ -183,19 +297,15 @@ class AquamindOrchestrator:
         toxicity_level = toxicity_result.get("toxicity_level", "中")
         toxicity_value = toxicity_result.get("toxicity_value", 2.0)
         
-        # 更新系统状态
-        self.system_state["toxicity"] = toxicity_value
-        self.system_state["toxicity_level"] = toxicity_level
-        self.system_state["last_update"] = timestamp
-        
         print(f"[{timestamp}] ToxicityAgent 完成预测，毒性等级: {toxicity_level}")
         
-        # 3. 调用 ControlAgent
+        # 2. 调用 ControlAgent
         print(f"[{timestamp}] 正在调度 ControlAgent 生成工艺建议...")
         control_result = self.control_agent.run(
             toxicity_analysis=toxicity_analysis,
             treatment_process=treatment_process,
-            time_frame=time_frame
+            time_frame=time_frame,
+            needed=INTENT_SUB_AGENTS.get(intent, frozenset())
         )
         
         if control_result["status"] != "success":
@@ -204,7 +314,7 @@ class AquamindOrchestrator:
         control_suggestion = control_result["suggestion"]
         print(f"[{timestamp}] ControlAgent 完成建议生成。")
         
-        # 4. 可选：调用进阶智能体
+        # 3. 可选：调用进阶智能体
         advanced_results = {}
         
         if HAS_ADVANCED_AGENTS:
@@ -242,20 +352,17 @@ class AquamindOrchestrator:
                 feedback_result = self.feedback_agent.run(feedback_data=user_input)
                 advanced_results["feedback"] = feedback_result
         
-        # 5. 生成报告
-        report = self._generate_report(
-            user_input, parsed_params, toxicity_result, 
-            control_suggestion, advanced_results, intent
-        )
-        
-        return report
+        return {
+            "toxicity_result": toxicity_result,
+            "control_suggestion": control_suggestion,
+            "advanced_results": advanced_results
+        }
 
     def _generate_report(self, user_input: str, params: Dict[str, Any], 
                          toxicity_result: Dict, control_suggestion: str,
-                         advanced_results: Dict, intent: str) -> str:
-        """生成并保存报告"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
+                         advanced_results: Dict, intent: str,
+                         persist: bool = True) -> str:
+        """生成报告，persist 为 True 时在后台线程保存到磁盘"""
         report_content = f"""# Aquamind Systems 智能预测与控制报告
 生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
@@ -319,18 +426,14 @@ class AquamindOrchestrator:
 *Aquamind Systems - 您的智慧水务专家*
 """
         
-        # 保存报告
-        report_dir = os.path.join(root_dir, "Report")
-        if not os.path.exists(report_dir):
-            os.makedirs(report_dir)
-            
-        report_path = os.path.join(report_dir, f"Report_{timestamp}.md")
+        if not persist:
+            return report_content
         
-        with open(report_path, "w", encoding="utf-8") as f:
-            f.write(report_content)
-            
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] 报告已生成: {report_path}")
-        return f"执行完成。报告已保存至: {report_path}\n\n报告内容:\n{report_content}"
+        # 保存报告（后台写盘，不阻塞返回）
+        report_path = self._report_writer.submit(report_content)
+        
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] 报告已提交保存: {report_path}")
+        return f"执行完成。报告正在后台保存至: {report_path}\n\n报告内容:\n{report_content}"
     
     def quick_predict(self, toxicity: float = None, ammonia: float = None,
                       temperature: float = None) -> Dict[str, Any]:
@@ -361,6 +464,13 @@ class AquamindOrchestrator:
         
         # 调用毒性预测
         toxicity_result = self.toxicity_agent.run(input_text)
+        if toxicity_result["status"] != "success":
+            return {
+                "status": "error",
+                "message": toxicity_result["analysis"],
+                "toxicity_prediction": toxicity_result,
+                "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
         
         # 如果有转盘智能体，直接生成控制参数
         turntable_params = {}
@@ -379,14 +489,27 @@ class AquamindOrchestrator:
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
     
+    def _get_cached_diagnostic(self) -> Dict[str, Any]:
+        """获取诊断报告（在 DIAGNOSTIC_CACHE_TTL 内复用上一次结果）"""
+        now = time.monotonic()
+        if self._diagnostic_cache is not None:
+            cached_at, report = self._diagnostic_cache
+            if now - cached_at < self.DIAGNOSTIC_CACHE_TTL:
+                return report
+        
+        report = self.diagnostic_agent.generate_diagnostic_report().to_dict()
+        self._diagnostic_cache = (now, report)
+        return report
+    
     def get_system_status(self) -> Dict[str, Any]:
-        """获取系统状态"""
-        status = self.system_state.copy()
+        """
+        获取系统状态
         
+        始终返回当前状态的快照（后续状态更新不影响已返回的结果）。
+        """
+        status = dict(self._system_state_dict)
         if self.diagnostic_agent:
-            diag = self.diagnostic_agent.generate_diagnostic_report()
-            status["diagnostic"] = diag.to_dict()
-        
+            status["diagnostic"] = self._get_cached_diagnostic()
         return status
 
 
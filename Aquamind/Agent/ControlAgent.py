@@ -11,7 +11,8 @@
 
 import sys
 import os
-from typing import Dict, Any, List, Optional
+from bisect import bisect_right
+from typing import Dict, Any, List, Optional, Set
 from dataclasses import dataclass, field
 from datetime import datetime
 
@@ -20,22 +21,41 @@ root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.append(root_dir)
 
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+import numpy as np
 from langchain_openai import ChatOpenAI
 
 from LLM.llm_interface import LLMInterface
+from utils_numba import (
+    fallback_turntable_batch,
+    fallback_mbr_batch,
+    fallback_regeneration_batch
+)
 
 # 尝试导入子控制智能体
 try:
     from Agent.TurntableAgent import TurntableAgent
     from Agent.MBRAgent import MBRAgent
     from Agent.RegenerationAgent import RegenerationAgent
-    from Knowledge.knowledge_base import get_knowledge_base
+    from Knowledge.knowledge_base import get_knowledge_base, KnowledgeBase
     HAS_SUB_AGENTS = True
 except ImportError:
     HAS_SUB_AGENTS = False
     get_knowledge_base = None
+    KnowledgeBase = None
+
+# 子控制智能体名称（ControlAgent.run 的 needed 参数取值）
+SUB_AGENT_NAMES = frozenset({"turntable", "mbr", "regeneration"})
+
+# 毒性分级边界：< 1.5 为低，[1.5, 3.0) 为中，>= 3.0 为高
+TOXICITY_LEVEL_BINS = (1.5, 3.0)
+TOXICITY_LEVELS = ("低", "中", "高")
+TOXICITY_PRIORITIES = ("low", "normal", "urgent")
+LEVEL_PRIORITY = dict(zip(TOXICITY_LEVELS, TOXICITY_PRIORITIES))
+
+# 批量查表用的数组形式
+_LEVEL_BINS_ARRAY = np.array(TOXICITY_LEVEL_BINS)
+_LEVELS_ARRAY = np.array(TOXICITY_LEVELS)
+_PRIORITIES_ARRAY = np.array(TOXICITY_PRIORITIES)
 
 
 @dataclass
@@ -125,35 +145,8 @@ class ControlAgent:
 
 请保持输出专业、条理清晰，包含具体的参数设定值。"""
     
-    def __init__(self, llm_interface: LLMInterface = None):
-        """初始化控制智能体"""
-        self.llm_interface = llm_interface or LLMInterface()
-        self.chain = self._create_chain()
-        
-        # 初始化子控制智能体
-        if HAS_SUB_AGENTS:
-            self.turntable_agent = TurntableAgent(self.llm_interface)
-            self.mbr_agent = MBRAgent(self.llm_interface)
-            self.regeneration_agent = RegenerationAgent(self.llm_interface)
-            self.kb = get_knowledge_base() if get_knowledge_base else None
-        else:
-            self.turntable_agent = None
-            self.mbr_agent = None
-            self.regeneration_agent = None
-            self.kb = None
-        
-        # 系统状态
-        self.system_state = {
-            "turntable_frequency": 25.0,
-            "mbr_tmp": 20.0,
-            "carbon_efficiency": 85.0
-        }
-    
-    def _create_chain(self):
-        """创建处理建议生成链"""
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self.SYSTEM_PROMPT),
-            ("human", """
+    # 用户提示词模板（str.format 占位符）
+    HUMAN_PROMPT_TEMPLATE = """
 ## 运行信息
 - **运行工艺**: {treatment_process}
 - **预测时间范围**: {time_frame}
@@ -167,21 +160,73 @@ class ControlAgent:
 2. MBR控制参数（曝气量、通量）
 3. 再生系统建议
 4. 总体操作指导
-""")
-        ])
+"""
+    
+    def __init__(self, llm_interface: LLMInterface = None, kb: "KnowledgeBase" = None,
+                 turntable_agent: "TurntableAgent" = None,
+                 mbr_agent: "MBRAgent" = None,
+                 regeneration_agent: "RegenerationAgent" = None,
+                 system_state: Dict[str, Any] = None):
+        """
+        初始化控制智能体
+        
+        Args:
+            llm_interface: LLM接口
+            kb: 知识库实例（由协调器传入以共享，缺省时自行获取）
+            turntable_agent: 转盘智能体（由协调器传入以共享，缺省时自行创建）
+            mbr_agent: MBR智能体（同上）
+            regeneration_agent: 再生智能体（同上）
+            system_state: 系统状态字典（由协调器传入以共享，缺省时使用默认值）
+        """
+        self.llm_interface = llm_interface or LLMInterface()
+        self.llm = self._create_llm()
         
+        # 初始化子控制智能体（优先复用调用方传入的实例）
+        if HAS_SUB_AGENTS:
+            if kb is None and get_knowledge_base:
+                kb = get_knowledge_base()
+            self.kb = kb
+            self.turntable_agent = turntable_agent or TurntableAgent(self.llm_interface, kb=self.kb)
+            self.mbr_agent = mbr_agent or MBRAgent(self.llm_interface, kb=self.kb)
+            self.regeneration_agent = regeneration_agent or RegenerationAgent(self.llm_interface, kb=self.kb)
+        else:
+            self.turntable_agent = turntable_agent
+            self.mbr_agent = mbr_agent
+            self.regeneration_agent = regeneration_agent
+            self.kb = kb
+        
+        # 系统状态
+        if system_state is not None:
+            self.system_state = system_state
+        else:
+            self.system_state = {
+                "turntable_frequency": 25.0,
+                "mbr_tmp": 20.0,
+                "carbon_efficiency": 85.0
+            }
+    
+    def _create_llm(self) -> ChatOpenAI:
+        """创建建议生成所用的LLM客户端"""
         api_key = self.llm_interface.qwen_api_key or self.llm_interface.openai_api_key or "sk-placeholder"
         base_url = self.llm_interface.qwen_api_base or self.llm_interface.openai_api_base
         model_name = self.llm_interface.qwen_model_name or "qwen-plus"
         
-        llm = ChatOpenAI(
+        return ChatOpenAI(
             api_key=api_key,
             base_url=base_url,
             model=model_name,
             temperature=0.5
         )
-        
-        return prompt | llm | StrOutputParser()
+    
+    def _build_messages(self, toxicity_analysis: str, treatment_process: str,
+                        time_frame: str) -> List[tuple]:
+        """直接格式化提示词，生成 (角色, 内容) 消息列表"""
+        human = self.HUMAN_PROMPT_TEMPLATE.format(
+            treatment_process=treatment_process,
+            time_frame=time_frame,
+            toxicity_analysis=toxicity_analysis
+        )
+        return [("system", self.SYSTEM_PROMPT), ("human", human)]
     
     def _parse_toxicity_level(self, analysis: str) -> str:
         """从分析文本中提取毒性等级"""
@@ -201,7 +246,8 @@ class ControlAgent:
         return 2.0  # 默认中等毒性
     
     def run(self, toxicity_analysis: str, treatment_process: str, 
-            time_frame: str = "24小时") -> Dict[str, Any]:
+            time_frame: str = "24小时",
+            needed: Set[str] = SUB_AGENT_NAMES) -> Dict[str, Any]:
         """
         生成综合控制建议
         
@@ -209,6 +255,8 @@ class ControlAgent:
             toxicity_analysis: 毒性预测分析文本
             treatment_process: 运行工艺名称
             time_frame: 预测时间范围
+            needed: 需要调用的子控制智能体(turntable/mbr/regeneration)，
+                    未包含的子系统参数返回空字典
             
         Returns:
             Dict: 包含控制建议、参数设定、PLC命令等
@@ -225,7 +273,7 @@ class ControlAgent:
             mbr_params = {}
             regeneration_params = {}
             
-            if self.turntable_agent:
+            if self.turntable_agent and "turntable" in needed:
                 turntable_output = self.turntable_agent.generate_control_output(
                     toxicity=toxicity_value,
                     toxicity_level=toxicity_level,
@@ -233,32 +281,24 @@ class ControlAgent:
                 )
                 turntable_params = turntable_output.to_dict()
             
-            if self.mbr_agent:
+            if self.mbr_agent and "mbr" in needed:
                 mbr_output = self.mbr_agent.generate_control_output(
                     current_tmp=self.system_state.get("mbr_tmp", 20.0)
                 )
                 mbr_params = mbr_output.to_dict()
             
-            if self.regeneration_agent:
+            if self.regeneration_agent and "regeneration" in needed:
                 regen_output = self.regeneration_agent.generate_control_output(
                     adsorption_efficiency=self.system_state.get("carbon_efficiency", 85.0)
                 )
                 regeneration_params = regen_output.to_dict()
             
             # 调用LLM生成综合建议
-            suggestion = self.chain.invoke({
-                "toxicity_analysis": toxicity_analysis,
-                "treatment_process": treatment_process,
-                "time_frame": time_frame
-            })
+            messages = self._build_messages(toxicity_analysis, treatment_process, time_frame)
+            suggestion = self.llm.invoke(messages).content
             
             # 确定优先级
-            if toxicity_level == "高":
-                priority = "urgent"
-            elif toxicity_level == "中":
-                priority = "normal"
-            else:
-                priority = "low"
+            priority = LEVEL_PRIORITY.get(toxicity_level, "low")
             
             # 创建控制决策对象
             decision = ControlDecision(
@@ -345,12 +385,23 @@ class ControlAgent:
     
     def _get_toxicity_level(self, toxicity: float) -> str:
         """根据毒性值判定等级"""
-        if toxicity < 1.5:
-            return "低"
-        elif toxicity < 3.0:
-            return "中"
-        else:
-            return "高"
+        return TOXICITY_LEVELS[bisect_right(TOXICITY_LEVEL_BINS, toxicity)]
+    
+    def classify_toxicity_batch(self, toxicity: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        批量判定毒性等级与优先级
+        
+        Args:
+            toxicity: 毒性值数组
+            
+        Returns:
+            Dict: toxicity_level / priority 字符串数组
+        """
+        idx = np.searchsorted(_LEVEL_BINS_ARRAY, np.asarray(toxicity, dtype=np.float64), side="right")
+        return {
+            "toxicity_level": _LEVELS_ARRAY[idx],
+            "priority": _PRIORITIES_ARRAY[idx]
+        }
     
     def _fallback_turntable_control(self, toxicity: float) -> Dict[str, Any]:
         """回退转盘控制逻辑"""
@@ -397,6 +448,54 @@ class ControlAgent:
             "feed_rate": 30.0 if need_regen else 0
         }
     
+    def generate_turntable_control_batch(self, toxicity: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        批量生成转盘回退控制参数
+        
+        Args:
+            toxicity: 毒性值数组
+        """
+        frequency, reactors = fallback_turntable_batch(np.asarray(toxicity, dtype=np.float64))
+        rpm = frequency * 30
+        return {
+            "frequency_1": frequency,
+            "frequency_2": frequency,
+            "rpm_1": rpm,
+            "rpm_2": rpm,
+            "active_reactors": reactors
+        }
+    
+    def generate_mbr_control_batch(self, tmp: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        批量生成MBR回退控制参数
+        
+        Args:
+            tmp: 跨膜压数组 (kPa)
+        """
+        aeration, flux, backwash = fallback_mbr_batch(np.asarray(tmp, dtype=np.float64))
+        return {
+            "aeration_rate": aeration,
+            "flux_setpoint": flux,
+            "backwash_needed": backwash
+        }
+    
+    def generate_regeneration_control_batch(self, efficiency: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        批量生成再生回退控制参数
+        
+        Args:
+            efficiency: 吸附效率数组 (%)
+        """
+        need_regen, temperature, feed_rate = fallback_regeneration_batch(
+            np.asarray(efficiency, dtype=np.float64)
+        )
+        return {
+            "regeneration_needed": need_regen,
+            "regeneration_mode": np.where(need_regen, "thermal", "standby"),
+            "furnace_temperature": temperature,
+            "feed_rate": feed_rate
+        }
+    
     def update_system_state(self, **kwargs):
         """更新系统状态"""
         for key, value in kwargs.items():
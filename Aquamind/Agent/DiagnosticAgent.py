@@ -11,22 +11,30 @@
 
 import sys
 import os
-from typing import Dict, Any, Optional, List
+import re
+import asyncio
+import operator
+from bisect import bisect_right
+from typing import Dict, Any, Optional, List, AsyncIterator
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
+from functools import cached_property, lru_cache
+
+import numpy as np
 
 # 添加项目根目录到Python路径
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.append(root_dir)
 
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from LLM.llm_interface import LLMInterface, get_chat_model, build_system_message
+from cache import ResponseCache, make_cache_key
+from utils_async import run_sync
+from Knowledge.knowledge_base import get_knowledge_base, KnowledgeBase
 
-from LLM.llm_interface import LLMInterface
-from Knowledge.knowledge_base import get_knowledge_base
+# 批量诊断响应中的报告分隔标记，如 "## Report 2"
+REPORT_MARKER_PATTERN = re.compile(r"^##\s*Report\s+(\d+)\s*$", re.MULTILINE)
 
 
 class HealthLevel(Enum):
@@ -38,7 +46,96 @@ class HealthLevel(Enum):
     CRITICAL = "严重"
 
 
-@dataclass
+# 批量评分的指标列顺序（score_batch 输入矩阵的列）
+SCORE_COLUMNS = (
+    "toxicity", "confidence", "prediction_accuracy",
+    "turntable_frequency", "turntable_removal_rate", "turntable_standby",
+    "mbr_tmp", "mbr_flux", "mbr_fouling",
+    "carbon_efficiency", "need_regeneration",
+)
+
+# 膜污染状态编码（mbr_fouling 列）
+FOULING_CODES = {"normal": 0, "warning": 1, "critical": 2}
+
+# 健康等级分界与对应等级（由低到高）：< 40 严重，[40, 60) 警告，…，>= 90 优秀
+HEALTH_SCORE_THRESHOLDS = (40.0, 60.0, 75.0, 90.0)
+HEALTH_LEVELS = (
+    HealthLevel.CRITICAL, HealthLevel.WARNING, HealthLevel.ATTENTION,
+    HealthLevel.GOOD, HealthLevel.EXCELLENT
+)
+
+# 批量查表用的数组形式
+HEALTH_SCORE_BINS = np.array(HEALTH_SCORE_THRESHOLDS)
+_HEALTH_VALUES_ARRAY = np.array([level.value for level in HEALTH_LEVELS])
+
+
+def _scores_to_health_levels(scores: np.ndarray) -> np.ndarray:
+    """批量评分转换为健康等级索引（int8，对应 HEALTH_LEVELS）"""
+    return np.searchsorted(HEALTH_SCORE_BINS, scores, side="right").astype(np.int8)
+
+
+# 子系统键与名称（报告中的顺序）
+SUBSYSTEM_LABELS = {
+    "toxicity": "毒性预测系统",
+    "turntable": "转盘吸附系统",
+    "mbr": "MBR膜系统",
+    "regeneration": "再生系统",
+}
+
+# 子系统扣分规则表：(子系统, 指标名, 比较运算, 分级)
+# 分级按严重程度从高到低排列，每条规则只命中第一个满足条件的级别：
+# (阈值, 扣分, 问题描述或None, 建议元组)
+# 标量评估与 score_batch 共用此表
+_RULES = (
+    # 毒性预测系统
+    ("toxicity", "confidence", operator.lt, (
+        (0.6, 20, "预测置信度较低", ("增加历史数据量，提高模型准确性",)),
+        (0.8, 10, "预测置信度中等", ()),
+    )),
+    ("toxicity", "prediction_accuracy", operator.lt, (
+        (70, 25, "预测准确性不足", ("重新训练预测模型",)),
+        (85, 10, None, ()),
+    )),
+    ("toxicity", "toxicity", operator.gt, (
+        (5.0, 15, "进水毒性偏高", ("关注进水来源，加强预处理",)),
+    )),
+    # 转盘吸附系统
+    ("turntable", "turntable_removal_rate", operator.lt, (
+        (50, 30, "毒性去除率偏低", ("检查活性炭吸附能力", "考虑增加运行频率")),
+        (70, 15, "去除率有待提高", ()),
+    )),
+    ("turntable", "turntable_frequency", operator.gt, (
+        (45, 10, "运行频率偏高", ("关注设备能耗",)),
+    )),
+    ("turntable", "turntable_standby", operator.ne, (
+        (False, 15, "备用线路已启用", ("检查主线路是否存在问题",)),
+    )),
+    # MBR膜系统
+    ("mbr", "mbr_tmp", operator.gt, (
+        (40, 35, "TMP严重超标", ("立即进行化学清洗",)),
+        (30, 20, "TMP偏高", ("增强反洗，准备清洗",)),
+        (25, 10, "TMP接近预警值", ()),
+    )),
+    ("mbr", "mbr_flux", operator.lt, (
+        (10, 25, "产水通量严重不足", ()),
+        (15, 15, "产水通量偏低", ()),
+    )),
+    ("mbr", "mbr_fouling", operator.eq, (
+        ("critical", 30, "膜污染严重", ()),
+        ("warning", 15, "存在膜污染", ()),
+    )),
+    # 再生系统
+    ("regeneration", "carbon_efficiency", operator.lt, (
+        (60, 30, "活性炭吸附效率严重下降", ("立即安排再生",)),
+        (80, 15, "吸附效率下降", ()),
+    )),
+    ("regeneration", "need_regeneration", operator.ne, (
+        (False, 10, "需要进行再生", ("安排再生计划",)),
+    )),
+)
+
+
+@dataclass(slots=True)
 class SubsystemStatus:
     """子系统状态"""
     name: str
@@ -48,7 +145,7 @@ class SubsystemStatus:
     recommendations: List[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class DiagnosticReport:
     """诊断报告"""
     overall_health: HealthLevel
@@ -82,7 +179,7 @@ class DiagnosticReport:
     
     def to_markdown(self) -> str:
         """生成Markdown格式报告"""
-        md = f"""# 系统诊断评估报告
+        parts = [f"""# 系统诊断评估报告
 生成时间: {self.timestamp}
 
 ## 1. 整体评估
@@ -90,37 +187,32 @@ class DiagnosticReport:
 - **综合评分**: {self.overall_score:.1f}/100
 
 ## 2. 子系统状态
-"""
+"""]
         for name, status in self.subsystem_status.items():
-            md += f"""
+            parts.append(f"""
 ### {status.name}
 - 健康等级: {status.health_level.value}
 - 评分: {status.score:.1f}/100
-"""
+""")
             if status.issues:
-                md += "- 问题:\n"
-                for issue in status.issues:
-                    md += f"  - {issue}\n"
+                parts.append("- 问题:\n")
+                parts.extend(f"  - {issue}\n" for issue in status.issues)
             if status.recommendations:
-                md += "- 建议:\n"
-                for rec in status.recommendations:
-                    md += f"  - {rec}\n"
+                parts.append("- 建议:\n")
+                parts.extend(f"  - {rec}\n" for rec in status.recommendations)
         
         if self.critical_issues:
-            md += "\n## 3. 严重问题\n"
-            for issue in self.critical_issues:
-                md += f"- ⚠️ {issue}\n"
+            parts.append("\n## 3. 严重问题\n")
+            parts.extend(f"- ⚠️ {issue}\n" for issue in self.critical_issues)
         
         if self.warnings:
-            md += "\n## 4. 警告\n"
-            for warning in self.warnings:
-                md += f"- ⚡ {warning}\n"
+            parts.append("\n## 4. 警告\n")
+            parts.extend(f"- ⚡ {warning}\n" for warning in self.warnings)
         
-        md += "\n## 5. 综合建议\n"
-        for rec in self.recommendations:
-            md += f"- {rec}\n"
+        parts.append("\n## 5. 综合建议\n")
+        parts.extend(f"- {rec}\n" for rec in self.recommendations)
         
-        return md
+        return "".join(parts)
 
 
 class DiagnosticAgent:
@@ -161,17 +253,8 @@ class DiagnosticAgent:
 
 请基于提供的系统数据，生成专业的诊断评估报告。"""
 
-    def __init__(self, llm_interface: LLMInterface = None):
-        """初始化诊断评估智能体"""
-        self.llm_interface = llm_interface or LLMInterface()
-        self.kb = get_knowledge_base()
-        self.chain = self._create_chain()
-    
-    def _create_chain(self):
-        """创建LangChain处理链"""
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self.SYSTEM_PROMPT),
-            ("human", """
+    # 用户提示词模板（整体诊断）
+    HUMAN_TEMPLATE = """
 ## 系统运行数据
 
 ### 毒性预测
@@ -192,218 +275,432 @@ class DiagnosticAgent:
 2. 发现的问题和风险
 3. 优化建议
 4. 维护计划建议
-""")
-        ])
+"""
+    
+    # 单个子系统的分项诊断提示词
+    SUBSYSTEM_HUMAN_TEMPLATE = """
+## {subsystem}运行数据
+{data}
+
+## 请仅针对{subsystem}生成诊断意见
+请从以下方面进行评估：
+1. 健康状态评分
+2. 发现的问题和风险
+3. 优化建议
+4. 维护计划建议
+"""
+    
+    # 多场景合并诊断提示词
+    BATCH_HUMAN_TEMPLATE = """
+以下共有 {count} 个相互独立的系统运行场景，请分别诊断。
+
+{scenarios}
+
+## 输出要求
+请按场景编号顺序输出 {count} 份诊断报告，每份报告单独一行以 "## Report 编号" 开头（如 "## Report 1"），
+每份报告从以下方面进行评估：
+1. 各子系统健康状态评分
+2. 发现的问题和风险
+3. 优化建议
+4. 维护计划建议
+"""
+    
+    # 子系统分项诊断：(输入参数名, 子系统名称)
+    SUBSYSTEMS = (
+        ("toxicity_data", "毒性预测"),
+        ("turntable_data", "转盘吸附系统"),
+        ("mbr_data", "MBR膜系统"),
+        ("regeneration_data", "再生系统"),
+    )
+
+    def __init__(self, llm_interface: LLMInterface = None, kb: KnowledgeBase = None,
+                 max_concurrency: int = 4):
+        """
+        初始化诊断评估智能体
+        
+        Args:
+            llm_interface: LLM接口
+            kb: 知识库实例
+            max_concurrency: 分项诊断的最大并发请求数（受API限流约束）
+        """
+        self.llm_interface = llm_interface or LLMInterface()
+        self.kb = kb if kb is not None else get_knowledge_base()
+        self.max_concurrency = max_concurrency
+        
+        # LLM响应缓存（相同输入直接复用诊断结果）
+        self.response_cache = ResponseCache("diagnostic_llm", max_entries=512, persistent=True)
+    
+    @classmethod
+    @lru_cache(maxsize=None)
+    def _get_prompt(cls, human_template: str):
+        """构建提示词模板（静态内容，同一模板进程内只构建一次；系统提示词为可缓存的固定前缀）"""
+        from langchain.prompts import ChatPromptTemplate
         
+        return ChatPromptTemplate.from_messages([
+            build_system_message(cls.SYSTEM_PROMPT),
+            ("human", human_template)
+        ])
+    
+    @cached_property
+    def llm(self):
+        """共享LLM客户端（各处理链共用，首次使用时创建）"""
         api_key = self.llm_interface.qwen_api_key or self.llm_interface.openai_api_key
         base_url = self.llm_interface.qwen_api_base or self.llm_interface.openai_api_base
         model_name = self.llm_interface.qwen_model_name or "qwen-plus"
         
-        llm = ChatOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            model=model_name,
-            temperature=0.3
-        )
+        return get_chat_model(api_key, base_url, model_name, 0.3)
+    
+    def _create_chain(self, human_template: str):
+        """创建LangChain处理链"""
+        from langchain_core.output_parsers import StrOutputParser
         
-        return prompt | llm | StrOutputParser()
+        return self._get_prompt(human_template) | self.llm | StrOutputParser()
+    
+    @cached_property
+    def chain(self):
+        """整体诊断链"""
+        return self._create_chain(self.HUMAN_TEMPLATE)
+    
+    @cached_property
+    def subsystem_chain(self):
+        """单个子系统的分项诊断链"""
+        return self._create_chain(self.SUBSYSTEM_HUMAN_TEMPLATE)
+    
+    @cached_property
+    def batch_chain(self):
+        """多场景合并诊断链（一次请求诊断多个场景）"""
+        return self._create_chain(self.BATCH_HUMAN_TEMPLATE)
     
     def _score_to_health_level(self, score: float) -> HealthLevel:
         """评分转换为健康等级"""
-        if score >= 90:
-            return HealthLevel.EXCELLENT
-        elif score >= 75:
-            return HealthLevel.GOOD
-        elif score >= 60:
-            return HealthLevel.ATTENTION
-        elif score >= 40:
-            return HealthLevel.WARNING
-        else:
-            return HealthLevel.CRITICAL
-    
-    def _evaluate_toxicity_subsystem(self, toxicity: float, confidence: float,
-                                      prediction_accuracy: float) -> SubsystemStatus:
-        """评估毒性预测子系统"""
-        issues = []
-        recommendations = []
-        score = 100.0
-        
-        # 评估预测置信度
-        if confidence < 0.6:
-            score -= 20
-            issues.append("预测置信度较低")
-            recommendations.append("增加历史数据量，提高模型准确性")
-        elif confidence < 0.8:
-            score -= 10
-            issues.append("预测置信度中等")
-        
-        # 评估预测准确性
-        if prediction_accuracy < 70:
-            score -= 25
-            issues.append("预测准确性不足")
-            recommendations.append("重新训练预测模型")
-        elif prediction_accuracy < 85:
-            score -= 10
-        
-        # 评估毒性水平
-        if toxicity > 5.0:
-            score -= 15
-            issues.append("进水毒性偏高")
-            recommendations.append("关注进水来源，加强预处理")
-        
-        return SubsystemStatus(
-            name="毒性预测系统",
-            health_level=self._score_to_health_level(score),
-            score=max(0, score),
-            issues=issues,
-            recommendations=recommendations
-        )
-    
-    def _evaluate_turntable_subsystem(self, frequency: float, removal_rate: float,
-                                       standby_triggered: bool) -> SubsystemStatus:
-        """评估转盘吸附子系统"""
-        issues = []
-        recommendations = []
-        score = 100.0
-        
-        # 评估去除率
-        if removal_rate < 50:
-            score -= 30
-            issues.append("毒性去除率偏低")
-            recommendations.append("检查活性炭吸附能力")
-            recommendations.append("考虑增加运行频率")
-        elif removal_rate < 70:
-            score -= 15
-            issues.append("去除率有待提高")
-        
-        # 评估运行频率
-        if frequency > 45:
-            score -= 10
-            issues.append("运行频率偏高")
-            recommendations.append("关注设备能耗")
-        
-        # 备用线路状态
-        if standby_triggered:
-            score -= 15
-            issues.append("备用线路已启用")
-            recommendations.append("检查主线路是否存在问题")
-        
-        return SubsystemStatus(
-            name="转盘吸附系统",
-            health_level=self._score_to_health_level(score),
-            score=max(0, score),
-            issues=issues,
-            recommendations=recommendations
-        )
+        return HEALTH_LEVELS[bisect_right(HEALTH_SCORE_THRESHOLDS, score)]
     
-    def _evaluate_mbr_subsystem(self, tmp: float, flux: float,
-                                 fouling_status: str) -> SubsystemStatus:
-        """评估MBR子系统"""
-        issues = []
-        recommendations = []
-        score = 100.0
-        
-        # 评估TMP
-        if tmp > 40:
-            score -= 35
-            issues.append("TMP严重超标")
-            recommendations.append("立即进行化学清洗")
-        elif tmp > 30:
-            score -= 20
-            issues.append("TMP偏高")
-            recommendations.append("增强反洗，准备清洗")
-        elif tmp > 25:
-            score -= 10
-            issues.append("TMP接近预警值")
-        
-        # 评估通量
-        if flux < 10:
-            score -= 25
-            issues.append("产水通量严重不足")
-        elif flux < 15:
-            score -= 15
-            issues.append("产水通量偏低")
-        
-        # 污染状态
-        if fouling_status == "critical":
-            score -= 30
-            issues.append("膜污染严重")
-        elif fouling_status == "warning":
-            score -= 15
-            issues.append("存在膜污染")
-        
-        return SubsystemStatus(
-            name="MBR膜系统",
-            health_level=self._score_to_health_level(score),
-            score=max(0, score),
-            issues=issues,
-            recommendations=recommendations
-        )
+    def _evaluate_subsystems(self, metrics: Dict[str, Any]) -> Dict[str, SubsystemStatus]:
+        """
+        按扣分规则表一次评估全部子系统
+        
+        Args:
+            metrics: 运行指标，键同 generate_diagnostic_report 的参数名
+            
+        Returns:
+            Dict[str, SubsystemStatus]: 子系统键 -> 子系统状态（顺序同 SUBSYSTEM_LABELS）
+        """
+        scores = dict.fromkeys(SUBSYSTEM_LABELS, 100.0)
+        issues = {key: [] for key in SUBSYSTEM_LABELS}
+        recommendations = {key: [] for key in SUBSYSTEM_LABELS}
+        
+        for subsystem, metric, compare, ladder in _RULES:
+            value = metrics[metric]
+            for threshold, penalty, issue, recs in ladder:
+                if compare(value, threshold):
+                    scores[subsystem] -= penalty
+                    if issue:
+                        issues[subsystem].append(issue)
+                    recommendations[subsystem].extend(recs)
+                    break
+        
+        # 等级按扣分后原始分判定，输出评分下限截断为0
+        return {
+            key: SubsystemStatus(
+                name=name,
+                health_level=self._score_to_health_level(scores[key]),
+                score=max(0, scores[key]),
+                issues=issues[key],
+                recommendations=recommendations[key]
+            )
+            for key, name in SUBSYSTEM_LABELS.items()
+        }
     
-    def _evaluate_regeneration_subsystem(self, adsorption_efficiency: float,
-                                          need_regeneration: bool) -> SubsystemStatus:
-        """评估再生子系统"""
-        issues = []
-        recommendations = []
-        score = 100.0
-        
-        # 评估吸附效率
-        if adsorption_efficiency < 60:
-            score -= 30
-            issues.append("活性炭吸附效率严重下降")
-            recommendations.append("立即安排再生")
-        elif adsorption_efficiency < 80:
-            score -= 15
-            issues.append("吸附效率下降")
-        
-        # 再生需求
-        if need_regeneration:
-            score -= 10
-            issues.append("需要进行再生")
-            recommendations.append("安排再生计划")
-        
-        return SubsystemStatus(
-            name="再生系统",
-            health_level=self._score_to_health_level(score),
-            score=max(0, score),
-            issues=issues,
-            recommendations=recommendations
-        )
+    async def _analyze_subsystem(self, semaphore: asyncio.Semaphore,
+                                 subsystem: str, data: str) -> str:
+        """异步执行单个子系统的分项诊断"""
+        async with semaphore:
+            return await self.subsystem_chain.ainvoke({
+                "subsystem": subsystem,
+                "data": data
+            })
     
-    def run(self, toxicity_data: str, turntable_data: str,
-            mbr_data: str, regeneration_data: str) -> Dict[str, Any]:
+    async def arun(self, toxicity_data: str, turntable_data: str,
+                   mbr_data: str, regeneration_data: str,
+                   cache: bool = True) -> Dict[str, Any]:
         """
-        运行诊断评估智能体
+        异步运行诊断评估智能体
+        
+        四个子系统的分项诊断并发请求LLM，完成后按子系统顺序合并。
         
         Args:
             toxicity_data: 毒性预测数据描述
             turntable_data: 转盘系统数据描述
             mbr_data: MBR系统数据描述
             regeneration_data: 再生系统数据描述
+            cache: 是否使用LLM响应缓存
             
         Returns:
-            Dict: 包含诊断结果和LLM分析
+            Dict: 包含诊断结果、LLM分析及缓存命中标记
         """
+        inputs = {
+            "toxicity_data": toxicity_data,
+            "turntable_data": turntable_data,
+            "mbr_data": mbr_data,
+            "regeneration_data": regeneration_data
+        }
+        cache_key = make_cache_key("diagnostic", inputs, self.llm_interface.qwen_model_name)
+        if cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return {
+                    "status": "success",
+                    "diagnosis": cached,
+                    "cache_hit": True,
+                    "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+        
         try:
-            llm_response = self.chain.invoke({
-                "toxicity_data": toxicity_data,
-                "turntable_data": turntable_data,
-                "mbr_data": mbr_data,
-                "regeneration_data": regeneration_data
-            })
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            results = await asyncio.gather(*(
+                self._analyze_subsystem(semaphore, subsystem, inputs[key])
+                for key, subsystem in self.SUBSYSTEMS
+            ))
+            
+            diagnosis = "\n\n".join(
+                f"### {subsystem}\n{result}"
+                for (_, subsystem), result in zip(self.SUBSYSTEMS, results)
+            )
+            if cache:
+                self.response_cache.set(cache_key, diagnosis)
             
             return {
                 "status": "success",
-                "diagnosis": llm_response,
+                "diagnosis": diagnosis,
+                "cache_hit": False,
                 "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
         except Exception as e:
             return {
                 "status": "error",
                 "diagnosis": f"诊断评估失败: {str(e)}",
+                "cache_hit": False,
                 "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
     
+    def run(self, toxicity_data: str, turntable_data: str,
+            mbr_data: str, regeneration_data: str,
+            cache: bool = True) -> Dict[str, Any]:
+        """
+        运行诊断评估智能体（arun 的同步封装）
+        
+        Args:
+            toxicity_data: 毒性预测数据描述
+            turntable_data: 转盘系统数据描述
+            mbr_data: MBR系统数据描述
+            regeneration_data: 再生系统数据描述
+            cache: 是否使用LLM响应缓存
+            
+        Returns:
+            Dict: 包含诊断结果、LLM分析及缓存命中标记
+        """
+        return run_sync(self.arun(
+            toxicity_data, turntable_data, mbr_data, regeneration_data, cache=cache
+        ))
+    
+    async def arun_stream(self, toxicity_data: str, turntable_data: str,
+                          mbr_data: str, regeneration_data: str,
+                          cache: bool = True) -> AsyncIterator[str]:
+        """
+        流式运行诊断评估（整体提示词单次请求），LLM输出逐段产出
+        
+        适用于交互式界面逐步渲染报告；缓存命中时一次性产出完整结果。
+        
+        Args:
+            toxicity_data: 毒性预测数据描述
+            turntable_data: 转盘系统数据描述
+            mbr_data: MBR系统数据描述
+            regeneration_data: 再生系统数据描述
+            cache: 是否使用LLM响应缓存
+            
+        Yields:
+            str: 诊断文本片段
+        """
+        inputs = {
+            "toxicity_data": toxicity_data,
+            "turntable_data": turntable_data,
+            "mbr_data": mbr_data,
+            "regeneration_data": regeneration_data
+        }
+        cache_key = make_cache_key("diagnostic_full", inputs, self.llm_interface.qwen_model_name)
+        if cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        chunks = []
+        async for chunk in self.chain.astream(inputs):
+            chunks.append(chunk)
+            yield chunk
+        if cache:
+            self.response_cache.set(cache_key, "".join(chunks))
+    
+    @staticmethod
+    def _format_scenarios(scenarios: List[Dict[str, str]]) -> str:
+        """将多个场景拼接为带编号的提示词段落"""
+        blocks = []
+        for i, scenario in enumerate(scenarios, 1):
+            blocks.append(f"""### Scenario {i}
+- 毒性预测: {scenario.get("toxicity_data", "")}
+- 转盘吸附系统: {scenario.get("turntable_data", "")}
+- MBR膜系统: {scenario.get("mbr_data", "")}
+- 再生系统: {scenario.get("regeneration_data", "")}""")
+        return "\n\n".join(blocks)
+    
+    @staticmethod
+    def _split_reports(response: str, count: int) -> List[Optional[str]]:
+        """按 "## Report 编号" 标记拆分合并响应，缺失的场景返回 None"""
+        parts = REPORT_MARKER_PATTERN.split(response)
+        reports: List[Optional[str]] = [None] * count
+        # split 结果形如 [前导文本, 编号1, 内容1, 编号2, 内容2, ...]
+        for number, content in zip(parts[1::2], parts[2::2]):
+            index = int(number) - 1
+            if 0 <= index < count and reports[index] is None:
+                reports[index] = content.strip()
+        return reports
+    
+    async def _diagnose_group(self, semaphore: asyncio.Semaphore,
+                              scenarios: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """异步诊断一组场景（单次LLM请求）"""
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            async with semaphore:
+                response = await self.batch_chain.ainvoke({
+                    "count": len(scenarios),
+                    "scenarios": self._format_scenarios(scenarios)
+                })
+        except Exception as e:
+            return [{
+                "status": "error",
+                "diagnosis": f"诊断评估失败: {str(e)}",
+                "timestamp": timestamp
+            } for _ in scenarios]
+        
+        results = []
+        for report in self._split_reports(response, len(scenarios)):
+            if report is None:
+                results.append({
+                    "status": "error",
+                    "diagnosis": "诊断评估失败: 未能从批量响应中解析该场景的报告",
+                    "timestamp": timestamp
+                })
+            else:
+                results.append({
+                    "status": "success",
+                    "diagnosis": report,
+                    "timestamp": timestamp
+                })
+        return results
+    
+    async def arun_batch(self, scenarios: List[Dict[str, str]],
+                         marshal_size: int = 4) -> List[Dict[str, Any]]:
+        """
+        异步批量诊断多个场景
+        
+        每 marshal_size 个场景合并为一次LLM请求，各组请求并发执行。
+        
+        Args:
+            scenarios: 场景列表，每项包含 toxicity_data / turntable_data /
+                       mbr_data / regeneration_data
+            marshal_size: 单次请求合并的场景数（建议 4-8）
+            
+        Returns:
+            List[Dict]: 与 scenarios 顺序一致的诊断结果
+        """
+        marshal_size = max(1, marshal_size)
+        groups = [scenarios[i:i + marshal_size] for i in range(0, len(scenarios), marshal_size)]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        grouped = await asyncio.gather(*(
+            self._diagnose_group(semaphore, group) for group in groups
+        ))
+        return [result for group_results in grouped for result in group_results]
+    
+    def run_batch(self, scenarios: List[Dict[str, str]],
+                  marshal_size: int = 4) -> List[Dict[str, Any]]:
+        """
+        批量诊断多个场景（arun_batch 的同步封装）
+        
+        Args:
+            scenarios: 场景列表
+            marshal_size: 单次请求合并的场景数
+            
+        Returns:
+            List[Dict]: 与 scenarios 顺序一致的诊断结果
+        """
+        return run_sync(self.arun_batch(scenarios, marshal_size))
+    
+    async def arun_many(self, scenarios: List[Dict[str, str]], max_concurrency: int = 8,
+                        rpm: int = 500, cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        异步逐场景诊断（整体提示词，每个场景一次请求），并发与请求速率受限
+        
+        并发数由信号量限制，请求发起间隔不小于 60/rpm 秒，避免触发服务端限流。
+        
+        Args:
+            scenarios: 场景列表，键同 run 的参数名
+            max_concurrency: 最大并发请求数
+            rpm: 每分钟最大请求数
+            cache: 是否使用LLM响应缓存
+            
+        Returns:
+            List[Dict]: 与 scenarios 顺序一致的诊断结果
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        pace_lock = asyncio.Lock()
+        interval = 60.0 / rpm if rpm > 0 else 0.0
+        loop = asyncio.get_running_loop()
+        next_slot = loop.time()
+        
+        async def pace():
+            """按 rpm 间隔分配请求发起时间"""
+            nonlocal next_slot
+            async with pace_lock:
+                now = loop.time()
+                wait = next_slot - now
+                next_slot = max(now, next_slot) + interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+        
+        async def diagnose(scenario: Dict[str, str]) -> Dict[str, Any]:
+            inputs = {key: scenario.get(key, "") for key, _ in self.SUBSYSTEMS}
+            cache_key = make_cache_key("diagnostic_full", inputs, self.llm_interface.qwen_model_name)
+            if cache:
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    return {
+                        "status": "success",
+                        "diagnosis": cached,
+                        "cache_hit": True,
+                        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    }
+            try:
+                async with semaphore:
+                    await pace()
+                    diagnosis = await self.chain.ainvoke(inputs)
+                if cache:
+                    self.response_cache.set(cache_key, diagnosis)
+                return {
+                    "status": "success",
+                    "diagnosis": diagnosis,
+                    "cache_hit": False,
+                    "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+            except Exception as e:
+                return {
+                    "status": "error",
+                    "diagnosis": f"诊断评估失败: {str(e)}",
+                    "cache_hit": False,
+                    "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+        
+        return await asyncio.gather(*(diagnose(scenario) for scenario in scenarios))
+    
     def generate_diagnostic_report(self,
                                     toxicity: float = 2.0,
                                     confidence: float = 0.85,
@@ -423,26 +720,19 @@ class DiagnosticAgent:
             DiagnosticReport: 诊断报告
         """
         # 评估各子系统
-        toxicity_status = self._evaluate_toxicity_subsystem(
-            toxicity, confidence, prediction_accuracy
-        )
-        turntable_status = self._evaluate_turntable_subsystem(
-            turntable_frequency, turntable_removal_rate, turntable_standby
-        )
-        mbr_status = self._evaluate_mbr_subsystem(
-            mbr_tmp, mbr_flux, mbr_fouling
-        )
-        regeneration_status = self._evaluate_regeneration_subsystem(
-            carbon_efficiency, need_regeneration
-        )
-        
-        # 汇总子系统状态
-        subsystem_status = {
-            "toxicity": toxicity_status,
-            "turntable": turntable_status,
-            "mbr": mbr_status,
-            "regeneration": regeneration_status
-        }
+        subsystem_status = self._evaluate_subsystems({
+            "toxicity": toxicity,
+            "confidence": confidence,
+            "prediction_accuracy": prediction_accuracy,
+            "turntable_frequency": turntable_frequency,
+            "turntable_removal_rate": turntable_removal_rate,
+            "turntable_standby": turntable_standby,
+            "mbr_tmp": mbr_tmp,
+            "mbr_flux": mbr_flux,
+            "mbr_fouling": mbr_fouling,
+            "carbon_efficiency": carbon_efficiency,
+            "need_regeneration": need_regeneration
+        })
         
         # 计算整体评分
         overall_score = sum(s.score for s in subsystem_status.values()) / len(subsystem_status)
@@ -461,8 +751,8 @@ class DiagnosticAgent:
         for status in subsystem_status.values():
             recommendations.extend(status.recommendations)
         
-        # 去重
-        recommendations = list(set(recommendations))
+        # 去重（保持首次出现顺序，保证报告输出稳定）
+        recommendations = list(dict.fromkeys(recommendations))
         
         return DiagnosticReport(
             overall_health=self._score_to_health_level(overall_score),
@@ -473,6 +763,68 @@ class DiagnosticAgent:
             recommendations=recommendations[:10],  # 限制建议数量
             timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         )
+    
+    @staticmethod
+    def stack_metrics(records: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        将多条运行指标记录堆叠为 score_batch 的输入矩阵
+        
+        Args:
+            records: 指标字典列表，键同 generate_diagnostic_report 的参数名，
+                     缺省项使用其默认值；mbr_fouling 取 normal/warning/critical
+            
+        Returns:
+            np.ndarray: 形状 (N, len(SCORE_COLUMNS)) 的浮点矩阵
+        """
+        defaults = {
+            "toxicity": 2.0, "confidence": 0.85, "prediction_accuracy": 80.0,
+            "turntable_frequency": 25.0, "turntable_removal_rate": 70.0, "turntable_standby": False,
+            "mbr_tmp": 20.0, "mbr_flux": 18.0, "mbr_fouling": "normal",
+            "carbon_efficiency": 85.0, "need_regeneration": False
+        }
+        metrics = np.empty((len(records), len(SCORE_COLUMNS)), dtype=np.float64)
+        for i, record in enumerate(records):
+            row = {**defaults, **record}
+            row["mbr_fouling"] = FOULING_CODES.get(row["mbr_fouling"], 0)
+            metrics[i] = [row[name] for name in SCORE_COLUMNS]
+        return metrics
+    
+    def score_batch(self, metrics: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        批量计算子系统评分（与 _evaluate_subsystems 共用扣分规则表 _RULES）
+        
+        Args:
+            metrics: 形状 (N, len(SCORE_COLUMNS)) 的指标矩阵，列顺序见 SCORE_COLUMNS
+            
+        Returns:
+            Dict: scores (N, 4)，列依次为毒性预测/转盘/MBR/再生；
+                  health_level (N, 4)；overall_score (N,)；overall_health (N,)
+        """
+        metrics = np.atleast_2d(np.asarray(metrics, dtype=np.float64))
+        columns = dict(zip(SCORE_COLUMNS, metrics.T))
+        subsystem_index = {key: i for i, key in enumerate(SUBSYSTEM_LABELS)}
+        
+        scores = np.full((metrics.shape[0], len(SUBSYSTEM_LABELS)), 100.0)
+        for subsystem, metric, compare, ladder in _RULES:
+            values = columns[metric]
+            conditions = [
+                compare(values, FOULING_CODES[threshold] if metric == "mbr_fouling" else threshold)
+                for threshold, _, _, _ in ladder
+            ]
+            penalties = [penalty for _, penalty, _, _ in ladder]
+            scores[:, subsystem_index[subsystem]] -= np.select(conditions, penalties, 0)
+        
+        # 等级按扣分后原始分判定，输出评分下限截断为0（同标量路径）
+        health_level = _HEALTH_VALUES_ARRAY[_scores_to_health_levels(scores)]
+        scores = np.maximum(scores, 0)
+        overall_score = scores.mean(axis=1)
+        
+        return {
+            "scores": scores,
+            "health_level": health_level,
+            "overall_score": overall_score,
+            "overall_health": _HEALTH_VALUES_ARRAY[_scores_to_health_levels(overall_score)]
+        }
 
 
 if __name__ == "__main__":
@@ -11,10 +11,11 @@
 
 import sys
 import os
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator, AsyncIterator
 from dataclasses import dataclass, field
 from datetime import datetime
-from collections import deque
+from collections import defaultdict, deque
+from functools import cached_property, lru_cache
 import json
 
 # 添加项目根目录到Python路径
@@ -22,15 +23,21 @@ root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.append(root_dir)
 
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+import numpy as np
 
-from LLM.llm_interface import LLMInterface
-from Knowledge.knowledge_base import get_knowledge_base
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
 
+from LLM.llm_interface import LLMInterface, get_chat_model, build_system_message
+from cache import ResponseCache, make_cache_key
+from Knowledge.knowledge_base import get_knowledge_base, KnowledgeBase
 
-@dataclass
+
+@dataclass(slots=True)
 class ControlFeedback:
     """控制反馈记录"""
     agent_name: str              # 智能体名称
@@ -53,7 +60,103 @@ class ControlFeedback:
         }
 
 
-@dataclass
+class FeedbackBuffer:
+    """
+    反馈记录环形缓冲区（结构数组布局）
+    
+    聚合所需的数值字段（有效性、智能体编号、操作编号）按列存放在连续的
+    numpy 数组中，完整记录对象保存在并行列表里。容量满后覆盖最早的记录，
+    淘汰顺序与 deque(maxlen=...) 一致。
+    """
+    
+    def __init__(self, maxlen: int):
+        self.maxlen = maxlen
+        self.eff = np.zeros(maxlen, dtype=np.float64)
+        self.agent_id = np.zeros(maxlen, dtype=np.int8)
+        self.action_id = np.zeros(maxlen, dtype=np.int16)
+        self.records: List[Optional[ControlFeedback]] = [None] * maxlen
+        self.total = 0  # 累计写入条数
+        
+        # 名称驻留表：名称 <-> 整数编号
+        self.agent_names: List[str] = []
+        self.action_names: List[str] = []
+        self._agent_index: Dict[str, int] = {}
+        self._action_index: Dict[str, int] = {}
+    
+    @staticmethod
+    def _intern(name: str, names: List[str], index: Dict[str, int], dtype) -> int:
+        """获取名称编号，首次出现时分配"""
+        code = index.get(name)
+        if code is None:
+            code = len(names)
+            if code > np.iinfo(dtype).max:
+                raise ValueError(f"名称数量超过编号上限: {name}")
+            names.append(name)
+            index[name] = code
+        return code
+    
+    def intern_agent(self, agent_name: str) -> int:
+        """获取智能体名称对应的编号"""
+        return self._intern(agent_name, self.agent_names, self._agent_index, np.int8)
+    
+    def intern_action(self, action: str) -> int:
+        """获取操作名称对应的编号"""
+        return self._intern(action, self.action_names, self._action_index, np.int16)
+    
+    @property
+    def start(self) -> int:
+        """最早一条记录所在的槽位"""
+        if self.total <= self.maxlen:
+            return 0
+        return self.total % self.maxlen
+    
+    def slot_order(self) -> np.ndarray:
+        """按时间顺序（由旧到新）排列的槽位索引"""
+        return (self.start + np.arange(len(self))) % max(self.maxlen, 1)
+    
+    def append(self, feedback: ControlFeedback) -> Optional[ControlFeedback]:
+        """
+        写入一条反馈
+        
+        Returns:
+            被覆盖淘汰的最早记录，未满时返回 None
+        """
+        if self.maxlen <= 0:
+            return None
+        slot = self.total % self.maxlen
+        evicted = self.records[slot] if self.total >= self.maxlen else None
+        self.eff[slot] = feedback.effectiveness
+        self.agent_id[slot] = self.intern_agent(feedback.agent_name)
+        self.action_id[slot] = self.intern_action(feedback.action_taken)
+        self.records[slot] = feedback
+        self.total += 1
+        return evicted
+    
+    def recent(self, n: int) -> List[ControlFeedback]:
+        """最近 n 条记录（由旧到新），只访问所需槽位"""
+        count = min(n, len(self))
+        records = self.records
+        return [records[(self.total - count + i) % self.maxlen] for i in range(count)]
+    
+    def __len__(self) -> int:
+        return min(self.total, self.maxlen)
+    
+    def __iter__(self) -> Iterator[ControlFeedback]:
+        records = self.records
+        for slot in self.slot_order():
+            yield records[slot]
+    
+    def __getitem__(self, index: int) -> ControlFeedback:
+        """按时间顺序索引（支持负数）"""
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("FeedbackBuffer index out of range")
+        return self.records[(self.start + index) % self.maxlen]
+
+
+@dataclass(slots=True)
 class LearningRecord:
     """学习记录"""
     scenario: str                # 场景描述
@@ -121,14 +224,36 @@ class FeedbackAgent:
 
 请基于提供的反馈数据，生成详细的分析报告和改进建议。"""
 
-    def __init__(self, llm_interface: LLMInterface = None, history_size: int = 100):
+    # 有效性定点化倍数（增量统计以整数累加）
+    EFF_SCALE = 10 ** 12
+
+    # 用户提示词模板
+    HUMAN_TEMPLATE = """
+## 最近的控制反馈数据
+{feedback_data}
+
+## 历史统计
+- 平均有效性：{avg_effectiveness}%
+- 总反馈数量：{total_feedbacks}
+
+## 请分析并给出建议
+1. 评估各智能体控制效果
+2. 识别需要改进的方面
+3. 提供参数优化建议
+4. 给出持续改进方案
+"""
+
+    def __init__(self, llm_interface: LLMInterface = None, history_size: int = 100,
+                 kb: KnowledgeBase = None):
         """初始化反馈智能体"""
         self.llm_interface = llm_interface or LLMInterface()
-        self.kb = get_knowledge_base()
-        self.chain = self._create_chain()
+        self.kb = kb if kb is not None else get_knowledge_base()
         
-        # 反馈历史记录
-        self.feedback_history: deque = deque(maxlen=history_size)
+        # LLM响应缓存（相同输入直接复用分析结果）
+        self.response_cache = ResponseCache("feedback_llm", max_entries=512, persistent=True)
+        
+        # 反馈历史记录（结构数组环形缓冲区）
+        self.feedback_history = FeedbackBuffer(history_size)
         
         # 学习记录
         self.learning_records: Dict[str, LearningRecord] = {}
@@ -139,47 +264,83 @@ class FeedbackAgent:
             "mbr": {"aeration": 50.0, "flux": 18.0},
             "regeneration": {"temperature": 800.0, "feed_rate": 30.0}
         }
+        
+        # 增量统计（随 record_feedback 更新，淘汰记录时扣除其贡献）
+        # sum: 有效性定点整数累加和（见 EFF_SCALE），增减无浮点累积误差
+        # best: 有效性 >= 0.8 的候选记录 (序号, 有效性, 记录)，按有效性单调递减，队首即窗口内最优
+        self._eff_sum = 0
+        self._stats: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {"sum": 0, "n": 0, "best": deque()}
+        )
+    
+    @classmethod
+    @lru_cache(maxsize=None)
+    def _get_prompt(cls):
+        """构建提示词模板（静态内容，进程内只构建一次；系统提示词为可缓存的固定前缀）"""
+        from langchain.prompts import ChatPromptTemplate
+        
+        return ChatPromptTemplate.from_messages([
+            build_system_message(cls.SYSTEM_PROMPT),
+            ("human", cls.HUMAN_TEMPLATE)
+        ])
     
     def _create_chain(self):
         """创建LangChain处理链"""
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self.SYSTEM_PROMPT),
-            ("human", """
-## 最近的控制反馈数据
-{feedback_data}
-
-## 历史统计
-- 平均有效性：{avg_effectiveness}%
-- 总反馈数量：{total_feedbacks}
-
-## 请分析并给出建议
-1. 评估各智能体控制效果
-2. 识别需要改进的方面
-3. 提供参数优化建议
-4. 给出持续改进方案
-""")
-        ])
+        from langchain_core.output_parsers import StrOutputParser
         
         api_key = self.llm_interface.qwen_api_key or self.llm_interface.openai_api_key
         base_url = self.llm_interface.qwen_api_base or self.llm_interface.openai_api_base
         model_name = self.llm_interface.qwen_model_name or "qwen-plus"
         
-        llm = ChatOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            model=model_name,
-            temperature=0.3
-        )
-        
-        return prompt | llm | StrOutputParser()
+        llm = get_chat_model(api_key, base_url, model_name, 0.3)
+        return self._get_prompt() | llm | StrOutputParser()
+    
+    @cached_property
+    def chain(self):
+        """LangChain处理链（首次调用LLM时创建）"""
+        return self._create_chain()
     
     def record_feedback(self, feedback: ControlFeedback):
         """记录控制反馈"""
-        self.feedback_history.append(feedback)
+        history = self.feedback_history
+        seq = history.total
+        evicted = history.append(feedback)
+        
+        if history.maxlen > 0:
+            if evicted is not None:
+                self._remove_stats(evicted, seq - history.maxlen)
+            self._add_stats(feedback, seq)
         
         # 更新学习记录
         self._update_learning_record(feedback)
     
+    def _add_stats(self, feedback: ControlFeedback, seq: int):
+        """计入一条反馈的统计贡献"""
+        stats = self._stats[feedback.agent_name]
+        eff = round(feedback.effectiveness * self.EFF_SCALE)
+        self._eff_sum += eff
+        stats["sum"] += eff
+        stats["n"] += 1
+        
+        if feedback.effectiveness >= 0.8:
+            best = stats["best"]
+            # 相同有效性保留较早记录，与按时间顺序取首个最大值一致
+            while best and best[-1][1] < feedback.effectiveness:
+                best.pop()
+            best.append((seq, feedback.effectiveness, feedback))
+    
+    def _remove_stats(self, feedback: ControlFeedback, seq: int):
+        """扣除被淘汰反馈的统计贡献"""
+        stats = self._stats[feedback.agent_name]
+        eff = round(feedback.effectiveness * self.EFF_SCALE)
+        self._eff_sum -= eff
+        stats["sum"] -= eff
+        stats["n"] -= 1
+        
+        best = stats["best"]
+        if best and best[0][0] == seq:
+            best.popleft()
+    
     def _update_learning_record(self, feedback: ControlFeedback):
         """更新学习记录"""
         scenario_key = f"{feedback.agent_name}_{feedback.action_taken}"
@@ -228,50 +389,128 @@ class FeedbackAgent:
         effectiveness = max(0, 1 - error / tolerance)
         return round(effectiveness, 2)
     
-    def run(self, feedback_data: str = None) -> Dict[str, Any]:
+    @staticmethod
+    def _dump_feedbacks(feedbacks: List[ControlFeedback]) -> str:
+        """将反馈记录序列化为缩进JSON（优先使用 orjson 直接序列化 dataclass）"""
+        if HAS_ORJSON:
+            return orjson.dumps(
+                feedbacks,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+            ).decode("utf-8")
+        return json.dumps(
+            [f.to_dict() for f in feedbacks],
+            ensure_ascii=False,
+            indent=2
+        )
+    
+    def _build_inputs(self, feedback_data: str = None) -> Dict[str, Any]:
+        """准备提示词输入（反馈数据与历史统计）"""
+        if feedback_data is None:
+            recent_feedbacks = self.feedback_history.recent(10)
+            feedback_data = self._dump_feedbacks(recent_feedbacks) if recent_feedbacks else "无历史反馈数据"
+        
+        if self.feedback_history:
+            avg_effectiveness = self._eff_sum / (len(self.feedback_history) * self.EFF_SCALE) * 100
+        else:
+            avg_effectiveness = 0
+        
+        return {
+            "feedback_data": feedback_data,
+            "avg_effectiveness": f"{avg_effectiveness:.1f}",
+            "total_feedbacks": len(self.feedback_history)
+        }
+    
+    def run(self, feedback_data: str = None, cache: bool = True) -> Dict[str, Any]:
         """
         运行反馈分析
         
         Args:
             feedback_data: 反馈数据描述（可选，默认使用历史记录）
+            cache: 是否使用LLM响应缓存
             
         Returns:
-            Dict: 包含分析结果和LLM建议
+            Dict: 包含分析结果、LLM建议及缓存命中标记
         """
         try:
-            # 准备反馈数据
-            if feedback_data is None:
-                recent_feedbacks = list(self.feedback_history)[-10:]
-                feedback_data = json.dumps(
-                    [f.to_dict() for f in recent_feedbacks],
-                    ensure_ascii=False,
-                    indent=2
-                ) if recent_feedbacks else "无历史反馈数据"
-            
-            # 计算统计数据
-            if self.feedback_history:
-                avg_effectiveness = sum(f.effectiveness for f in self.feedback_history) / len(self.feedback_history) * 100
-            else:
-                avg_effectiveness = 0
-            
-            llm_response = self.chain.invoke({
-                "feedback_data": feedback_data,
-                "avg_effectiveness": f"{avg_effectiveness:.1f}",
-                "total_feedbacks": len(self.feedback_history)
-            })
+            inputs = self._build_inputs(feedback_data)
+            cache_key = make_cache_key("feedback", inputs, self.llm_interface.qwen_model_name)
+            llm_response = self.response_cache.get(cache_key) if cache else None
+            cache_hit = llm_response is not None
+            if not cache_hit:
+                llm_response = self.chain.invoke(inputs)
+                if cache:
+                    self.response_cache.set(cache_key, llm_response)
             
             return {
                 "status": "success",
                 "analysis": llm_response,
+                "cache_hit": cache_hit,
                 "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
         except Exception as e:
             return {
                 "status": "error",
                 "analysis": f"反馈分析失败: {str(e)}",
+                "cache_hit": False,
                 "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
     
+    def batch_messages(self, feedback_data: str = None) -> List[Dict[str, str]]:
+        """离线批量任务的请求消息（OpenAI chat 格式，提示词同 run）"""
+        inputs = self._build_inputs(feedback_data)
+        return [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": self.HUMAN_TEMPLATE.format(**inputs)}
+        ]
+    
+    def batch_result(self, analysis: str) -> Dict[str, Any]:
+        """由批量任务返回的分析生成结果（结构同 run）"""
+        return {
+            "status": "success",
+            "analysis": analysis,
+            "cache_hit": False,
+            "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+    
+    async def arun_stream(self, feedback_data: str = None,
+                          cache: bool = True) -> AsyncIterator[str]:
+        """
+        流式运行反馈分析，LLM输出逐段产出
+        
+        缓存命中时一次性产出完整结果；流结束后写入缓存。
+        
+        Args:
+            feedback_data: 反馈数据描述（可选，默认使用历史记录）
+            cache: 是否使用LLM响应缓存
+            
+        Yields:
+            str: 分析文本片段
+        """
+        inputs = self._build_inputs(feedback_data)
+        cache_key = make_cache_key("feedback", inputs, self.llm_interface.qwen_model_name)
+        if cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        chunks = []
+        async for chunk in self.chain.astream(inputs):
+            chunks.append(chunk)
+            yield chunk
+        if cache:
+            self.response_cache.set(cache_key, "".join(chunks))
+    
+    @staticmethod
+    def _unique_head(items, limit: int) -> List[str]:
+        """按首次出现顺序去重，取前 limit 项（凑满即停止遍历）"""
+        unique: Dict[str, None] = {}
+        for item in items:
+            unique[item] = None
+            if len(unique) >= limit:
+                break
+        return list(unique)
+    
     def generate_feedback_analysis(self) -> FeedbackAnalysisOutput:
         """生成反馈分析报告"""
         if not self.feedback_history:
@@ -285,34 +524,41 @@ class FeedbackAgent:
                 timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             )
         
-        # 统计成功和失败的操作
-        successful_actions = []
-        failed_actions = []
-        effectiveness_sum = 0
+        history = self.feedback_history
+        avg_effectiveness = self._eff_sum / (len(history) * self.EFF_SCALE)
         
-        for feedback in self.feedback_history:
-            effectiveness_sum += feedback.effectiveness
-            if feedback.effectiveness >= 0.7:
-                successful_actions.append(
-                    f"{feedback.agent_name}: {feedback.action_taken}"
-                )
-            else:
-                failed_actions.append(
-                    f"{feedback.agent_name}: {feedback.action_taken} "
-                    f"(效果: {feedback.effectiveness:.0%})"
-                )
+        # 统计成功和失败的操作（按首次出现顺序去重，只为输出的前10项拼接文本）
+        order = history.slot_order()
+        success_mask = history.eff[order] >= 0.7
+        success_slots = order[success_mask]
+        failed_slots = order[~success_mask]
         
-        avg_effectiveness = effectiveness_sum / len(self.feedback_history)
+        successful_actions = self._unique_head((
+            f"{history.agent_names[history.agent_id[slot]]}: "
+            f"{history.action_names[history.action_id[slot]]}"
+            for slot in success_slots
+        ), 10)
+        failed_actions = self._unique_head((
+            f"{history.agent_names[history.agent_id[slot]]}: "
+            f"{history.action_names[history.action_id[slot]]} "
+            f"(效果: {history.eff[slot]:.0%})"
+            for slot in failed_slots
+        ), 10)
         
-        # 生成参数调整建议
+        # 按智能体单次遍历：参数调整建议（最成功的参数）与效果较差提示
         parameter_adjustments = {}
-        for agent_name, baseline in self.parameter_baselines.items():
-            agent_feedbacks = [f for f in self.feedback_history 
-                             if f.agent_name == agent_name and f.effectiveness >= 0.8]
-            if agent_feedbacks:
-                # 使用最成功的参数
-                best_feedback = max(agent_feedbacks, key=lambda x: x.effectiveness)
-                parameter_adjustments[agent_name] = best_feedback.parameters
+        agent_suggestions = []
+        for agent_name in self.parameter_baselines:
+            stats = self._stats.get(agent_name)
+            if not stats or not stats["n"]:
+                continue
+            if stats["best"]:
+                parameter_adjustments[agent_name] = stats["best"][0][2].parameters
+            agent_avg = stats["sum"] / (stats["n"] * self.EFF_SCALE)
+            if agent_avg < 0.7:
+                agent_suggestions.append(
+                    f"{agent_name}智能体效果较差({agent_avg:.0%})，建议检查"
+                )
         
         # 生成学习洞察
         learning_insights = []
@@ -328,22 +574,15 @@ class FeedbackAgent:
         elif avg_effectiveness < 0.8:
             improvement_suggestions.append("控制效果有待提高，建议优化关键参数")
         
-        if failed_actions:
-            improvement_suggestions.append(f"重点改进失败操作（共{len(failed_actions)}项）")
+        if len(failed_slots):
+            improvement_suggestions.append(f"重点改进失败操作（共{len(failed_slots)}项）")
         
-        for agent_name in ["turntable", "mbr", "regeneration"]:
-            agent_feedbacks = [f for f in self.feedback_history if f.agent_name == agent_name]
-            if agent_feedbacks:
-                agent_avg = sum(f.effectiveness for f in agent_feedbacks) / len(agent_feedbacks)
-                if agent_avg < 0.7:
-                    improvement_suggestions.append(
-                        f"{agent_name}智能体效果较差({agent_avg:.0%})，建议检查"
-                    )
+        improvement_suggestions.extend(agent_suggestions)
         
         return FeedbackAnalysisOutput(
             effectiveness_score=avg_effectiveness,
-            successful_actions=successful_actions[:10],
-            failed_actions=failed_actions[:10],
+            successful_actions=successful_actions,
+            failed_actions=failed_actions,
             parameter_adjustments=parameter_adjustments,
             learning_insights=learning_insights[:10],
             improvement_suggestions=improvement_suggestions[:5],
@@ -11,9 +11,19 @@ MBR智能体 (MBRAgent)
 
 import sys
 import os
+import json
 from typing import Dict, Any, Optional, List
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, replace
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
 
 # 添加项目根目录到Python路径
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -22,15 +32,25 @@ if root_dir not in sys.path:
 
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
 
-from LLM.llm_interface import LLMInterface
-from Knowledge.knowledge_base import get_knowledge_base
+from LLM.llm_interface import LLMInterface, get_chat_model
+from cache import now_str
+from Knowledge.knowledge_base import get_knowledge_base, KnowledgeBase
+from utils_numba import HAS_NUMBA, mbr_control_batch
+
+
+# 污染状态（下标即状态码/报警等级，对应 mbr_control_batch 的状态码）
+FOULING_STATUSES = np.array(["normal", "attention", "warning", "critical"])
+
+# 各污染状态的固定操作建议（预警状态含具体参数，按需格式化）
+_RECS_CRITICAL = ("立即停止产水", "启动化学清洗程序", "检查膜完整性", "清洗后进行通量恢复测试")
+_RECS_ATTENTION = ("加强监测TMP变化", "适当增加曝气量", "检查MLSS浓度")
+_RECS_NORMAL = ("保持当前运行参数", "定期执行反洗", "监测TMP趋势")
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MBRControlOutput:
-    """MBR控制输出数据结构"""
+    """MBR控制输出数据结构（不可变，PLC轮询时可安全共享）"""
     aeration_rate: float            # 曝气量 (m³/h)
     flux_setpoint: float            # 通量设定值 (LMH)
     backwash_needed: bool           # 是否需要反洗
@@ -60,6 +80,12 @@ class MBRControlOutput:
             "FOULING_STATUS": self.fouling_status.upper()
         }
     
+    def to_plc_json(self) -> bytes:
+        """PLC命令序列化为JSON字节串（直接写入PLC通信套接字；优先使用 orjson）"""
+        if HAS_ORJSON:
+            return orjson.dumps(self.to_plc_command())
+        return json.dumps(self.to_plc_command(), ensure_ascii=False).encode("utf-8")
+    
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
         return {
@@ -125,10 +151,10 @@ class MBRAgent:
 
 请基于以上原则，给出专业的MBR控制建议。"""
 
-    def __init__(self, llm_interface: LLMInterface = None):
+    def __init__(self, llm_interface: LLMInterface = None, kb: KnowledgeBase = None):
         """初始化MBR智能体"""
         self.llm_interface = llm_interface or LLMInterface()
-        self.kb = get_knowledge_base()
+        self.kb = kb if kb is not None else get_knowledge_base()
         self.chain = self._create_chain()
         
         # 获取设备参数
@@ -139,6 +165,21 @@ class MBRAgent:
             "tmp_warning": 30.0,
             "tmp_alarm": 40.0
         }
+        
+        # 正常工况（绝大多数轮询周期）的预构建输出，仅需替换曝气量和时间戳
+        self._normal_tmp_limit = self.params.get("tmp_warning", 30.0) * 0.8
+        self._normal_output = MBRControlOutput(
+            aeration_rate=0.0,
+            flux_setpoint=self.params.get("design_flux", 20.0),
+            backwash_needed=False,
+            chemical_cleaning_needed=False,
+            alarm_level=0,
+            fouling_status="normal",
+            decision_reason="膜运行正常",
+            recommendations=[],
+            confidence=0.85,
+            timestamp=""
+        )
     
     def _create_chain(self):
         """创建LangChain处理链"""
@@ -167,20 +208,22 @@ class MBRAgent:
         base_url = self.llm_interface.qwen_api_base or self.llm_interface.openai_api_base
         model_name = self.llm_interface.qwen_model_name or "qwen-plus"
         
-        llm = ChatOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            model=model_name,
-            temperature=0.3
-        )
+        # 进程内共享客户端（相同配置的智能体实例共用连接池）
+        llm = get_chat_model(api_key, base_url, model_name, 0.3)
         
         return prompt | llm | StrOutputParser()
     
     def _assess_fouling_status(self, tmp: float, flux: float) -> Dict[str, Any]:
         """评估膜污染状态"""
-        tmp_warning = self.params.get("tmp_warning", 30.0)
-        tmp_alarm = self.params.get("tmp_alarm", 40.0)
-        
+        return self._fouling_assessment(
+            tmp,
+            self.params.get("tmp_warning", 30.0),
+            self.params.get("tmp_alarm", 40.0)
+        )
+    
+    @staticmethod
+    def _fouling_assessment(tmp: float, tmp_warning: float, tmp_alarm: float) -> Dict[str, Any]:
+        """按TMP阈值判定膜污染状态"""
         if tmp >= tmp_alarm:
             return {
                 "status": "critical",
@@ -214,10 +257,14 @@ class MBRAgent:
                                    current_flux: float) -> Dict[str, float]:
         """计算控制参数"""
         assessment = self._assess_fouling_status(tmp, current_flux)
-        status = assessment["status"]
-        
-        design_flux = self.params.get("design_flux", 20.0)
-        
+        return self._control_params(
+            assessment["status"], current_aeration, self.params.get("design_flux", 20.0)
+        )
+    
+    @staticmethod
+    def _control_params(status: str, current_aeration: float,
+                        design_flux: float) -> Dict[str, float]:
+        """按污染状态计算控制参数"""
         if status == "critical":
             return {
                 "aeration_rate": current_aeration * 1.5,  # 大幅增加曝气
@@ -247,6 +294,43 @@ class MBRAgent:
                 "chemical_clean": False
             }
     
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _control_decision(status: str, aeration: float, design_flux: float) -> tuple:
+        """
+        控制决策核心（纯函数，按污染状态与曝气量缓存）
+        
+        TMP只经由污染状态影响决策，状态由调用方按原始读数判定后传入，
+        缓存键不含TMP读数本身，阈值判断不做任何量化。
+        
+        Returns:
+            tuple: (控制参数, 建议元组, 置信度)
+        """
+        # 计算控制参数
+        params = MBRAgent._control_params(status, aeration, design_flux)
+        
+        # 生成建议列表
+        if status == "critical":
+            recommendations = _RECS_CRITICAL
+        elif status == "warning":
+            recommendations = (
+                f"增加曝气量至{params['aeration_rate']:.0f} m³/h",
+                f"降低通量至{params['flux_setpoint']:.0f} LMH",
+                "缩短反洗间隔至30分钟",
+                "准备化学清洗备用"
+            )
+        elif status == "attention":
+            recommendations = _RECS_ATTENTION
+        else:
+            recommendations = _RECS_NORMAL
+        
+        # 计算置信度
+        confidence = 0.85
+        if status == "critical":
+            confidence = 0.90
+        
+        return params, recommendations, confidence
+    
     def run(self, system_status: str, current_tmp: float = 20.0,
             current_flux: float = 18.0, current_aeration: float = 50.0,
             mlss: float = 8.0) -> Dict[str, Any]:
@@ -275,13 +359,13 @@ class MBRAgent:
             return {
                 "status": "success",
                 "suggestion": llm_response,
-                "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                "timestamp": now_str()
             }
         except Exception as e:
             return {
                 "status": "error",
                 "suggestion": f"MBR控制决策生成失败: {str(e)}",
-                "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                "timestamp": now_str()
             }
     
     def generate_control_output(self, current_tmp: float = 20.0,
@@ -298,45 +382,22 @@ class MBRAgent:
         Returns:
             MBRControlOutput: 结构化控制输出
         """
-        # 评估污染状态
-        assessment = self._assess_fouling_status(current_tmp, current_flux)
-        
-        # 计算控制参数
-        params = self._calculate_control_params(current_tmp, current_aeration, current_flux)
+        # 正常工况快速路径：跳过评估与参数计算（按原始读数判断，阈值附近不受量化影响）
+        if current_tmp < self._normal_tmp_limit:
+            return replace(
+                self._normal_output,
+                aeration_rate=current_aeration,
+                recommendations=list(_RECS_NORMAL),
+                timestamp=now_str()
+            )
         
-        # 生成建议列表
-        recommendations = []
-        if assessment["status"] == "critical":
-            recommendations.extend([
-                "立即停止产水",
-                "启动化学清洗程序",
-                "检查膜完整性",
-                "清洗后进行通量恢复测试"
-            ])
-        elif assessment["status"] == "warning":
-            recommendations.extend([
-                f"增加曝气量至{params['aeration_rate']:.0f} m³/h",
-                f"降低通量至{params['flux_setpoint']:.0f} LMH",
-                "缩短反洗间隔至30分钟",
-                "准备化学清洗备用"
-            ])
-        elif assessment["status"] == "attention":
-            recommendations.extend([
-                "加强监测TMP变化",
-                "适当增加曝气量",
-                "检查MLSS浓度"
-            ])
-        else:
-            recommendations.extend([
-                "保持当前运行参数",
-                "定期执行反洗",
-                "监测TMP趋势"
-            ])
-        
-        # 计算置信度
-        confidence = 0.85
-        if assessment["status"] == "critical":
-            confidence = 0.90
+        # 按原始TMP读数评估污染状态，再按状态查询决策缓存（PLC轮询时状态与曝气量通常不变）
+        assessment = self._assess_fouling_status(current_tmp, current_flux)
+        params, recommendations, confidence = self._control_decision(
+            assessment["status"],
+            current_aeration,
+            self.params.get("design_flux", 20.0)
+        )
         
         return MBRControlOutput(
             aeration_rate=params["aeration_rate"],
@@ -346,11 +407,55 @@ class MBRAgent:
             alarm_level=assessment["alarm_level"],
             fouling_status=assessment["status"],
             decision_reason=assessment["reason"],
-            recommendations=recommendations,
+            recommendations=list(recommendations),
             confidence=confidence,
-            timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            timestamp=now_str()
         )
     
+    def generate_control_batch(self, tmp: np.ndarray,
+                               aeration: Any = 50.0) -> Dict[str, np.ndarray]:
+        """
+        批量生成MBR控制参数（多组膜池或历史工况回放；单次控制请使用 generate_control_output）
+        
+        Args:
+            tmp: 跨膜压差数组 (kPa)
+            aeration: 当前曝气量 (m³/h)，标量或与 tmp 等长的数组
+            
+        Returns:
+            Dict: 各控制参数数组
+        """
+        tmp = np.asarray(tmp, dtype=np.float64)
+        aeration = np.broadcast_to(np.asarray(aeration, dtype=np.float64), tmp.shape)
+        design_flux = float(self.params.get("design_flux", 20.0))
+        tmp_warning = float(self.params.get("tmp_warning", 30.0))
+        tmp_alarm = float(self.params.get("tmp_alarm", 40.0))
+        
+        if HAS_NUMBA:
+            status, aeration_rate, flux, backwash, chemical_clean = mbr_control_batch(
+                tmp, np.ascontiguousarray(aeration), design_flux, tmp_warning, tmp_alarm
+            )
+        else:
+            # 未安装 numba 时整列向量化计算，避免逐点解释执行
+            conditions = [tmp >= tmp_alarm, tmp >= tmp_warning, tmp >= tmp_warning * 0.8]
+            status = np.select(conditions, [3, 2, 1], default=0).astype(np.int8)
+            aeration_rate = np.select(
+                conditions, [aeration * 1.5, aeration * 1.2, aeration * 1.1], default=aeration
+            )
+            flux = np.select(
+                conditions, [0.0, design_flux * 0.75, design_flux * 0.9], default=design_flux
+            )
+            backwash = status >= 2
+            chemical_clean = status == 3
+        
+        return {
+            "aeration_rate": aeration_rate,
+            "flux_setpoint": flux,
+            "backwash_needed": backwash,
+            "chemical_cleaning_needed": chemical_clean,
+            "alarm_level": status,
+            "fouling_status": FOULING_STATUSES[status]
+        }
+    
     def get_plc_command(self, current_tmp: float = 20.0,
                         current_flux: float = 18.0,
                         current_aeration: float = 50.0) -> Dict[str, Any]:
@@ -12,19 +12,27 @@
 import sys
 import os
 import re
-from datetime import datetime
-from typing import Dict, Any, List, Optional
+import asyncio
+from string import Template
+from functools import cached_property, lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 
 # 添加项目根目录到Python路径
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.append(root_dir)
 
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+try:
+    import ahocorasick
+    HAS_AHOCORASICK = True
+except ImportError:
+    ahocorasick = None
+    HAS_AHOCORASICK = False
 
-from LLM.llm_interface import LLMInterface
+from LLM.llm_interface import LLMInterface, get_chat_model
+from cache import now_str
+from utils_async import run_sync
+from utils_report import get_report_writer
 from Knowledge.knowledge_base import get_knowledge_base
 
 # 导入所有子智能体
@@ -36,6 +44,221 @@ from Agent.DiagnosticAgent import DiagnosticAgent
 from Agent.FeedbackAgent import FeedbackAgent
 
 
+# 输入解析用正则（模块加载时编译一次）
+# 工艺类型：(正则, 取值分组)，按顺序匹配第一个命中项
+_PROCESS_PATTERNS = (
+    (re.compile(r"工艺[是为]?\s*([A-Za-z0-9\u4e00-\u9fa5]+)", re.IGNORECASE), 1),
+    (re.compile(r"(AAO|A2O|SBR|MBR|氧化沟)", re.IGNORECASE), 0),
+)
+_TIME_RE = re.compile(r"(\d+)\s*(小时|天|h|hour|day)", re.IGNORECASE)
+# 数值参数：单个多选正则一次扫描全部参数，按命中的关键词分派（每个参数取首次出现的值）
+_NUMERIC_RE = re.compile(r"(?:(毒性|氨氮|温度)[是为]?|([pP][hH])[值是为]?)\s*([\d.]+)")
+_NUMERIC_KEYS = {"毒性": "toxicity", "氨氮": "ammonia_n", "温度": "temperature"}
+
+# 意图关键词（按优先级排序，同时命中多个意图时取优先级最高者）
+_INTENT_KEYWORDS = (
+    # 1. 反馈收集（优先级最高，因为是用户主动反馈）
+    ("collect_feedback", ("反馈", "记录", "feedback", "建议", "意见", "改进")),
+    # 2. 再生控制（优先于转盘，因为再生也涉及活性炭）
+    ("check_regeneration", ("再生", "饱和", "regenerat", "再生温度", "加热")),
+    # 3. 系统诊断
+    ("system_diagnostic", ("诊断", "评估", "状态", "健康", "检测系统")),
+    # 4. 毒性预测
+    ("predict_toxicity", ("预测", "毒性", "forecast", "predict")),
+    # 5. MBR控制
+    ("control_mbr", ("mbr", "膜", "通量", "tmp", "跨膜压")),
+    # 6. 转盘控制
+    ("control_turntable", ("转盘", "吸附", "频率", "转速")),
+    # 7. 综合分析
+    ("full_analysis", ("综合", "全部", "整体", "完整")),
+)
+
+
+def _build_intent_matcher():
+    """
+    构建意图关键词匹配器，一次扫描输入即可得到全部命中关键词的优先级
+
+    安装 pyahocorasick 时使用 Aho-Corasick 自动机；否则回退为按优先级排列的
+    正则多选分支（零宽先行断言，每个位置都尝试匹配，结果与自动机一致）。
+
+    Returns:
+        Callable[[str], Iterator[int]]: 输入小写文本 -> 命中关键词的优先级序列
+    """
+    if HAS_AHOCORASICK:
+        automaton = ahocorasick.Automaton()
+        for priority, (_, keywords) in enumerate(_INTENT_KEYWORDS):
+            for keyword in keywords:
+                # 同一关键词出现在多个意图时保留优先级最高者
+                if keyword not in automaton:
+                    automaton.add_word(keyword, priority)
+        automaton.make_automaton()
+        return lambda text: (priority for _, priority in automaton.iter(text))
+    
+    keyword_priority = {}
+    for priority, (_, keywords) in enumerate(_INTENT_KEYWORDS):
+        for keyword in keywords:
+            keyword_priority.setdefault(keyword, priority)
+    pattern = re.compile(
+        "(?=(" + "|".join(map(re.escape, keyword_priority)) + "))"
+    )
+    return lambda text: (keyword_priority[m.group(1)] for m in pattern.finditer(text))
+
+
+_match_intent_keywords = _build_intent_matcher()
+
+
+@lru_cache(maxsize=256)
+def _classify_intent(input_lower: str) -> str:
+    """按关键词优先级识别意图（相同输入直接复用结果）"""
+    priority = min(_match_intent_keywords(input_lower), default=None)
+    if priority is None:
+        return "general_query"
+    return _INTENT_KEYWORDS[priority][0]
+
+
+
+# 综合报告模板（模块加载时构建一次）
+_REPORT_HEADER = Template("""# Aquamind 水处理智能体系统报告
+生成时间: $timestamp
+
+## 1. 用户请求
+- **原始输入**: $user_input
+- **识别意图**: $intent
+- **提取参数**: $params
+
+""")
+
+_REPORT_FOOTER = """
+---
+*Aquamind Systems - 您的智慧水务专家*
+"""
+
+
+def _toxicity_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+    """毒性预测段落字段"""
+    return {
+        "status": result.get('status', 'unknown'),
+        "analysis": result.get('analysis', '无分析结果')
+    }
+
+
+def _turntable_fields(tt: Dict[str, Any]) -> Dict[str, Any]:
+    """转盘控制段落字段"""
+    return {
+        "frequency": f"{tt.get('frequency_1', 0):.1f}",
+        "rpm": f"{tt.get('rpm_1', 0):.0f}",
+        "reactors": tt.get('active_reactors', 2),
+        "standby": '是' if tt.get('standby_triggered') else '否',
+        "removal_rate": f"{tt.get('expected_removal_rate', 0):.1f}",
+        "reason": tt.get('decision_reason', '')
+    }
+
+
+def _mbr_fields(mbr: Dict[str, Any]) -> Dict[str, Any]:
+    """MBR控制段落字段"""
+    return {
+        "aeration": f"{mbr.get('aeration_rate', 50):.1f}",
+        "flux": f"{mbr.get('flux_setpoint', 18):.1f}",
+        "fouling": mbr.get('fouling_status', 'normal'),
+        "backwash": '是' if mbr.get('backwash_needed') else '否',
+        "chemical_clean": '是' if mbr.get('chemical_cleaning_needed') else '否'
+    }
+
+
+def _regeneration_fields(regen: Dict[str, Any]) -> Dict[str, Any]:
+    """再生评估段落字段"""
+    return {
+        "needed": '是' if regen.get('regeneration_needed') else '否',
+        "mode": regen.get('regeneration_mode', 'standby'),
+        "temperature": f"{regen.get('furnace_temperature', 0):.0f}",
+        "feed_rate": f"{regen.get('feed_rate', 0):.1f}",
+        "reason": regen.get('decision_reason', '')
+    }
+
+
+def _diagnostic_fields(diag: Dict[str, Any]) -> Dict[str, Any]:
+    """系统诊断段落字段（列表项预先拼接）"""
+    subsystems = "".join(
+        f"- **{status.get('name', name)}**: {status.get('health_level', '未知')} ({status.get('score', 0):.0f}分)\n"
+        for name, status in diag.get('subsystem_status', {}).items()
+    )
+    critical_issues = ""
+    if diag.get('critical_issues'):
+        critical_issues = "\n### 严重问题\n" + "".join(
+            f"- ⚠️ {issue}\n" for issue in diag['critical_issues']
+        )
+    recommendations = ""
+    if diag.get('recommendations'):
+        recommendations = "\n### 改进建议\n" + "".join(
+            f"- {rec}\n" for rec in diag['recommendations'][:5]
+        )
+    return {
+        "overall_health": diag.get('overall_health', '未知'),
+        "overall_score": f"{diag.get('overall_score', 0):.1f}",
+        "subsystems": subsystems,
+        "critical_issues": critical_issues,
+        "recommendations": recommendations
+    }
+
+
+def _feedback_fields(fb: Dict[str, Any]) -> Dict[str, Any]:
+    """反馈收集段落字段"""
+    return {
+        "feedback_type": fb.get('feedback_type', '未知'),
+        "status": fb.get('status', '已记录'),
+        "content": fb.get('original_input', ''),
+        "adjustment": fb.get('parameter_adjustment', '无')
+    }
+
+
+# 报告段落：(结果键, 段落模板, 字段构建函数)，按此顺序输出
+_REPORT_SECTIONS = (
+    ("toxicity", Template("""## 2. 毒性预测分析 (ToxicityAgent)
+**状态**: $status
+
+$analysis
+
+"""), _toxicity_fields),
+    ("turntable", Template("""## 3. 转盘控制建议 (TurntableAgent)
+- **推荐频率**: $frequency Hz
+- **转速**: $rpm rpm
+- **活跃反应器**: $reactors 台
+- **备用触发**: $standby
+- **预期去除率**: $removal_rate%
+- **决策原因**: $reason
+
+"""), _turntable_fields),
+    ("mbr", Template("""## 4. MBR控制建议 (MBRAgent)
+- **曝气量**: $aeration m³/h
+- **通量设定**: $flux LMH
+- **污染状态**: $fouling
+- **需要反洗**: $backwash
+- **需要化学清洗**: $chemical_clean
+
+"""), _mbr_fields),
+    ("regeneration", Template("""## 5. 再生系统评估 (RegenerationAgent)
+- **需要再生**: $needed
+- **再生模式**: $mode
+- **炉温设定**: $temperature°C
+- **进料速度**: $feed_rate kg/h
+- **决策原因**: $reason
+
+"""), _regeneration_fields),
+    ("diagnostic", Template("""## 6. 系统诊断 (DiagnosticAgent)
+- **整体健康**: $overall_health
+- **综合评分**: $overall_score/100
+
+### 子系统状态
+$subsystems$critical_issues$recommendations"""), _diagnostic_fields),
+    ("feedback", Template("""## 7. 反馈收集 (FeedbackAgent)
+- **反馈类型**: $feedback_type
+- **处理状态**: $status
+- **反馈内容**: $content
+- **参数调整建议**: $adjustment
+
+"""), _feedback_fields),
+)
+
 class MainOrchestrator:
     """
     总智能体 (MainOrchestrator)
@@ -79,13 +302,7 @@ class MainOrchestrator:
         self.llm_interface = LLMInterface()
         self.kb = get_knowledge_base()
         
-        # 初始化所有子智能体
-        self.toxicity_agent = ToxicityAgent(self.llm_interface)
-        self.turntable_agent = TurntableAgent(self.llm_interface)
-        self.regeneration_agent = RegenerationAgent(self.llm_interface)
-        self.mbr_agent = MBRAgent(self.llm_interface)
-        self.diagnostic_agent = DiagnosticAgent(self.llm_interface)
-        self.feedback_agent = FeedbackAgent(self.llm_interface)
+        # 子智能体在首次使用时创建（见下方同名属性），单一意图的请求只构建所需的智能体
         
         # 系统状态
         self.system_state = {
@@ -97,13 +314,80 @@ class MainOrchestrator:
             "last_update": None
         }
         
-        # 创建意图识别链
-        self.intent_chain = self._create_intent_chain()
+        # 报告后台写盘（各总控智能体共用，见 utils_report）
+        self._report_writer = get_report_writer()
+        
+        # 意图 -> 调度路由 [(结果键, 智能体名称, 调度函数(user_input, params))]
+        # 调度函数为协程函数时直接在事件循环中等待，否则放入线程池
+        routes = {
+            "predict_toxicity": ("toxicity", "ToxicityAgent", self._arun_toxicity),
+            "control_turntable": ("turntable", "TurntableAgent",
+                                  lambda user_input, params: self._run_turntable(params)),
+            "control_mbr": ("mbr", "MBRAgent",
+                            lambda user_input, params: self._run_mbr()),
+            "check_regeneration": ("regeneration", "RegenerationAgent",
+                                   lambda user_input, params: self._run_regeneration()),
+            "system_diagnostic": ("diagnostic", "DiagnosticAgent",
+                                  lambda user_input, params: self._run_diagnostic()),
+            "collect_feedback": ("feedback", "FeedbackAgent",
+                                 lambda user_input, params: self._run_feedback(user_input)),
+        }
+        self._intent_routes = {intent: (route,) for intent, route in routes.items()}
+        self._intent_routes["full_analysis"] = tuple(routes.values())
+        
+        # 离线批量模式中可经 Batch API 完成的路由：结果键 -> (构建请求消息, 由分析生成结果)
+        # 构建函数返回 None 时该请求不进入批量任务，在 collect_batch 中交互式执行；
+        # 其余路由为规则计算，在 collect_batch 中本地完成
+        self._batch_routes = {
+            "toxicity": (lambda user_input: self.toxicity_agent.batch_messages(user_input),
+                         lambda user_input, analysis: self.toxicity_agent.batch_result(user_input, analysis)),
+            "feedback": (lambda user_input: self.feedback_agent.batch_messages(feedback_data=user_input),
+                         lambda user_input, analysis: self._feedback_result(
+                             user_input, self.feedback_agent.batch_result(analysis))),
+        }
         
         print("[MainOrchestrator] 智能体系统初始化完成")
     
+    @cached_property
+    def toxicity_agent(self) -> ToxicityAgent:
+        """毒性预测智能体"""
+        return ToxicityAgent(self.llm_interface, kb=self.kb)
+    
+    @cached_property
+    def turntable_agent(self) -> TurntableAgent:
+        """转盘智能体"""
+        return TurntableAgent(self.llm_interface, kb=self.kb)
+    
+    @cached_property
+    def regeneration_agent(self) -> RegenerationAgent:
+        """再生智能体"""
+        return RegenerationAgent(self.llm_interface, kb=self.kb)
+    
+    @cached_property
+    def mbr_agent(self) -> MBRAgent:
+        """MBR智能体"""
+        return MBRAgent(self.llm_interface, kb=self.kb)
+    
+    @cached_property
+    def diagnostic_agent(self) -> DiagnosticAgent:
+        """诊断智能体"""
+        return DiagnosticAgent(self.llm_interface, kb=self.kb)
+    
+    @cached_property
+    def feedback_agent(self) -> FeedbackAgent:
+        """反馈智能体"""
+        return FeedbackAgent(self.llm_interface, kb=self.kb)
+    
+    @cached_property
+    def intent_chain(self):
+        """LLM意图识别链（首次使用时创建；常规请求走关键词匹配，不加载该链）"""
+        return self._create_intent_chain()
+    
     def _create_intent_chain(self):
         """创建意图识别链"""
+        from langchain.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+        
         prompt = ChatPromptTemplate.from_messages([
             ("system", """分析用户输入，识别意图和关键参数。
 
@@ -128,17 +412,18 @@ class MainOrchestrator:
         base_url = self.llm_interface.qwen_api_base or self.llm_interface.openai_api_base
         model_name = self.llm_interface.qwen_model_name or "qwen-plus"
         
-        llm = ChatOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            model=model_name,
-            temperature=0.2
-        )
+        # 进程内共享客户端（相同配置的智能体实例共用连接池）
+        llm = get_chat_model(api_key, base_url, model_name, 0.2)
         
         return prompt | llm | StrOutputParser()
     
-    def _parse_input(self, user_input: str) -> Dict[str, Any]:
-        """解析用户输入，提取关键信息"""
+    def _scan(self, user_input: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        一次扫描用户输入，同时识别意图并提取关键信息
+        
+        Returns:
+            Tuple[str, Dict]: (意图, 参数)
+        """
         params = {
             "treatment_process": "智能体调控",
             "time_frame": "24小时",
@@ -149,68 +434,83 @@ class MainOrchestrator:
         }
         
         # 提取工艺类型
-        process_patterns = [
-            (r"工艺[是为]?\s*([A-Za-z0-9\u4e00-\u9fa5]+)", 1),
-            (r"(AAO|A2O|SBR|MBR|氧化沟)", 0)
-        ]
-        for pattern, group in process_patterns:
-            match = re.search(pattern, user_input, re.IGNORECASE)
+        for pattern, group in _PROCESS_PATTERNS:
+            match = pattern.search(user_input)
             if match:
-                params["treatment_process"] = match.group(group + 1) if group else match.group(0)
+                params["treatment_process"] = match.group(group)
                 break
         
         # 提取时间范围
-        time_match = re.search(r"(\d+)\s*(小时|天|h|hour|day)", user_input, re.IGNORECASE)
+        time_match = _TIME_RE.search(user_input)
         if time_match:
             params["time_frame"] = f"{time_match.group(1)}{time_match.group(2)}"
         
         # 提取数值参数
-        patterns = {
-            "toxicity": r"毒性[是为]?\s*([\d.]+)",
-            "ammonia_n": r"氨氮[是为]?\s*([\d.]+)",
-            "temperature": r"温度[是为]?\s*([\d.]+)",
-            "ph": r"[pP][hH][值是为]?\s*([\d.]+)"
-        }
+        for match in _NUMERIC_RE.finditer(user_input):
+            key = "ph" if match.group(2) else _NUMERIC_KEYS[match.group(1)]
+            if params[key] is None:
+                params[key] = float(match.group(3))
         
-        for key, pattern in patterns.items():
-            match = re.search(pattern, user_input)
-            if match:
-                params[key] = float(match.group(1))
-        
-        return params
+        return _classify_intent(user_input.lower()), params
+    
+    def _parse_input(self, user_input: str) -> Dict[str, Any]:
+        """解析用户输入，提取关键信息"""
+        return self._scan(user_input)[1]
     
     def _identify_intent(self, user_input: str) -> str:
         """识别用户意图"""
-        input_lower = user_input.lower()
-        
-        # 关键词匹配（按优先级排序）
-        # 1. 反馈收集（优先级最高，因为是用户主动反馈）
-        if any(kw in input_lower for kw in ["反馈", "记录", "feedback", "建议", "意见", "改进"]):
-            return "collect_feedback"
-        # 2. 再生控制（优先于转盘，因为再生也涉及活性炭）
-        elif any(kw in input_lower for kw in ["再生", "饱和", "regenerat", "再生温度", "加热"]):
-            return "check_regeneration"
-        # 3. 系统诊断
-        elif any(kw in input_lower for kw in ["诊断", "评估", "状态", "健康", "检测系统"]):
-            return "system_diagnostic"
-        # 4. 毒性预测
-        elif any(kw in input_lower for kw in ["预测", "毒性", "forecast", "predict"]):
-            return "predict_toxicity"
-        # 5. MBR控制
-        elif any(kw in input_lower for kw in ["mbr", "膜", "通量", "tmp", "跨膜压"]):
-            return "control_mbr"
-        # 6. 转盘控制
-        elif any(kw in input_lower for kw in ["转盘", "吸附", "频率", "转速"]):
-            return "control_turntable"
-        # 7. 综合分析
-        elif any(kw in input_lower for kw in ["综合", "全部", "整体", "完整"]):
-            return "full_analysis"
-        else:
-            return "general_query"
+        return _classify_intent(user_input.lower())
     
-    def run(self, user_input: str) -> str:
+    async def _arun_toxicity(self, user_input: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """调度 ToxicityAgent（异步请求LLM，不占用线程池）"""
+        return await self.toxicity_agent.arun(user_input)
+    
+    def _run_turntable(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """调度 TurntableAgent"""
+        toxicity = params.get("toxicity") or self.system_state.get("toxicity", 2.0)
+        turntable_output = self.turntable_agent.generate_control_output(
+            toxicity=toxicity,
+            toxicity_level=self._get_toxicity_level(toxicity),
+            trend="稳定"
+        )
+        return turntable_output.to_dict()
+    
+    def _run_mbr(self) -> Dict[str, Any]:
+        """调度 MBRAgent"""
+        mbr_output = self.mbr_agent.generate_control_output(
+            current_tmp=self.system_state.get("mbr_tmp", 20.0)
+        )
+        return mbr_output.to_dict()
+    
+    def _run_regeneration(self) -> Dict[str, Any]:
+        """调度 RegenerationAgent"""
+        regen_output = self.regeneration_agent.generate_control_output(
+            adsorption_efficiency=self.system_state.get("carbon_efficiency", 85.0)
+        )
+        return regen_output.to_dict()
+    
+    def _run_diagnostic(self) -> Dict[str, Any]:
+        """调度 DiagnosticAgent"""
+        return self.diagnostic_agent.generate_diagnostic_report().to_dict()
+    
+    def _run_feedback(self, user_input: str) -> Dict[str, Any]:
+        """调度 FeedbackAgent，将用户反馈记录到系统"""
+        return self._feedback_result(user_input, self.feedback_agent.run(feedback_data=user_input))
+    
+    @staticmethod
+    def _feedback_result(user_input: str, feedback_result: Dict[str, Any]) -> Dict[str, Any]:
+        """为反馈分析结果添加原始输入和反馈类型信息"""
+        feedback_result["original_input"] = user_input
+        feedback_result["feedback_type"] = "操作员反馈"
+        feedback_result["parameter_adjustment"] = "已记录，将用于后续优化"
+        return feedback_result
+    
+    async def arun(self, user_input: str) -> str:
         """
-        运行主流程
+        运行主流程（异步）
+        
+        各子智能体相互独立：LLM分析以协程并发请求，其余阻塞调用放入线程池并发执行，
+        综合分析的总耗时约为最慢子智能体的耗时。
         
         Args:
             user_input: 用户输入的自然语言请求
@@ -218,201 +518,171 @@ class MainOrchestrator:
         Returns:
             str: 最终报告
         """
-        timestamp = datetime.now().strftime('%H:%M:%S')
+        timestamp = now_str('%H:%M:%S')
         print(f"[{timestamp}] MainOrchestrator: 收到请求，正在分析...")
         
         # 1. 解析输入
-        params = self._parse_input(user_input)
-        intent = self._identify_intent(user_input)
+        intent, params = self._scan(user_input)
         
         print(f"[{timestamp}] 识别意图: {intent}")
         print(f"[{timestamp}] 提取参数: {params}")
         
-        # 2. 根据意图调度子智能体
-        results = {}
+        # 2. 根据意图并发调度子智能体
+        tasks = {}
+        for name, agent_name, dispatch in self._intent_routes.get(intent, ()):
+            print(f"[{timestamp}] 调度 {agent_name}...")
+            if asyncio.iscoroutinefunction(dispatch):
+                tasks[name] = dispatch(user_input, params)
+            else:
+                tasks[name] = asyncio.to_thread(dispatch, user_input, params)
         
-        if intent == "predict_toxicity" or intent == "full_analysis":
-            print(f"[{timestamp}] 调度 ToxicityAgent...")
-            results["toxicity"] = self.toxicity_agent.run(user_input)
-            
-            # 更新系统状态
-            if results["toxicity"]["status"] == "success":
-                # 从分析中提取毒性值（简化处理）
-                self.system_state["last_update"] = timestamp
-        
-        if intent in ["control_turntable", "full_analysis"]:
-            print(f"[{timestamp}] 调度 TurntableAgent...")
-            toxicity = params.get("toxicity") or self.system_state.get("toxicity", 2.0)
-            turntable_output = self.turntable_agent.generate_control_output(
-                toxicity=toxicity,
-                toxicity_level=self._get_toxicity_level(toxicity),
-                trend="稳定"
-            )
-            results["turntable"] = turntable_output.to_dict()
+        outputs = await asyncio.gather(*tasks.values(), return_exceptions=True)
         
-        if intent in ["control_mbr", "full_analysis"]:
-            print(f"[{timestamp}] 调度 MBRAgent...")
-            mbr_output = self.mbr_agent.generate_control_output(
-                current_tmp=self.system_state.get("mbr_tmp", 20.0)
-            )
-            results["mbr"] = mbr_output.to_dict()
-        
-        if intent in ["check_regeneration", "full_analysis"]:
-            print(f"[{timestamp}] 调度 RegenerationAgent...")
-            regen_output = self.regeneration_agent.generate_control_output(
-                adsorption_efficiency=self.system_state.get("carbon_efficiency", 85.0)
-            )
-            results["regeneration"] = regen_output.to_dict()
-        
-        if intent in ["system_diagnostic", "full_analysis"]:
-            print(f"[{timestamp}] 调度 DiagnosticAgent...")
-            diagnostic_report = self.diagnostic_agent.generate_diagnostic_report()
-            results["diagnostic"] = diagnostic_report.to_dict()
-        
-        if intent in ["collect_feedback", "full_analysis"]:
-            print(f"[{timestamp}] 调度 FeedbackAgent...")
-            # 将用户反馈记录到系统
-            feedback_result = self.feedback_agent.run(feedback_data=user_input)
-            # 添加原始输入和反馈类型信息
-            feedback_result["original_input"] = user_input
-            feedback_result["feedback_type"] = "操作员反馈"
-            feedback_result["parameter_adjustment"] = "已记录，将用于后续优化"
-            results["feedback"] = feedback_result
+        results = {}
+        for name, output in zip(tasks, outputs):
+            if isinstance(output, Exception):
+                # 单个子智能体失败不影响其余结果
+                print(f"[{timestamp}] {name} 调度失败: {output}")
+                results[name] = {"status": "error", "analysis": f"调度失败: {output}"}
+            else:
+                results[name] = output
+        
+        # 更新系统状态
+        if results.get("toxicity", {}).get("status") == "success":
+            # 从分析中提取毒性值（简化处理）
+            self.system_state["last_update"] = timestamp
         
         # 3. 生成综合报告
         report = self._generate_report(user_input, params, intent, results)
         
         # 4. 保存报告
-        report_path = self._save_report(report)
-        print(f"[{timestamp}] 报告已生成: {report_path}")
+        report_path = self._report_writer.submit(report)
+        print(f"[{timestamp}] 报告已提交保存: {report_path}")
         
         return report
     
-    def _get_toxicity_level(self, toxicity: float) -> str:
-        """获取毒性等级"""
-        if toxicity < 1.5:
-            return "低"
-        elif toxicity < 3.0:
-            return "中"
-        else:
-            return "高"
-    
-    def _generate_report(self, user_input: str, params: Dict, 
-                         intent: str, results: Dict) -> str:
-        """生成综合报告"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    def run(self, user_input: str) -> str:
+        """
+        运行主流程（arun 的同步封装）
         
-        report = f"""# Aquamind 水处理智能体系统报告
-生成时间: {timestamp}
-
-## 1. 用户请求
-- **原始输入**: {user_input}
-- **识别意图**: {intent}
-- **提取参数**: {params}
-
-"""
+        Args:
+            user_input: 用户输入的自然语言请求
+            
+        Returns:
+            str: 最终报告
+        """
+        return run_sync(self.arun(user_input))
+    
+    def submit_batch(self, user_inputs: List[str]) -> Optional[str]:
+        """
+        离线批量模式：提交一组请求中需要LLM分析的部分为一个批量任务
         
-        # 毒性预测结果
-        if "toxicity" in results:
-            toxicity_result = results["toxicity"]
-            report += f"""## 2. 毒性预测分析 (ToxicityAgent)
-**状态**: {toxicity_result.get('status', 'unknown')}
-
-{toxicity_result.get('analysis', '无分析结果')}
-
-"""
+        适用于定时报告等可延迟完成的场景，按 Batch API 计费。批量任务中模型无法调用工具，
+        毒性预测仅在预测工具参数齐备时进入批量任务（工具在本地运行，提交结果供模型撰写分析）；
+        反馈分析以与 run 相同的提示词提交；其余子智能体为规则计算，在 collect_batch 时本地完成。
         
-        # 转盘控制结果
-        if "turntable" in results:
-            tt = results["turntable"]
-            report += f"""## 3. 转盘控制建议 (TurntableAgent)
-- **推荐频率**: {tt.get('frequency_1', 0):.1f} Hz
-- **转速**: {tt.get('rpm_1', 0):.0f} rpm
-- **活跃反应器**: {tt.get('active_reactors', 2)} 台
-- **备用触发**: {'是' if tt.get('standby_triggered') else '否'}
-- **预期去除率**: {tt.get('expected_removal_rate', 0):.1f}%
-- **决策原因**: {tt.get('decision_reason', '')}
-
-"""
+        Args:
+            user_inputs: 用户请求列表
+            
+        Returns:
+            Optional[str]: 批量任务ID；没有需要LLM分析的请求时返回 None
+        """
+        requests = {}
+        for i, user_input in enumerate(user_inputs):
+            intent, _ = self._scan(user_input)
+            for name, _, _ in self._intent_routes.get(intent, ()):
+                if name in self._batch_routes:
+                    messages = self._batch_routes[name][0](user_input)
+                    if messages is not None:
+                        requests[f"{name}-{i}"] = messages
+        
+        if not requests:
+            return None
+        
+        batch_id = self.llm_interface.submit_batch(requests)
+        print(f"[{now_str('%H:%M:%S')}] 批量任务已提交: {batch_id} ({len(requests)} 条LLM请求)")
+        return batch_id
+    
+    def collect_batch(self, batch_id: Optional[str], user_inputs: List[str],
+                      poll_interval: float = 30.0, timeout: float = None) -> List[str]:
+        """
+        取回批量任务结果并为每条请求生成报告
         
-        # MBR控制结果
-        if "mbr" in results:
-            mbr = results["mbr"]
-            report += f"""## 4. MBR控制建议 (MBRAgent)
-- **曝气量**: {mbr.get('aeration_rate', 50):.1f} m³/h
-- **通量设定**: {mbr.get('flux_setpoint', 18):.1f} LMH
-- **污染状态**: {mbr.get('fouling_status', 'normal')}
-- **需要反洗**: {'是' if mbr.get('backwash_needed') else '否'}
-- **需要化学清洗**: {'是' if mbr.get('chemical_cleaning_needed') else '否'}
-
-"""
+        未进入批量任务（或批量任务未返回结果）的LLM分析在此交互式执行，规则计算在本地完成。
         
-        # 再生检查结果
-        if "regeneration" in results:
-            regen = results["regeneration"]
-            report += f"""## 5. 再生系统评估 (RegenerationAgent)
-- **需要再生**: {'是' if regen.get('regeneration_needed') else '否'}
-- **再生模式**: {regen.get('regeneration_mode', 'standby')}
-- **炉温设定**: {regen.get('furnace_temperature', 0):.0f}°C
-- **进料速度**: {regen.get('feed_rate', 0):.1f} kg/h
-- **决策原因**: {regen.get('decision_reason', '')}
-
-"""
+        Args:
+            batch_id: submit_batch 返回的任务ID
+            user_inputs: 提交时的用户请求列表（顺序需一致）
+            poll_interval: 初始轮询间隔（秒），之后指数退避
+            timeout: 最长等待时间（秒）
+            
+        Returns:
+            List[str]: 与 user_inputs 一一对应的报告
+        """
+        analyses = {}
+        if batch_id:
+            analyses = self.llm_interface.collect_batch(
+                batch_id, poll_interval=poll_interval, timeout=timeout
+            )
         
-        # 诊断结果
-        if "diagnostic" in results:
-            diag = results["diagnostic"]
-            report += f"""## 6. 系统诊断 (DiagnosticAgent)
-- **整体健康**: {diag.get('overall_health', '未知')}
-- **综合评分**: {diag.get('overall_score', 0):.1f}/100
-
-### 子系统状态
-"""
-            for name, status in diag.get('subsystem_status', {}).items():
-                report += f"- **{status.get('name', name)}**: {status.get('health_level', '未知')} ({status.get('score', 0):.0f}分)\n"
+        reports = []
+        for i, user_input in enumerate(user_inputs):
+            intent, params = self._scan(user_input)
+            results = {}
             
-            if diag.get('critical_issues'):
-                report += "\n### 严重问题\n"
-                for issue in diag['critical_issues']:
-                    report += f"- ⚠️ {issue}\n"
+            for name, _, dispatch in self._intent_routes.get(intent, ()):
+                analysis = analyses.get(f"{name}-{i}")
+                if analysis is not None:
+                    results[name] = self._batch_routes[name][1](user_input, analysis)
+                elif asyncio.iscoroutinefunction(dispatch):
+                    results[name] = run_sync(dispatch(user_input, params))
+                else:
+                    results[name] = dispatch(user_input, params)
             
-            if diag.get('recommendations'):
-                report += "\n### 改进建议\n"
-                for rec in diag['recommendations'][:5]:
-                    report += f"- {rec}\n"
-        
-        # 反馈收集结果
-        if "feedback" in results:
-            fb = results["feedback"]
-            report += f"""## 7. 反馈收集 (FeedbackAgent)
-- **反馈类型**: {fb.get('feedback_type', '未知')}
-- **处理状态**: {fb.get('status', '已记录')}
-- **反馈内容**: {fb.get('original_input', '')}
-- **参数调整建议**: {fb.get('parameter_adjustment', '无')}
-
-"""
+            report = self._generate_report(user_input, params, intent, results)
+            self._report_writer.submit(report)
+            reports.append(report)
         
-        report += """
----
-*Aquamind Systems - 您的智慧水务专家*
-"""
-        
-        return report
+        return reports
     
-    def _save_report(self, report: str) -> str:
-        """保存报告"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        report_dir = os.path.join(root_dir, "Report")
-        
-        if not os.path.exists(report_dir):
-            os.makedirs(report_dir)
+    def run_batch(self, user_inputs: List[str], poll_interval: float = 30.0,
+                  timeout: float = None) -> List[str]:
+        """
+        离线批量运行（submit_batch + collect_batch，阻塞直到批量任务完成）
         
-        report_path = os.path.join(report_dir, f"Report_{timestamp}.md")
+        Args:
+            user_inputs: 用户请求列表
+            poll_interval: 初始轮询间隔（秒）
+            timeout: 最长等待时间（秒）
+            
+        Returns:
+            List[str]: 与 user_inputs 一一对应的报告
+        """
+        batch_id = self.submit_batch(user_inputs)
+        return self.collect_batch(batch_id, user_inputs, poll_interval=poll_interval, timeout=timeout)
+    
+    def _get_toxicity_level(self, toxicity: float) -> str:
+        """获取毒性等级"""
+        if toxicity < 1.5:
+            return "低"
+        elif toxicity < 3.0:
+            return "中"
+        else:
+            return "高"
+    
+    def _generate_report(self, user_input: str, params: Dict, 
+                         intent: str, results: Dict) -> str:
+        """生成综合报告（按 _REPORT_SECTIONS 渲染各段落模板）"""
+        parts = [_REPORT_HEADER.substitute(
+            timestamp=now_str(), user_input=user_input, intent=intent, params=params
+        )]
         
-        with open(report_path, "w", encoding="utf-8") as f:
-            f.write(report)
+        for key, template, fields in _REPORT_SECTIONS:
+            if key in results:
+                parts.append(template.substitute(fields(results[key])))
         
-        return report_path
+        parts.append(_REPORT_FOOTER)
+        return "".join(parts)
     
     def quick_predict(self, toxicity: float = None, ammonia: float = None,
                       temperature: float = None) -> Dict[str, Any]:
@@ -11,9 +11,19 @@
 
 import sys
 import os
-from typing import Dict, Any, Optional, List
+import json
+from typing import Dict, Any, Optional, List, AsyncIterator
 from dataclasses import dataclass
-from datetime import datetime
+from functools import cached_property, lru_cache
+
+import numpy as np
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
 
 # 添加项目根目录到Python路径
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -22,15 +32,67 @@ if root_dir not in sys.path:
 
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
 
-from LLM.llm_interface import LLMInterface
-from Knowledge.knowledge_base import get_knowledge_base
+from LLM.llm_interface import LLMInterface, get_chat_model, build_system_message
+from Knowledge.knowledge_base import get_knowledge_base, KnowledgeBase
+from cache import ResponseCache, SingleFlight, make_cache_key, now_str
+
+
+# 再生需求判定结果（下标即 assess_batch 的判定码，顺序同 _assess_regeneration_need 的判断顺序）
+ASSESSMENT_NEED = np.array([True, True, True, True, False])
+ASSESSMENT_MODES = np.array(["intensive", "normal", "normal", "energy_saving", "normal"])
+ASSESSMENT_URGENCY = np.array(["high", "medium", "medium", "low", "low"])
+ASSESSMENT_REASONS = np.array([
+    "活性炭严重饱和，需要强化再生",
+    "吸附能力下降，需要常规再生",
+    "已达到周期性再生时间",
+    "预防性再生，节能模式",
+    "活性炭状态良好，无需再生"
+])
+
+# 无需再生时的固定建议 / 强化再生的附加建议
+_RECS_STANDBY = ("继续正常运行", "定期监测吸附效率")
+_RECS_INTENSIVE_EXTRA = ("注意监控炉温，防止过热", "再生后测试活性炭碘值")
+
+# 设备参数与专家规则在进程内不变，按知识库实例缓存，多个智能体实例共用
+@lru_cache(maxsize=None)
+def _equipment_params(kb: KnowledgeBase) -> Dict[str, float]:
+    """再生系统设备参数（知识库中缺失时使用默认值）"""
+    equipment = kb.get_equipment("regeneration_system")
+    return equipment.parameters if equipment else {
+        "design_capacity": 50.0,
+        "regen_temperature": 800.0,
+        "residence_time": 30.0,
+        "recovery_rate": 0.95
+    }
+
+
+@lru_cache(maxsize=None)
+def _mode_parameters(kb: KnowledgeBase) -> Dict[str, Dict[str, float]]:
+    """由专家规则构建各再生模式的参数"""
+    rules = kb.get_expert_rule("regeneration_control") or {}
+    return {
+        "normal": {
+            "temperature": rules.get("normal_regeneration", {}).get("temperature", 800.0),
+            "feed_rate": rules.get("normal_regeneration", {}).get("feed_rate", 30.0),
+            "duration": 8.0
+        },
+        "intensive": {
+            "temperature": rules.get("intensive_regeneration", {}).get("temperature", 850.0),
+            "feed_rate": rules.get("intensive_regeneration", {}).get("feed_rate", 40.0),
+            "duration": 6.0
+        },
+        "energy_saving": {
+            "temperature": rules.get("energy_saving", {}).get("temperature", 750.0),
+            "feed_rate": rules.get("energy_saving", {}).get("feed_rate", 25.0),
+            "duration": 10.0
+        }
+    }
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class RegenerationControlOutput:
-    """再生控制输出数据结构"""
+    """再生控制输出数据结构（不可变，PLC轮询时可安全共享）"""
     regeneration_needed: bool       # 是否需要再生
     furnace_temperature: float      # 再生炉温度 (°C)
     feed_rate: float                # 进料速度 (kg/h)
@@ -56,6 +118,12 @@ class RegenerationControlOutput:
             "ESTIMATED_DURATION_H": round(self.estimated_duration, 1)
         }
     
+    def to_plc_json(self) -> bytes:
+        """PLC命令序列化为JSON字节串（直接写入PLC通信套接字；优先使用 orjson）"""
+        if HAS_ORJSON:
+            return orjson.dumps(self.to_plc_command())
+        return json.dumps(self.to_plc_command(), ensure_ascii=False).encode("utf-8")
+    
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
         return {
@@ -115,25 +183,45 @@ class RegenerationAgent:
 
 请基于以上原则，给出专业的再生控制建议。"""
 
-    def __init__(self, llm_interface: LLMInterface = None):
+    # 再生判断阈值
+    SEVERE_EFFICIENCY_THRESHOLD = 60.0  # 吸附效率低于60%需要强化再生
+    SEVERE_REMOVAL_THRESHOLD = 40.0     # 去除率低于40%需要强化再生
+    EFFICIENCY_THRESHOLD = 80.0         # 吸附效率低于80%需要再生
+    REMOVAL_THRESHOLD = 60.0            # 去除率低于60%需要再生
+    HOURS_THRESHOLD = 720.0             # 运行超过720小时需要再生
+    PREVENTIVE_HOURS_RATIO = 0.8        # 运行超过周期的80%进行预防性再生
+
+    # LLM响应缓存键的输入量化精度（小数位数），轮询时的微小波动命中同一缓存；
+    # 键同时包含按原始读数判定的再生决策，量化不会跨越阈值
+    CACHE_PRECISION = {"operating_hours": 0, "adsorption_efficiency": 1, "removal_rate": 1}
+
+    def __init__(self, llm_interface: LLMInterface = None, kb: KnowledgeBase = None):
         """初始化再生智能体"""
         self.llm_interface = llm_interface or LLMInterface()
-        self.kb = get_knowledge_base()
-        self.chain = self._create_chain()
+        self.kb = kb if kb is not None else get_knowledge_base()
+        
+        # LLM响应缓存（相同工况直接复用建议）
+        self.response_cache = ResponseCache("regeneration_llm", max_entries=512, persistent=True)
+        # 并发的相同请求合并为一次LLM调用
+        self._inflight = SingleFlight()
         
         # 获取设备参数
-        equipment = self.kb.get_equipment("regeneration_system")
-        self.params = equipment.parameters if equipment else {
-            "design_capacity": 50.0,
-            "regen_temperature": 800.0,
-            "residence_time": 30.0,
-            "recovery_rate": 0.95
-        }
+        self.params = _equipment_params(self.kb)
+        
+        # 再生模式参数表（专家规则只读取一次，控制输出不再逐次查询知识库）
+        self._mode_params = _mode_parameters(self.kb)
+    
+    @cached_property
+    def chain(self):
+        """LangChain处理链（仅 run/arun 生成文字建议时使用，首次调用LLM时创建；
+        PLC控制输出走 generate_control_output，不经过LLM）"""
+        return self._create_chain()
     
     def _create_chain(self):
         """创建LangChain处理链"""
         prompt = ChatPromptTemplate.from_messages([
-            ("system", self.SYSTEM_PROMPT),
+            # 系统提示词为逐字节固定的前缀，动态字段仅出现在 human 消息中，便于服务端前缀缓存
+            build_system_message(self.SYSTEM_PROMPT),
             ("human", """
 ## 当前系统状态
 {system_status}
@@ -156,12 +244,8 @@ class RegenerationAgent:
         base_url = self.llm_interface.qwen_api_base or self.llm_interface.openai_api_base
         model_name = self.llm_interface.qwen_model_name or "qwen-plus"
         
-        llm = ChatOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            model=model_name,
-            temperature=0.3
-        )
+        # 进程内共享客户端（相同配置的智能体实例共用连接池）
+        llm = get_chat_model(api_key, base_url, model_name, 0.3)
         
         return prompt | llm | StrOutputParser()
     
@@ -169,33 +253,30 @@ class RegenerationAgent:
                                    removal_rate: float,
                                    operating_hours: float) -> Dict[str, Any]:
         """评估再生需求"""
-        # 再生判断阈值
-        EFFICIENCY_THRESHOLD = 80.0  # 吸附效率低于80%需要再生
-        REMOVAL_THRESHOLD = 60.0      # 去除率低于60%需要再生
-        HOURS_THRESHOLD = 720.0       # 运行超过720小时需要再生
-        
         need_regen = False
         mode = "normal"
         reason = ""
         urgency = "low"
         
         # 判断是否需要再生
-        if adsorption_efficiency < 60.0 or removal_rate < 40.0:
+        if (adsorption_efficiency < self.SEVERE_EFFICIENCY_THRESHOLD
+                or removal_rate < self.SEVERE_REMOVAL_THRESHOLD):
             need_regen = True
             mode = "intensive"
             reason = "活性炭严重饱和，需要强化再生"
             urgency = "high"
-        elif adsorption_efficiency < EFFICIENCY_THRESHOLD or removal_rate < REMOVAL_THRESHOLD:
+        elif (adsorption_efficiency < self.EFFICIENCY_THRESHOLD
+                or removal_rate < self.REMOVAL_THRESHOLD):
             need_regen = True
             mode = "normal"
             reason = "吸附能力下降，需要常规再生"
             urgency = "medium"
-        elif operating_hours > HOURS_THRESHOLD:
+        elif operating_hours > self.HOURS_THRESHOLD:
             need_regen = True
             mode = "normal"
             reason = "已达到周期性再生时间"
             urgency = "medium"
-        elif operating_hours > HOURS_THRESHOLD * 0.8:
+        elif operating_hours > self.HOURS_THRESHOLD * self.PREVENTIVE_HOURS_RATIO:
             # 预防性再生
             need_regen = True
             mode = "energy_saving"
@@ -211,33 +292,65 @@ class RegenerationAgent:
             "urgency": urgency
         }
     
-    def _get_mode_parameters(self, mode: str) -> Dict[str, float]:
-        """获取再生模式参数"""
-        rules = self.kb.get_expert_rule("regeneration_control")
+    @classmethod
+    def assess_batch(cls, adsorption_efficiency: Any, removal_rate: Any,
+                     operating_hours: Any) -> Dict[str, np.ndarray]:
+        """
+        批量评估再生需求（历史工况回放/回测；单次评估请使用 _assess_regeneration_need）
         
-        mode_params = {
-            "normal": {
-                "temperature": rules.get("normal_regeneration", {}).get("temperature", 800.0),
-                "feed_rate": rules.get("normal_regeneration", {}).get("feed_rate", 30.0),
-                "duration": 8.0
-            },
-            "intensive": {
-                "temperature": rules.get("intensive_regeneration", {}).get("temperature", 850.0),
-                "feed_rate": rules.get("intensive_regeneration", {}).get("feed_rate", 40.0),
-                "duration": 6.0
-            },
-            "energy_saving": {
-                "temperature": rules.get("energy_saving", {}).get("temperature", 750.0),
-                "feed_rate": rules.get("energy_saving", {}).get("feed_rate", 25.0),
-                "duration": 10.0
-            }
-        }
+        Args:
+            adsorption_efficiency: 吸附效率数组 (%)
+            removal_rate: 毒性去除率数组 (%)
+            operating_hours: 累计运行小时数数组
+            （均可为标量，按广播规则对齐）
+            
+        Returns:
+            Dict: 与 _assess_regeneration_need 同名字段的数组
+        """
+        efficiency, removal, hours = np.broadcast_arrays(
+            np.asarray(adsorption_efficiency, dtype=np.float64),
+            np.asarray(removal_rate, dtype=np.float64),
+            np.asarray(operating_hours, dtype=np.float64)
+        )
+        code = np.select(
+            [
+                (efficiency < cls.SEVERE_EFFICIENCY_THRESHOLD) | (removal < cls.SEVERE_REMOVAL_THRESHOLD),
+                (efficiency < cls.EFFICIENCY_THRESHOLD) | (removal < cls.REMOVAL_THRESHOLD),
+                hours > cls.HOURS_THRESHOLD,
+                hours > cls.HOURS_THRESHOLD * cls.PREVENTIVE_HOURS_RATIO
+            ],
+            [0, 1, 2, 3],
+            default=4
+        )
         
-        return mode_params.get(mode, mode_params["normal"])
+        return {
+            "need_regeneration": ASSESSMENT_NEED[code],
+            "mode": ASSESSMENT_MODES[code],
+            "reason": ASSESSMENT_REASONS[code],
+            "urgency": ASSESSMENT_URGENCY[code]
+        }
+    
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _regeneration_recommendations(mode: str, temperature: float,
+                                      feed_rate: float) -> tuple:
+        """再生操作建议（模式参数固定，各模式只格式化一次）"""
+        recommendations = (
+            f"启动{mode}模式再生",
+            f"设定炉温至{temperature}°C",
+            f"进料速度设定为{feed_rate} kg/h"
+        )
+        if mode == "intensive":
+            recommendations += _RECS_INTENSIVE_EXTRA
+        return recommendations
+    
+    def _get_mode_parameters(self, mode: str) -> Dict[str, float]:
+        """获取再生模式参数"""
+        return self._mode_params.get(mode, self._mode_params["normal"])
     
     def run(self, system_status: str, operating_hours: float = 500,
             adsorption_efficiency: float = 85.0,
-            removal_rate: float = 70.0) -> Dict[str, Any]:
+            removal_rate: float = 70.0, cache: bool = True) -> Dict[str, Any]:
         """
         运行再生智能体
         
@@ -246,31 +359,131 @@ class RegenerationAgent:
             operating_hours: 累计运行小时数
             adsorption_efficiency: 当前吸附效率 (%)
             removal_rate: 当前毒性去除率 (%)
+            cache: 是否使用LLM响应缓存
             
         Returns:
-            Dict: 包含再生决策和LLM建议
+            Dict: 包含再生决策、LLM建议及缓存命中标记
+        """
+        try:
+            inputs = {
+                "system_status": system_status,
+                "operating_hours": operating_hours,
+                "adsorption_efficiency": adsorption_efficiency,
+                "removal_rate": removal_rate
+            }
+            cache_key = self._cache_key(inputs)
+            llm_response = self.response_cache.get(cache_key) if cache else None
+            cache_hit = llm_response is not None
+            if not cache_hit:
+                # 调用LLM生成专业建议
+                llm_response = self.chain.invoke(inputs)
+                if cache:
+                    self.response_cache.set(cache_key, llm_response)
+            
+            return {
+                "status": "success",
+                "suggestion": llm_response,
+                "cache_hit": cache_hit,
+                "timestamp": now_str()
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "suggestion": f"再生控制决策生成失败: {str(e)}",
+                "cache_hit": False,
+                "timestamp": now_str()
+            }
+    
+    async def arun(self, system_status: str, operating_hours: float = 500,
+                   adsorption_efficiency: float = 85.0,
+                   removal_rate: float = 70.0, cache: bool = True) -> Dict[str, Any]:
+        """
+        异步运行再生智能体（参数与返回值同 run，多个智能体可并发请求LLM；
+        并发的相同工况请求合并为一次LLM调用）
         """
         try:
-            # 调用LLM生成专业建议
-            llm_response = self.chain.invoke({
+            inputs = {
                 "system_status": system_status,
                 "operating_hours": operating_hours,
                 "adsorption_efficiency": adsorption_efficiency,
                 "removal_rate": removal_rate
-            })
+            }
+            cache_key = self._cache_key(inputs)
+            llm_response = self.response_cache.get(cache_key) if cache else None
+            cache_hit = llm_response is not None
+            if not cache_hit:
+                llm_response = await self._inflight.run(
+                    cache_key, lambda: self.chain.ainvoke(inputs)
+                )
+                if cache:
+                    self.response_cache.set(cache_key, llm_response)
             
             return {
                 "status": "success",
                 "suggestion": llm_response,
-                "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                "cache_hit": cache_hit,
+                "timestamp": now_str()
             }
         except Exception as e:
             return {
                 "status": "error",
                 "suggestion": f"再生控制决策生成失败: {str(e)}",
-                "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                "cache_hit": False,
+                "timestamp": now_str()
             }
     
+    async def arun_stream(self, system_status: str, operating_hours: float = 500,
+                          adsorption_efficiency: float = 85.0,
+                          removal_rate: float = 70.0,
+                          cache: bool = True) -> AsyncIterator[str]:
+        """
+        流式运行再生智能体，LLM建议逐段产出
+        
+        缓存命中时一次性产出完整结果；流结束后写入缓存。
+        PLC控制参数请使用 generate_control_output，无需等待文字建议。
+        
+        Yields:
+            str: 建议文本片段
+        """
+        inputs = {
+            "system_status": system_status,
+            "operating_hours": operating_hours,
+            "adsorption_efficiency": adsorption_efficiency,
+            "removal_rate": removal_rate
+        }
+        cache_key = self._cache_key(inputs)
+        if cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        chunks = []
+        async for chunk in self.chain.astream(inputs):
+            chunks.append(chunk)
+            yield chunk
+        if cache:
+            self.response_cache.set(cache_key, "".join(chunks))
+    
+    def _cache_key(self, inputs: Dict[str, Any]) -> str:
+        """
+        生成LLM响应缓存键
+        
+        量化后的运行参数 + 按原始读数判定的再生决策（如效率79.96与80.04量化后相同，
+        但决策不同，不能共用建议）+ 模型名称。
+        """
+        quantized = {
+            key: round(value, self.CACHE_PRECISION[key]) if key in self.CACHE_PRECISION else value
+            for key, value in inputs.items()
+        }
+        decision = self._assess_regeneration_need(
+            inputs["adsorption_efficiency"], inputs["removal_rate"], inputs["operating_hours"]
+        )
+        return make_cache_key(
+            "regeneration", quantized, decision["mode"], decision["urgency"], decision["reason"],
+            self.llm_interface.qwen_model_name
+        )
+    
     def generate_control_output(self, adsorption_efficiency: float = 85.0,
                                 removal_rate: float = 70.0,
                                 operating_hours: float = 500) -> RegenerationControlOutput:
@@ -298,17 +511,12 @@ class RegenerationAgent:
         params = self._get_mode_parameters(mode)
         
         # 生成建议列表
-        recommendations = []
         if need_regen:
-            recommendations.append(f"启动{mode}模式再生")
-            recommendations.append(f"设定炉温至{params['temperature']}°C")
-            recommendations.append(f"进料速度设定为{params['feed_rate']} kg/h")
-            if mode == "intensive":
-                recommendations.append("注意监控炉温，防止过热")
-                recommendations.append("再生后测试活性炭碘值")
+            recommendations = list(self._regeneration_recommendations(
+                mode, params["temperature"], params["feed_rate"]
+            ))
         else:
-            recommendations.append("继续正常运行")
-            recommendations.append("定期监测吸附效率")
+            recommendations = list(_RECS_STANDBY)
         
         # 计算置信度
         confidence = 0.85
@@ -327,13 +535,13 @@ class RegenerationAgent:
             decision_reason=reason,
             recommendations=recommendations,
             confidence=confidence,
-            timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            timestamp=now_str()
         )
     
     def get_plc_command(self, adsorption_efficiency: float = 85.0,
                         removal_rate: float = 70.0,
                         operating_hours: float = 500) -> Dict[str, Any]:
-        """获取PLC控制命令"""
+        """获取PLC控制命令（纯规则计算，不调用LLM）"""
         output = self.generate_control_output(
             adsorption_efficiency, removal_rate, operating_hours
         )
@@ -12,9 +12,19 @@
 import sys
 import os
 import re
-from typing import Dict, Any, List, Optional
+import json
+import asyncio
+from collections import deque
+from typing import Dict, Any, List, Optional, AsyncIterator
 from dataclasses import dataclass
-from datetime import datetime
+from functools import cached_property
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
 
 # 添加项目根目录到Python路径
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -38,20 +48,39 @@ except ImportError:
 
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
 
 from Tool.predict_toxicity import PredictToxicityTool
-from LLM.llm_interface import LLMInterface
+from LLM.llm_interface import LLMInterface, get_chat_model, build_system_message
+from cache import ResponseCache, SingleFlight, make_cache_key, now_str
 
 try:
-    from Knowledge.knowledge_base import get_knowledge_base
+    from Knowledge.knowledge_base import get_knowledge_base, KnowledgeBase
 except ImportError:
     get_knowledge_base = None
+    KnowledgeBase = None
+
+
+# 水质参数提取（各参数的模式前缀互不相同，单次扫描即可按出现顺序取得各参数的首个匹配）
+_PARAM_RE = re.compile(
+    r'氨氮[:：是为约]?\s*(?P<ammonia_n>[\d.]+)\s*(?:mg/[Ll])?'
+    r'|温度[:：是为约]?\s*(?P<temperature>[\d.]+)\s*(?:度|℃)?'
+    r'|[pP][hH][:：是为约值]?\s*(?P<ph>[\d.]+)'
+    r'|毒性[:：是为约]?\s*(?P<toxicity>[\d.]+)'
+)
+_PARAM_KEYS = ("ammonia_n", "temperature", "ph", "toxicity")
+
+# 各毒性等级的固定运行建议
+_RECS_BY_LEVEL = {
+    "高": ("建议启用备用转盘反应器", "提高转盘频率至35-50Hz", "加强MBR曝气量", "检查活性炭是否需要再生"),
+    "中": ("维持转盘频率在15-35Hz", "持续监测毒性变化趋势", "确保MBR系统正常运行"),
+}
+_RECS_LOW = ("可考虑节能运行模式", "转盘频率可降至5-15Hz", "定期检查设备状态")
+_REC_RISING = "毒性呈上升趋势，建议提前准备应对措施"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ToxicityPredictionOutput:
-    """毒性预测输出数据结构"""
+    """毒性预测输出数据结构（不可变，历史记录中的预测结果不会被修改）"""
     toxicity_value: float           # 预测毒性值
     toxicity_level: str             # 毒性等级(低/中/高)
     trend: str                      # 趋势(上升/稳定/下降)
@@ -74,6 +103,12 @@ class ToxicityPredictionOutput:
             "timestamp": self.timestamp,
             "input_params": self.input_params
         }
+    
+    def to_json(self) -> bytes:
+        """序列化为JSON字节串（UTF-8，直接用于下游传输；优先使用 orjson）"""
+        if HAS_ORJSON:
+            return orjson.dumps(self.to_dict())
+        return json.dumps(self.to_dict(), ensure_ascii=False).encode("utf-8")
 
 
 class ToxicityAgent:
@@ -112,67 +147,159 @@ class ToxicityAgent:
 - 使用专业术语但保持清晰易懂
 """
     
-    def __init__(self, llm_interface: LLMInterface = None):
+    # 直接预测时的用户消息（预测工具结果已给出，模型只需撰写分析）
+    NARRATIVE_TEMPLATE = """
+## 用户请求
+{input}
+
+## predict_toxicity 工具预测结果
+{prediction}
+
+## 请基于以上预测结果给出分析
+无需再次调用工具，请直接判定毒性等级、分析风险因素并给出运行建议。
+"""
+    
+    # 调用LLM所需的最少水质参数个数（见 _extract_params）；
+    # 不足但给出了毒性实测值时按规则判定，不调用LLM（见 _reading_result）
+    MIN_INPUT_PARAMS = 2
+    
+    # 齐备时直接调用预测工具的参数（省去模型决定调用工具的一轮请求）
+    DIRECT_TOOL_PARAMS = ("ammonia_n", "temperature", "ph")
+    
+    # 毒性值定点整数精度（增量统计以整数累加，增减无浮点累积误差）
+    TOX_SCALE = 10 ** 9
+
+    def __init__(self, llm_interface: LLMInterface = None, kb: "KnowledgeBase" = None,
+                 history_size: int = 1024):
         """初始化毒性预测智能体"""
         self.llm_interface = llm_interface or LLMInterface()
         self.tools = [PredictToxicityTool()]
-        self.agent_executor = self._create_agent()
         
         # 尝试获取知识库
-        self.kb = get_knowledge_base() if get_knowledge_base else None
+        if kb is not None:
+            self.kb = kb
+        else:
+            self.kb = get_knowledge_base() if get_knowledge_base else None
         
-        # 历史预测记录
-        self.prediction_history: List[ToxicityPredictionOutput] = []
+        # 历史预测记录（环形缓冲区，保留最近 history_size 条）
+        self.prediction_history: "deque[ToxicityPredictionOutput]" = deque(maxlen=history_size)
         
-    def _create_agent(self) -> AgentExecutor:
-        """创建LangChain Agent"""
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self.SYSTEM_PROMPT),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
+        # 增量统计（随记录更新，淘汰记录时扣除其贡献）
+        self._tox_sum = 0       # 非零毒性值的定点整数累加和（见 TOX_SCALE）
+        self._tox_count = 0     # 非零毒性值的记录数
+        self._high_risk = 0     # 高风险记录数
         
-        from langchain_openai import ChatOpenAI
+        # LLM响应缓存（相同输入直接复用分析结果）
+        self.response_cache = ResponseCache("toxicity_llm", max_entries=512, persistent=True)
+        # 并发的相同请求合并为一次LLM调用
+        self._inflight = SingleFlight()
         
+    @cached_property
+    def llm(self):
+        """共享LLM客户端（进程内相同配置的智能体实例共用连接池）"""
         api_key = self.llm_interface.qwen_api_key or self.llm_interface.openai_api_key or "sk-placeholder"
         base_url = self.llm_interface.qwen_api_base or self.llm_interface.openai_api_base
         model_name = self.llm_interface.qwen_model_name or "qwen-plus"
         
-        llm = ChatOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            model=model_name,
-            temperature=0.3
-        )
+        return get_chat_model(api_key, base_url, model_name, 0.3)
+    
+    @cached_property
+    def agent_executor(self) -> AgentExecutor:
+        """工具调用Agent（首次调用LLM时创建）"""
+        return self._create_agent()
+    
+    def _create_agent(self) -> AgentExecutor:
+        """创建LangChain Agent"""
+        prompt = ChatPromptTemplate.from_messages([
+            # 系统提示词为逐字节固定的前缀，动态字段仅出现在 human 消息中，便于服务端前缀缓存
+            build_system_message(self.SYSTEM_PROMPT),
+            ("human", "{input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ])
         
-        agent = create_tool_calling_agent(llm, self.tools, prompt)
+        agent = create_tool_calling_agent(self.llm, self.tools, prompt)
         return AgentExecutor(agent=agent, tools=self.tools, verbose=True)
     
-    def _extract_params(self, input_text: str) -> Dict[str, Any]:
-        """从用户输入中提取参数"""
-        params = {}
+    @cached_property
+    def narrative_chain(self):
+        """直接预测后撰写分析的处理链（不含工具调用）"""
+        prompt = ChatPromptTemplate.from_messages([
+            build_system_message(self.SYSTEM_PROMPT),
+            ("human", self.NARRATIVE_TEMPLATE)
+        ])
+        return prompt | self.llm | StrOutputParser()
+    
+    def _direct_tool_input(self, params: Dict[str, Any]) -> Optional[Dict[str, float]]:
+        """预测工具所需参数齐备时返回工具输入，否则返回 None"""
+        if all(key in params for key in self.DIRECT_TOOL_PARAMS):
+            return {key: params[key] for key in self.DIRECT_TOOL_PARAMS}
+        return None
+    
+    def _analyze(self, input_text: str, params: Dict[str, Any]) -> str:
+        """
+        生成分析文本
         
-        # 提取氨氮
-        ammonia_match = re.search(r'氨氮[:：是为约]?\s*([\d.]+)\s*(?:mg/[Ll])?', input_text)
-        if ammonia_match:
-            params['ammonia_n'] = float(ammonia_match.group(1))
+        参数齐备时直接调用预测工具，再由模型撰写分析（一次LLM请求）；
+        否则交由工具调用Agent决定如何预测。
+        """
+        tool_input = self._direct_tool_input(params)
+        if tool_input is not None:
+            prediction = self.tools[0].invoke(tool_input)
+            return self.narrative_chain.invoke({"input": input_text, "prediction": prediction})
         
-        # 提取温度
-        temp_match = re.search(r'温度[:：是为约]?\s*([\d.]+)\s*(?:度|℃)?', input_text)
-        if temp_match:
-            params['temperature'] = float(temp_match.group(1))
+        result = self.agent_executor.invoke({"input": input_text})
+        return result.get("output", "")
+    
+    async def _aanalyze(self, input_text: str, params: Dict[str, Any]) -> str:
+        """生成分析文本（异步，逻辑同 _analyze；预测工具仅支持同步调用，放入线程池）"""
+        tool_input = self._direct_tool_input(params)
+        if tool_input is not None:
+            prediction = await asyncio.to_thread(self.tools[0].invoke, tool_input)
+            return await self.narrative_chain.ainvoke({"input": input_text, "prediction": prediction})
         
-        # 提取pH
-        ph_match = re.search(r'[pP][hH][:：是为约值]?\s*([\d.]+)', input_text)
-        if ph_match:
-            params['ph'] = float(ph_match.group(1))
+        result = await self.agent_executor.ainvoke({"input": input_text})
+        return result.get("output", "")
+    
+    def _cache_key(self, input_text: str) -> str:
+        """分析结果缓存键（含模型名称，切换模型后不复用旧模型的分析）"""
+        return make_cache_key("toxicity", input_text, self.llm_interface.qwen_model_name)
+    
+    def batch_messages(self, input_text: str) -> Optional[List[Dict[str, str]]]:
+        """
+        离线批量任务的请求消息（OpenAI chat 格式）
         
-        # 提取毒性
-        tox_match = re.search(r'毒性[:：是为约]?\s*([\d.]+)', input_text)
-        if tox_match:
-            params['toxicity'] = float(tox_match.group(1))
+        批量任务中模型无法调用工具：仅当预测工具参数齐备时在本地运行预测工具，
+        与 _analyze 的直接预测路径相同，将工具结果随 NARRATIVE_TEMPLATE 提交；
+        否则返回 None（需工具调用Agent，应交互式运行 run/arun）。
+        """
+        params = self._extract_params(input_text)
+        if len(params) < self.MIN_INPUT_PARAMS:
+            return None
+        tool_input = self._direct_tool_input(params)
+        if tool_input is None:
+            return None
         
-        return params
+        prediction = self.tools[0].invoke(tool_input)
+        return [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": self.NARRATIVE_TEMPLATE.format(input=input_text, prediction=prediction)}
+        ]
+    
+    def batch_result(self, input_text: str, analysis: str) -> Dict[str, Any]:
+        """由批量任务返回的分析生成预测结果（结构同 run），并写入响应缓存"""
+        self.response_cache.set(self._cache_key(input_text), analysis)
+        return self._build_result(self._extract_params(input_text), analysis, cache_hit=False)
+    
+    def _extract_params(self, input_text: str) -> Dict[str, Any]:
+        """从用户输入中提取参数（氨氮、温度、pH、毒性）"""
+        found = {}
+        for match in _PARAM_RE.finditer(input_text):
+            key = match.lastgroup
+            if key not in found:
+                found[key] = float(match.group(key))
+        
+        # 保持固定的参数顺序
+        return {key: found[key] for key in _PARAM_KEYS if key in found}
     
     def _determine_toxicity_level(self, toxicity: float) -> str:
         """判定毒性等级"""
@@ -195,94 +322,175 @@ class ToxicityAgent:
     def _generate_recommendations(self, toxicity: float, toxicity_level: str, 
                                     trend: str) -> List[str]:
         """生成建议"""
-        recommendations = []
-        
-        if toxicity_level == "高":
-            recommendations.extend([
-                "建议启用备用转盘反应器",
-                "提高转盘频率至35-50Hz",
-                "加强MBR曝气量",
-                "检查活性炭是否需要再生"
-            ])
-        elif toxicity_level == "中":
-            recommendations.extend([
-                "维持转盘频率在15-35Hz",
-                "持续监测毒性变化趋势",
-                "确保MBR系统正常运行"
-            ])
-        else:
-            recommendations.extend([
-                "可考虑节能运行模式",
-                "转盘频率可降至5-15Hz",
-                "定期检查设备状态"
-            ])
-        
+        recommendations = _RECS_BY_LEVEL.get(toxicity_level, _RECS_LOW)
         if trend == "上升":
-            recommendations.insert(0, "毒性呈上升趋势，建议提前准备应对措施")
-        
-        return recommendations
+            return [_REC_RISING, *recommendations]
+        return list(recommendations)
 
-    def run(self, input_text: str) -> Dict[str, Any]:
+    def run(self, input_text: str, cache: bool = True) -> Dict[str, Any]:
         """
         运行毒性预测
         
         Args:
             input_text: 包含水质数据的自然语言描述
+            cache: 是否使用LLM响应缓存
             
         Returns:
-            Dict: 包含分析结果、毒性等级、建议等
+            Dict: 包含分析结果、毒性等级、建议及缓存命中标记等
         """
         try:
             # 提取参数
             params = self._extract_params(input_text)
+            if len(params) < self.MIN_INPUT_PARAMS:
+                # 参数不足时模型无法给出有效预测，不调用LLM也不写入缓存
+                return self._reading_result(params)
             
-            # 调用Agent执行预测
-            result = self.agent_executor.invoke({"input": input_text})
-            analysis = result.get("output", "")
-            
-            # 从分析中提取毒性值（简化处理）
-            toxicity_value = params.get('toxicity', 2.0)
-            toxicity_level = self._determine_toxicity_level(toxicity_value)
-            trend = "稳定"  # 默认稳定，可根据历史数据分析
-            risk_level = self._determine_risk_level(toxicity_value, trend)
-            recommendations = self._generate_recommendations(toxicity_value, toxicity_level, trend)
+            # 调用Agent执行预测（相同输入复用缓存的分析结果）
+            cache_key = self._cache_key(input_text)
+            analysis = self.response_cache.get(cache_key) if cache else None
+            cache_hit = analysis is not None
+            if not cache_hit:
+                analysis = self._analyze(input_text, params)
+                if cache:
+                    self.response_cache.set(cache_key, analysis)
             
-            # 创建结构化输出
-            prediction_output = ToxicityPredictionOutput(
-                toxicity_value=toxicity_value,
-                toxicity_level=toxicity_level,
-                trend=trend,
-                risk_level=risk_level,
-                confidence=0.85,
-                analysis=analysis,
-                recommendations=recommendations,
-                timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                input_params=params
-            )
+            return self._build_result(params, analysis, cache_hit)
+        except Exception as e:
+            return self._error_result(f"毒性预测过程中发生错误: {str(e)}")
+    
+    async def arun(self, input_text: str, cache: bool = True) -> Dict[str, Any]:
+        """
+        异步运行毒性预测（参数与返回值同 run，多个智能体可并发请求LLM；
+        输入文本相同的并发请求合并为一次LLM调用）
+        """
+        try:
+            params = self._extract_params(input_text)
+            if len(params) < self.MIN_INPUT_PARAMS:
+                return self._reading_result(params)
             
-            # 保存到历史记录
-            self.prediction_history.append(prediction_output)
+            cache_key = self._cache_key(input_text)
+            analysis = self.response_cache.get(cache_key) if cache else None
+            cache_hit = analysis is not None
+            if not cache_hit:
+                # 按缓存键（输入文本+模型）合并：分析基于完整文本，措辞不同的请求不能共享结果
+                analysis = await self._inflight.run(
+                    cache_key, lambda: self._aanalyze(input_text, params)
+                )
+                if cache:
+                    self.response_cache.set(cache_key, analysis)
             
-            return {
-                "analysis": analysis,
-                "status": "success",
-                "toxicity_value": toxicity_value,
-                "toxicity_level": toxicity_level,
-                "trend": trend,
-                "risk_level": risk_level,
-                "recommendations": recommendations,
-                "structured_output": prediction_output.to_dict()
-            }
+            return self._build_result(params, analysis, cache_hit)
         except Exception as e:
-            return {
-                "analysis": f"毒性预测过程中发生错误: {str(e)}",
-                "status": "error",
-                "toxicity_value": None,
-                "toxicity_level": "未知",
-                "trend": "未知",
-                "risk_level": "未知",
-                "recommendations": []
-            }
+            return self._error_result(f"毒性预测过程中发生错误: {str(e)}")
+    
+    async def arun_stream(self, input_text: str, cache: bool = True) -> AsyncIterator[str]:
+        """
+        流式运行毒性预测，最终分析文本逐段产出
+        
+        参数齐备时直接调用预测工具后流式输出分析（同 _analyze）；
+        否则工具调用决策阶段不产生文本，仅转发模型生成最终答复时的增量输出；
+        缓存命中时一次性产出完整结果；流结束后写入缓存。
+        毒性等级、风险等级等结构化字段由输入参数确定（见 _extract_params），无需等待分析文本。
+        
+        Yields:
+            str: 分析文本片段
+        """
+        params = self._extract_params(input_text)
+        if len(params) < self.MIN_INPUT_PARAMS:
+            yield self._reading_result(params)["analysis"]
+            return
+        
+        cache_key = self._cache_key(input_text)
+        if cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        chunks = []
+        tool_input = self._direct_tool_input(params)
+        if tool_input is not None:
+            prediction = await asyncio.to_thread(self.tools[0].invoke, tool_input)
+            async for chunk in self.narrative_chain.astream({"input": input_text, "prediction": prediction}):
+                chunks.append(chunk)
+                yield chunk
+        else:
+            async for event in self.agent_executor.astream_events({"input": input_text}, version="v2"):
+                if event["event"] != "on_chat_model_stream":
+                    continue
+                chunk = event["data"]["chunk"].content
+                if isinstance(chunk, str) and chunk:
+                    chunks.append(chunk)
+                    yield chunk
+        if cache:
+            self.response_cache.set(cache_key, "".join(chunks))
+    
+    def _build_result(self, params: Dict[str, Any], analysis: str,
+                      cache_hit: bool) -> Dict[str, Any]:
+        """由提取的参数和LLM分析生成预测结果，并记入历史"""
+        # 从分析中提取毒性值（简化处理）
+        toxicity_value = params.get('toxicity', 2.0)
+        toxicity_level = self._determine_toxicity_level(toxicity_value)
+        trend = "稳定"  # 默认稳定，可根据历史数据分析
+        risk_level = self._determine_risk_level(toxicity_value, trend)
+        recommendations = self._generate_recommendations(toxicity_value, toxicity_level, trend)
+        
+        # 创建结构化输出
+        prediction_output = ToxicityPredictionOutput(
+            toxicity_value=toxicity_value,
+            toxicity_level=toxicity_level,
+            trend=trend,
+            risk_level=risk_level,
+            confidence=0.85,
+            analysis=analysis,
+            recommendations=recommendations,
+            timestamp=now_str(),
+            input_params=params
+        )
+        
+        # 保存到历史记录
+        self._record_prediction(prediction_output)
+        
+        return {
+            "analysis": analysis,
+            "status": "success",
+            "toxicity_value": toxicity_value,
+            "toxicity_level": toxicity_level,
+            "trend": trend,
+            "risk_level": risk_level,
+            "recommendations": recommendations,
+            "structured_output": prediction_output.to_dict(),
+            "cache_hit": cache_hit
+        }
+    
+    def _reading_result(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        参数不足以调用LLM时的结果
+        
+        给出了毒性实测值（如"进水毒性是3.5"）时由规则判定等级、风险与建议；
+        否则返回参数不足的错误结果。
+        """
+        if "toxicity" not in params:
+            return self._error_result("输入参数不足")
+        
+        toxicity = params["toxicity"]
+        analysis = (f"进水毒性实测值为 {toxicity}，按规则判定为{self._determine_toxicity_level(toxicity)}毒性"
+                    f"（未提供氨氮、温度、pH 等水质参数，未进行模型分析）")
+        return self._build_result(params, analysis, cache_hit=False)
+    
+    @staticmethod
+    def _error_result(analysis: str) -> Dict[str, Any]:
+        """预测失败时的结果"""
+        return {
+            "analysis": analysis,
+            "status": "error",
+            "toxicity_value": None,
+            "toxicity_level": "未知",
+            "trend": "未知",
+            "risk_level": "未知",
+            "recommendations": [],
+            "cache_hit": False
+        }
     
     def predict(self, ammonia_n: float = None, temperature: float = None, 
                 ph: float = None, toxicity: float = None) -> ToxicityPredictionOutput:
@@ -322,7 +530,7 @@ class ToxicityAgent:
                 confidence=0.85,
                 analysis=result.get("analysis", ""),
                 recommendations=result.get("recommendations", []),
-                timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                timestamp=now_str(),
                 input_params={"ammonia_n": ammonia_n, "temperature": temperature, "ph": ph, "toxicity": toxicity}
             )
         else:
@@ -334,25 +542,40 @@ class ToxicityAgent:
                 confidence=0.0,
                 analysis=result.get("analysis", "预测失败"),
                 recommendations=[],
-                timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                timestamp=now_str(),
                 input_params={"ammonia_n": ammonia_n, "temperature": temperature, "ph": ph, "toxicity": toxicity}
             )
     
+    def _record_prediction(self, prediction: ToxicityPredictionOutput):
+        """记入历史并更新增量统计"""
+        history = self.prediction_history
+        if history.maxlen == 0:
+            return
+        if len(history) == history.maxlen:
+            self._update_stats(history[0], -1)
+        history.append(prediction)
+        self._update_stats(prediction, 1)
+    
+    def _update_stats(self, prediction: ToxicityPredictionOutput, sign: int):
+        """计入（sign=1）或扣除（sign=-1）一条预测的统计贡献"""
+        if prediction.toxicity_value:
+            self._tox_sum += sign * round(prediction.toxicity_value * self.TOX_SCALE)
+            self._tox_count += sign
+        if prediction.risk_level == "高风险":
+            self._high_risk += sign
+    
     def get_latest_prediction(self) -> Optional[ToxicityPredictionOutput]:
         """获取最新的预测结果"""
         return self.prediction_history[-1] if self.prediction_history else None
     
     def get_prediction_summary(self) -> Dict[str, Any]:
-        """获取预测摘要统计"""
+        """获取预测摘要统计（增量维护，O(1)）"""
         if not self.prediction_history:
             return {"count": 0, "average_toxicity": 0, "high_risk_count": 0}
         
-        toxicity_values = [p.toxicity_value for p in self.prediction_history if p.toxicity_value]
-        high_risk = [p for p in self.prediction_history if p.risk_level == "高风险"]
-        
         return {
             "count": len(self.prediction_history),
-            "average_toxicity": sum(toxicity_values) / len(toxicity_values) if toxicity_values else 0,
-            "high_risk_count": len(high_risk),
+            "average_toxicity": self._tox_sum / self.TOX_SCALE / self._tox_count if self._tox_count else 0,
+            "high_risk_count": self._high_risk,
             "latest_level": self.prediction_history[-1].toxicity_level
         }
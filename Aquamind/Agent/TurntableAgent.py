@@ -11,10 +11,22 @@
 
 import sys
 import os
+import json
+import asyncio
 import math
-from typing import Dict, Any, Optional, List
-from dataclasses import dataclass
-from datetime import datetime
+import re
+from typing import Dict, Any, Optional, List, Tuple
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
+
+import numpy as np
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
 
 # 添加项目根目录到Python路径
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -23,13 +35,23 @@ if root_dir not in sys.path:
 
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import HumanMessage
 
-from LLM.llm_interface import LLMInterface
-from Knowledge.knowledge_base import get_knowledge_base
+from LLM.llm_interface import LLMInterface, get_chat_model, build_system_message
+from Knowledge.knowledge_base import get_knowledge_base, KnowledgeBase
+from config import llm_config
+from cache import ApproximateCache, ResponseCache, make_cache_key, now_str
+from utils_numba import HAS_NUMBA, turntable_removal_rate_batch
 
+# 批量控制计算的趋势编码顺序（其余趋势按"稳定"处理）
+_TRENDS = ("上升", "稳定", "下降")
+# 档位（0低/1中/2高）-> 反应器数量
+_BAND_REACTORS = np.array([2, 2, 3], dtype=np.int64)
+# 毒性分析文本中的毒性值（与 ControlAgent._parse_toxicity_value 一致）
+_TOXICITY_VALUE_RE = re.compile(r'毒性[:：值为是]?\s*([\d.]+)')
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class TurntableControlOutput:
     """转盘控制输出数据结构"""
     frequency_1: float          # 1号转盘频率 (Hz)
@@ -44,6 +66,8 @@ class TurntableControlOutput:
     decision_reason: str        # 决策原因
     confidence: float           # 置信度
     timestamp: str              # 时间戳
+    # 序列化后的PLC命令（首次 to_plc_json 时生成；输出不可变，可重复下发）
+    _plc_json: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
     
     def to_plc_command(self) -> Dict[str, Any]:
         """转换为PLC命令格式"""
@@ -65,6 +89,16 @@ class TurntableControlOutput:
             "ALARM_LEVEL": 3 if self.standby_triggered else (2 if self.frequency_1 > 35 else 1)
         }
     
+    def to_plc_json(self) -> bytes:
+        """PLC命令序列化为JSON字节串（直接写入PLC通信套接字；优先使用 orjson，结果按实例缓存）"""
+        if self._plc_json is None:
+            if HAS_ORJSON:
+                payload = orjson.dumps(self.to_plc_command())
+            else:
+                payload = json.dumps(self.to_plc_command(), ensure_ascii=False).encode("utf-8")
+            object.__setattr__(self, "_plc_json", payload)
+        return self._plc_json
+    
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
         return {
@@ -120,11 +154,57 @@ class TurntableAgent:
 请基于以上原则，结合当前毒性情况，给出专业的控制建议和参数设定。
 输出应包含具体的频率设定值、预期效果和操作理由。"""
 
-    def __init__(self, llm_interface: LLMInterface = None):
+    # 任务要求（固定前缀的一部分，不含任何变量）
+    TASK_PROMPT = """## 请生成控制决策
+请根据下一条消息中的当前毒性分析和运行参数，给出：
+1. 推荐的频率设定值（1号、2号、3号转盘）
+2. 是否需要启用备用线路
+3. 预期的毒性去除效果
+4. 操作理由和注意事项"""
+
+    # 动态工况数据
+    HUMAN_TEMPLATE = """
+## 当前毒性分析
+{toxicity_analysis}
+
+## 当前运行参数
+- 当前频率：{current_frequency} Hz
+- 当前转速：{current_rpm} rpm
+- 活跃反应器：{active_reactors} 台
+"""
+
+    # 提示词模板（导入时构建一次，所有实例共享）
+    # 固定内容（系统提示词、输出要求）在前，动态工况数据在最后一条消息中，
+    # 使各次请求共享尽可能长的相同前缀，便于服务端前缀缓存
+    _PROMPT = ChatPromptTemplate.from_messages([
+        build_system_message(SYSTEM_PROMPT),
+        HumanMessage(content=TASK_PROMPT),
+        ("human", HUMAN_TEMPLATE)
+    ])
+
+    # LLM响应缓存有效期（秒），稳态工况下控制建议变化缓慢
+    CACHE_TTL = 1800
+    
+    # 近似匹配缓存的数值相对容差（分析文本仅数值略有差异时复用建议）
+    APPROX_REL_TOL = 0.02
+    
+    # 趋势调整系数
+    TREND_FACTORS = {"上升": 1.15, "稳定": 1.0, "下降": 0.90}
+    
+    # 毒性分析中含以下标记时不使用缓存（紧急或异常工况需重新评估）
+    CACHE_BYPASS_MARKERS = ("紧急", "错误", "失败", "异常")
+
+    def __init__(self, llm_interface: LLMInterface = None, kb: KnowledgeBase = None):
         """初始化转盘智能体"""
         self.llm_interface = llm_interface or LLMInterface()
-        self.kb = get_knowledge_base()
-        self.chain = self._create_chain()
+        self.kb = kb if kb is not None else get_knowledge_base()
+        
+        # LLM响应缓存（相同工况直接复用建议）
+        self.response_cache = ResponseCache(
+            "turntable_llm", ttl=self.CACHE_TTL, max_entries=512, persistent=True
+        )
+        # 精确匹配未命中时，按数值容差查找相近工况的建议
+        self.approx_cache = ApproximateCache(rel_tol=self.APPROX_REL_TOL, ttl=self.CACHE_TTL)
         
         # 获取设备参数
         equipment = self.kb.get_equipment("turntable_system")
@@ -132,53 +212,47 @@ class TurntableAgent:
             "rpm_per_hz": 30.0,
             "carbon_loading": 15.0
         }
+        # 频率-转速换算系数（热路径直接相乘，不再逐次查字典）
+        self._rpm_per_hz = float(self.params.get("rpm_per_hz", 30.0))
+        
+        # 专家规则中的各毒性等级目标频率（低, 中, 高），初始化时读取一次
+        rules = self.kb.get_expert_rule("turntable_control") or {}
+        self._base_frequencies = (
+            rules.get("low_toxicity", {}).get("target_frequency", 10.0),
+            rules.get("medium_toxicity", {}).get("target_frequency", 25.0),
+            rules.get("high_toxicity", {}).get("target_frequency", 45.0)
+        )
+    
+    @cached_property
+    def chain(self):
+        """LangChain处理链（仅 run/arun 生成文字建议时使用，首次调用LLM时获取；
+        PLC控制输出走 generate_control_output，不经过LLM）"""
+        return self._create_chain()
     
     def _create_chain(self):
-        """创建LangChain处理链"""
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self.SYSTEM_PROMPT),
-            ("human", """
-## 当前毒性分析
-{toxicity_analysis}
-
-## 当前运行参数
-- 当前频率：{current_frequency} Hz
-- 当前转速：{current_rpm} rpm
-- 活跃反应器：{active_reactors} 台
-
-## 请生成控制决策
-请给出：
-1. 推荐的频率设定值（1号、2号、3号转盘）
-2. 是否需要启用备用线路
-3. 预期的毒性去除效果
-4. 操作理由和注意事项
-""")
-        ])
-        
+        """获取LangChain处理链（相同模型配置的实例共享同一条链）"""
         api_key = self.llm_interface.qwen_api_key or self.llm_interface.openai_api_key
         base_url = self.llm_interface.qwen_api_base or self.llm_interface.openai_api_base
         model_name = self.llm_interface.qwen_model_name or "qwen-plus"
-        
-        llm = ChatOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            model=model_name,
-            temperature=0.3
-        )
-        
-        return prompt | llm | StrOutputParser()
+        return _build_chain(api_key, base_url, model_name, 0.3)
     
     def _hz_to_rpm(self, frequency: float) -> float:
         """频率转换为转速"""
-        return frequency * self.params.get("rpm_per_hz", 30.0)
+        return frequency * self._rpm_per_hz
     
     def _calculate_removal_rate(self, frequency: float, toxicity: float) -> float:
         """计算预期去除率"""
+        return self._removal_rate(frequency, toxicity > 3.0, self._rpm_per_hz)
+    
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _removal_rate(frequency: float, high_toxicity: bool, rpm_per_hz: float) -> float:
+        """预期去除率（纯函数；毒性仅以是否高于3.0参与计算，按此缓存）"""
         # 基于一阶动力学模型简化计算
         # η = 1 - exp(-k * HRT)
         # k随频率增加而增加（传质效率提升）
         k_base = 0.05
-        rpm = self._hz_to_rpm(frequency)
+        rpm = frequency * rpm_per_hz
         k = k_base * (1 + rpm / 1000)  # 频率越高，传质系数越大
         
         # 假设HRT约15分钟
@@ -186,7 +260,7 @@ class TurntableAgent:
         removal_rate = (1 - math.exp(-k * hrt * 60)) * 100  # 转为百分比
         
         # 高毒性时去除效率略降
-        if toxicity > 3.0:
+        if high_toxicity:
             removal_rate *= 0.9
         
         return min(95.0, max(30.0, removal_rate))
@@ -194,26 +268,65 @@ class TurntableAgent:
     def _determine_control_params(self, toxicity: float, toxicity_level: str, 
                                    trend: str = "稳定") -> Dict[str, Any]:
         """确定控制参数"""
-        # 获取专家规则
-        rules = self.kb.get_expert_rule("turntable_control")
-        
-        # 根据毒性等级确定基础参数
+        band = self._toxicity_band(toxicity, toxicity_level)
+        frequency, reactors, reason = self._band_control_params(
+            band, trend, self._base_frequencies[band]
+        )
+        return {
+            "frequency": frequency,
+            "reactors": reactors,
+            "standby": reactors == 3,
+            "reason": reason
+        }
+    
+    @staticmethod
+    def _toxicity_band(toxicity: float, toxicity_level: str) -> int:
+        """根据毒性值和等级确定档位（0低/1中/2高）"""
         if toxicity_level == "低" or toxicity < 1.5:
-            base_freq = rules.get("low_toxicity", {}).get("target_frequency", 10.0)
+            return 0
+        elif toxicity_level == "高" or toxicity > 3.0:
+            return 2
+        return 1
+    
+    @classmethod
+    def _analysis_band(cls, toxicity_analysis: str) -> Optional[int]:
+        """从毒性分析文本推断档位（无法提取毒性值时为 None）"""
+        match = _TOXICITY_VALUE_RE.search(toxicity_analysis)
+        if match is None:
+            return None
+        try:
+            toxicity = float(match.group(1))
+        except ValueError:
+            return None
+        if "高毒性" in toxicity_analysis or "高风险" in toxicity_analysis:
+            level = "高"
+        elif "低毒性" in toxicity_analysis or "低风险" in toxicity_analysis:
+            level = "低"
+        else:
+            level = "中"
+        return cls._toxicity_band(toxicity, level)
+    
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _band_control_params(band: int, trend: str, base_freq: float) -> tuple:
+        """
+        档位控制参数（纯函数，按档位和趋势缓存）
+        
+        Returns:
+            tuple: (调整后频率, 反应器数量, 决策原因)
+        """
+        if band == 0:
             reactors = 2
             reason = "低毒性运行，节能模式"
-        elif toxicity_level == "高" or toxicity > 3.0:
-            base_freq = rules.get("high_toxicity", {}).get("target_frequency", 45.0)
+        elif band == 2:
             reactors = 3
             reason = "高毒性运行，全力处理"
         else:
-            base_freq = rules.get("medium_toxicity", {}).get("target_frequency", 25.0)
             reactors = 2
             reason = "中毒性运行，标准模式"
         
         # 趋势调整
-        trend_factors = {"上升": 1.15, "稳定": 1.0, "下降": 0.90}
-        factor = trend_factors.get(trend, 1.0)
+        factor = TurntableAgent.TREND_FACTORS.get(trend, 1.0)
         adjusted_freq = min(50.0, max(5.0, base_freq * factor))
         
         if trend == "上升":
@@ -221,15 +334,66 @@ class TurntableAgent:
         elif trend == "下降":
             reason += "，毒性下降趋势，适当降低频率"
         
+        return adjusted_freq, reactors, reason
+    
+    def _prepare(self, toxicity_analysis: str, current_frequency: float,
+                 active_reactors: int, cache: bool) -> Tuple[Dict[str, Any], Optional[tuple], Optional[str]]:
+        """
+        构建链输入并查询缓存
+        
+        近似匹配要求档位相同：容差内的数值可能跨越档位阈值（如毒性2.97与3.02），
+        此时控制策略不同，不能复用建议；无法判定档位时只使用精确匹配。
+        
+        Returns:
+            (链输入, 缓存键（不使用缓存时为 None）, 缓存的LLM建议（未命中时为 None）)
+        """
+        inputs = {
+            "toxicity_analysis": toxicity_analysis,
+            "current_frequency": current_frequency,
+            "current_rpm": current_frequency * self._rpm_per_hz,
+            "active_reactors": active_reactors
+        }
+        if not cache or any(marker in toxicity_analysis for marker in self.CACHE_BYPASS_MARKERS):
+            return inputs, None, None
+        
+        band = self._analysis_band(toxicity_analysis)
+        operating_key = (round(current_frequency, 2), active_reactors,
+                         self.llm_interface.qwen_model_name, band)
+        exact_key = make_cache_key("turntable", toxicity_analysis, *operating_key)
+        llm_response = self.response_cache.get(exact_key)
+        if llm_response is None and band is not None:
+            llm_response = self.approx_cache.get(toxicity_analysis, *operating_key)
+        return inputs, (exact_key, operating_key), llm_response
+    
+    def _remember(self, toxicity_analysis: str, cache_key: Optional[tuple], llm_response: str):
+        """写入精确匹配与近似匹配缓存"""
+        if cache_key is None:
+            return
+        exact_key, operating_key = cache_key
+        self.response_cache.set(exact_key, llm_response)
+        if operating_key[-1] is not None:
+            self.approx_cache.set(toxicity_analysis, llm_response, *operating_key)
+    
+    @staticmethod
+    def _success_result(llm_response: str, cache_hit: bool) -> Dict[str, Any]:
         return {
-            "frequency": adjusted_freq,
-            "reactors": reactors,
-            "standby": reactors == 3,
-            "reason": reason
+            "status": "success",
+            "suggestion": llm_response,
+            "cache_hit": cache_hit,
+            "timestamp": now_str()
+        }
+    
+    @staticmethod
+    def _error_result(error: Exception) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "suggestion": f"转盘控制决策生成失败: {str(error)}",
+            "cache_hit": False,
+            "timestamp": now_str()
         }
     
     def run(self, toxicity_analysis: str, current_frequency: float = 25.0,
-            active_reactors: int = 2) -> Dict[str, Any]:
+            active_reactors: int = 2, cache: bool = True) -> Dict[str, Any]:
         """
         运行转盘智能体
         
@@ -237,30 +401,87 @@ class TurntableAgent:
             toxicity_analysis: 毒性分析文本（来自ToxicityAgent）
             current_frequency: 当前运行频率
             active_reactors: 当前活跃反应器数量
+            cache: 是否使用LLM响应缓存（紧急/异常工况自动跳过）
             
         Returns:
-            Dict: 包含控制决策和LLM建议
+            Dict: 包含控制决策、LLM建议及缓存命中标记
         """
         try:
-            # 调用LLM生成专业建议
-            llm_response = self.chain.invoke({
-                "toxicity_analysis": toxicity_analysis,
-                "current_frequency": current_frequency,
-                "current_rpm": self._hz_to_rpm(current_frequency),
-                "active_reactors": active_reactors
-            })
-            
-            return {
-                "status": "success",
-                "suggestion": llm_response,
-                "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
+            inputs, cache_key, llm_response = self._prepare(
+                toxicity_analysis, current_frequency, active_reactors, cache
+            )
+            cache_hit = llm_response is not None
+            if not cache_hit:
+                # 调用LLM生成专业建议
+                llm_response = self.chain.invoke(inputs)
+                self._remember(toxicity_analysis, cache_key, llm_response)
+            return self._success_result(llm_response, cache_hit)
         except Exception as e:
-            return {
-                "status": "error",
-                "suggestion": f"转盘控制决策生成失败: {str(e)}",
-                "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
+            return self._error_result(e)
+    
+    async def arun(self, toxicity_analysis: str, current_frequency: float = 25.0,
+                   active_reactors: int = 2, cache: bool = True) -> Dict[str, Any]:
+        """异步运行转盘智能体（参数与返回值同 run）"""
+        try:
+            inputs, cache_key, llm_response = self._prepare(
+                toxicity_analysis, current_frequency, active_reactors, cache
+            )
+            cache_hit = llm_response is not None
+            if not cache_hit:
+                llm_response = await self.chain.ainvoke(inputs)
+                self._remember(toxicity_analysis, cache_key, llm_response)
+            return self._success_result(llm_response, cache_hit)
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def arun_many(self, requests: List[Dict[str, Any]], max_concurrency: Optional[int] = None,
+                        cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        异步批量运行多个工况场景
+        
+        缓存未命中的场景通过 chain.abatch 并发请求LLM，总耗时约为最慢的单次请求；
+        单个场景失败不影响其他场景。
+        
+        Args:
+            requests: 场景列表，键同 run 的参数名（toxicity_analysis 必填）
+            max_concurrency: 最大并发请求数，默认 llm_config.MAX_CONCURRENCY（环境变量 LLM_MAX_CONCURRENCY）
+            cache: 是否使用LLM响应缓存
+            
+        Returns:
+            List[Dict]: 与 requests 顺序一致的结果
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        pending = []  # (序号, 分析文本, 链输入, 缓存键)
+        for i, request in enumerate(requests):
+            toxicity_analysis = request["toxicity_analysis"]
+            try:
+                inputs, cache_key, llm_response = self._prepare(
+                    toxicity_analysis,
+                    request.get("current_frequency", 25.0),
+                    request.get("active_reactors", 2),
+                    cache
+                )
+            except Exception as e:
+                results[i] = self._error_result(e)
+                continue
+            if llm_response is not None:
+                results[i] = self._success_result(llm_response, True)
+            else:
+                pending.append((i, toxicity_analysis, inputs, cache_key))
+        
+        if pending:
+            responses = await self.chain.abatch(
+                [inputs for _, _, inputs, _ in pending],
+                config={"max_concurrency": max_concurrency or llm_config.MAX_CONCURRENCY},
+                return_exceptions=True
+            )
+            for (i, toxicity_analysis, _, cache_key), response in zip(pending, responses):
+                if isinstance(response, Exception):
+                    results[i] = self._error_result(response)
+                else:
+                    self._remember(toxicity_analysis, cache_key, response)
+                    results[i] = self._success_result(response, False)
+        return results
     
     def generate_control_output(self, toxicity: float, toxicity_level: str,
                                 trend: str = "稳定") -> TurntableControlOutput:
@@ -284,6 +505,7 @@ class TurntableAgent:
         reason = params["reason"]
         
         # 计算各转盘参数
+        rpm_per_hz = self._rpm_per_hz
         freq_1 = frequency
         freq_2 = frequency
         freq_3 = frequency if standby else 0.0
@@ -302,16 +524,80 @@ class TurntableAgent:
             frequency_1=freq_1,
             frequency_2=freq_2,
             frequency_3=freq_3,
-            rpm_1=self._hz_to_rpm(freq_1),
-            rpm_2=self._hz_to_rpm(freq_2),
-            rpm_3=self._hz_to_rpm(freq_3),
+            rpm_1=freq_1 * rpm_per_hz,
+            rpm_2=freq_2 * rpm_per_hz,
+            rpm_3=freq_3 * rpm_per_hz,
             active_reactors=reactors,
             standby_triggered=standby,
             expected_removal_rate=round(removal_rate, 1),
             decision_reason=reason,
             confidence=confidence,
-            timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            timestamp=now_str()
+        )
+    
+    def generate_control_batch(self, toxicity: np.ndarray, toxicity_level: Any,
+                               trend: Any = "稳定") -> Dict[str, np.ndarray]:
+        """
+        批量生成转盘控制参数（情景扫描或历史工况回放；单次控制请使用 generate_control_output）
+        
+        Args:
+            toxicity: 毒性值数组
+            toxicity_level: 毒性等级 (低/中/高)，标量或与 toxicity 等长的数组
+            trend: 变化趋势 (上升/稳定/下降)，标量或与 toxicity 等长的数组
+            
+        Returns:
+            Dict: 各控制参数数组（字段同 TurntableControlOutput，另含 alarm_level）
+        """
+        toxicity = np.asarray(toxicity, dtype=np.float64)
+        toxicity_level = np.broadcast_to(np.asarray(toxicity_level), toxicity.shape)
+        trend = np.broadcast_to(np.asarray(trend), toxicity.shape)
+        
+        # 档位与趋势编码，与 _determine_control_params 判定顺序一致
+        band = np.select(
+            [(toxicity_level == "低") | (toxicity < 1.5), (toxicity_level == "高") | (toxicity > 3.0)],
+            [0, 2], default=1
         )
+        trend_code = np.select([trend == "上升", trend == "下降"], [0, 2], default=1)
+        
+        factors = np.array([self.TREND_FACTORS[name] for name in _TRENDS])
+        reasons = np.array([
+            [self._band_control_params(b, name, 0.0)[2] for name in _TRENDS] for b in range(3)
+        ])
+        frequency = np.clip(
+            np.asarray(self._base_frequencies, dtype=np.float64)[band] * factors[trend_code], 5.0, 50.0
+        )
+        reactors = _BAND_REACTORS[band]
+        standby = reactors == 3
+        freq_3 = np.where(standby, frequency, 0.0)
+        
+        # 预期去除率（同 _removal_rate）
+        if HAS_NUMBA:
+            removal_rate = turntable_removal_rate_batch(
+                np.ascontiguousarray(frequency), np.ascontiguousarray(toxicity), self._rpm_per_hz
+            )
+        else:
+            # 未安装 numba 时整列向量化计算
+            k = 0.05 * (1 + frequency * self._rpm_per_hz / 1000)
+            removal_rate = (1 - np.exp(-k * 15.0)) * 100
+            removal_rate = np.clip(np.where(toxicity > 3.0, removal_rate * 0.9, removal_rate), 30.0, 95.0)
+        
+        confidence = np.where(toxicity_level == "高", 0.80, 0.85) - np.where(trend == "上升", 0.05, 0.0)
+        
+        return {
+            "frequency_1": frequency,
+            "frequency_2": frequency,
+            "frequency_3": freq_3,
+            "rpm_1": frequency * self._rpm_per_hz,
+            "rpm_2": frequency * self._rpm_per_hz,
+            "rpm_3": freq_3 * self._rpm_per_hz,
+            "active_reactors": reactors,
+            "standby_triggered": standby,
+            "expected_removal_rate": np.round(removal_rate, 1),
+            "decision_reason": reasons[band, trend_code],
+            "confidence": confidence,
+            # 报警等级无分支计算: 1 + (频率>35)，备用触发时按位或 3 恒为 3（同 to_plc_command）
+            "alarm_level": ((frequency > 35) + 1) | (standby * 3)
+        }
     
     def get_plc_command(self, toxicity: float, toxicity_level: str,
                         trend: str = "稳定") -> Dict[str, Any]:
@@ -330,6 +616,15 @@ class TurntableAgent:
         return output.to_plc_command()
 
 
+@lru_cache(maxsize=8)
+def _build_chain(api_key: Optional[str], base_url: Optional[str],
+                 model_name: str, temperature: float):
+    """构建转盘智能体处理链（按模型配置缓存，避免每次实例化重复构建）"""
+    # 转盘控制建议对响应时间敏感，启用 AQUAMIND_LATENCY_MODE 时附加低延迟推理参数
+    llm = get_chat_model(api_key, base_url, model_name, temperature, latency_optimized=True)
+    return TurntableAgent._PROMPT | llm | StrOutputParser()
+
+
 if __name__ == "__main__":
     # 测试转盘智能体
     print("=== 转盘智能体测试 ===")
@@ -357,3 +652,13 @@ if __name__ == "__main__":
     print(f"  频率: {output3.frequency_1} Hz")
     print(f"  备用触发: {output3.standby_triggered}")
     print(f"  PLC命令: {output3.to_plc_command()}")
+    
+    # 三个场景的LLM建议并发请求
+    print("\n场景1-3：LLM控制建议（并发）")
+    suggestions = asyncio.run(agent.arun_many([
+        {"toxicity_analysis": "毒性1.0，低毒性，趋势稳定", "current_frequency": 10.0},
+        {"toxicity_analysis": "毒性2.5，中毒性，趋势上升", "current_frequency": 25.0},
+        {"toxicity_analysis": "毒性4.0，高毒性，趋势上升", "current_frequency": 45.0, "active_reactors": 3}
+    ]))
+    for i, suggestion in enumerate(suggestions, 1):
+        print(f"  场景{i}: {suggestion['status']} {suggestion['suggestion'][:60]}")
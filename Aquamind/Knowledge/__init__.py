@@ -2,7 +2,7 @@
 知识库模块
 """
 
-from .knowledge_base import KnowledgeBase, PLCVariable, Equipment, get_knowledge_base, KNOWLEDGE_BASE
+from .knowledge_base import KnowledgeBase, PLCVariable, Equipment, get_knowledge_base
 
 __all__ = [
     'KnowledgeBase',
@@ -11,3 +11,10 @@ __all__ = [
     'get_knowledge_base',
     'KNOWLEDGE_BASE'
 ]
+
+
+def __getattr__(name: str):
+    # KNOWLEDGE_BASE 按需构建，导入本包时不预先实例化知识库
+    if name == "KNOWLEDGE_BASE":
+        return get_knowledge_base()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,11 +4,21 @@
 
 import os
 import json
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+from dataclasses import dataclass, field, asdict
+from functools import cached_property, lru_cache
 
+import numpy as np
 
-@dataclass
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
+
+@dataclass(slots=True, frozen=True)
 class PLCVariable:
     """PLC变量定义"""
     name: str
@@ -22,7 +32,7 @@ class PLCVariable:
     read_only: bool = True
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Equipment:
     """设备定义"""
     name: str
@@ -37,6 +47,13 @@ class KnowledgeBase:
     知识库基类 - 管理系统知识和配置
     """
     
+    # 设备类型 -> 专家规则类别
+    RECOMMENDATION_CATEGORIES = {
+        "turntable": "turntable_control",
+        "mbr": "mbr_control",
+        "regeneration": "regeneration_control"
+    }
+    
     def __init__(self):
         self.plc_variables: Dict[str, PLCVariable] = {}
         self.equipments: Dict[str, Equipment] = {}
@@ -390,6 +407,31 @@ class KnowledgeBase:
         """获取PLC变量"""
         return self.plc_variables.get(name)
     
+    @cached_property
+    def _plc_bounds(self) -> Tuple[Dict[str, int], np.ndarray, np.ndarray]:
+        """PLC变量量程列（变量名 -> 行号, 下限数组, 上限数组；未设定的量程为 ±inf）"""
+        index = {name: i for i, name in enumerate(self.plc_variables)}
+        variables = self.plc_variables.values()
+        mins = np.array([-np.inf if v.min_value is None else v.min_value for v in variables])
+        maxs = np.array([np.inf if v.max_value is None else v.max_value for v in variables])
+        return index, mins, maxs
+    
+    def validate_values(self, names: Sequence[str], values: Any) -> np.ndarray:
+        """
+        批量校验PLC写入值是否在变量量程内
+        
+        Args:
+            names: 变量键列表（同 plc_variables 的键）
+            values: 对应的写入值
+            
+        Returns:
+            np.ndarray: 逐项是否在量程内的布尔数组（NaN 视为越界）
+        """
+        index, mins, maxs = self._plc_bounds
+        rows = np.fromiter((index[name] for name in names), dtype=np.intp, count=len(names))
+        values = np.asarray(values, dtype=np.float64)
+        return (values >= mins[rows]) & (values <= maxs[rows])
+    
     def get_equipment(self, name: str) -> Optional[Equipment]:
         """获取设备信息"""
         return self.equipments.get(name)
@@ -404,34 +446,41 @@ class KnowledgeBase:
     
     def get_control_recommendation(self, toxicity_level: str, equipment_type: str) -> Dict:
         """根据毒性等级获取控制建议"""
-        recommendations = {
-            "turntable": self.expert_rules.get("turntable_control", {}),
-            "mbr": self.expert_rules.get("mbr_control", {}),
-            "regeneration": self.expert_rules.get("regeneration_control", {})
-        }
-        
-        rule_key = f"{toxicity_level.lower()}_toxicity"
-        if equipment_type in recommendations:
-            return recommendations[equipment_type].get(rule_key, {})
-        return {}
+        category = self.RECOMMENDATION_CATEGORIES.get(equipment_type)
+        if category is None:
+            return {}
+        return self.expert_rules.get(category, {}).get(f"{toxicity_level.lower()}_toxicity", {})
     
     def to_dict(self) -> Dict:
         """导出知识库为字典"""
         return {
-            "plc_variables": {k: v.__dict__ for k, v in self.plc_variables.items()},
-            "equipments": {k: {**v.__dict__, "plc_variables": v.plc_variables} 
-                          for k, v in self.equipments.items()},
+            "plc_variables": {k: asdict(v) for k, v in self.plc_variables.items()},
+            "equipments": {k: asdict(v) for k, v in self.equipments.items()},
             "expert_rules": self.expert_rules
         }
+    
+    def to_json(self) -> bytes:
+        """导出知识库为JSON字节串（结构同 to_dict；优先使用 orjson 直接序列化数据类）"""
+        if HAS_ORJSON:
+            return orjson.dumps({
+                "plc_variables": self.plc_variables,
+                "equipments": self.equipments,
+                "expert_rules": self.expert_rules
+            })
+        return json.dumps(self.to_dict(), ensure_ascii=False).encode("utf-8")
 
 
-# 全局知识库实例
-KNOWLEDGE_BASE = KnowledgeBase()
+@lru_cache(maxsize=1)
+def get_knowledge_base() -> KnowledgeBase:
+    """获取全局知识库实例（首次调用时构建，导入本模块不再预先构建）"""
+    return KnowledgeBase()
 
 
-def get_knowledge_base() -> KnowledgeBase:
-    """获取知识库实例"""
-    return KNOWLEDGE_BASE
+def __getattr__(name: str):
+    # 兼容旧的模块级全局实例 KNOWLEDGE_BASE（按需构建）
+    if name == "KNOWLEDGE_BASE":
+        return get_knowledge_base()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
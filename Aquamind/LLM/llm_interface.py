@@ -10,10 +10,17 @@
 """
 
 import os
+import atexit
+import asyncio
+import importlib.util
+import httpx
 import openai
 from dotenv import load_dotenv
 import json
+import random
 import time
+import threading
+from functools import cached_property, lru_cache
 from typing import Dict, Any, List, Optional
 import sys
 
@@ -29,6 +36,7 @@ if root_dir not in sys.path:
 try:
     from config import llm_config
     from logger import get_logger
+    from cache import ResponseCache, VectorCache, make_cache_key
     from exceptions import (
         LLMError,
         LLMTimeoutError,
@@ -41,6 +49,9 @@ except ImportError:
     USE_ENHANCED_FEATURES = False
     llm_config = None
 
+# httpx 的 HTTP/2 支持依赖 h2（仅检测是否安装，无需导入）
+HAS_H2 = importlib.util.find_spec("h2") is not None
+
 class LLMInterface:
     """
     大模型接口管理器
@@ -50,8 +61,47 @@ class LLMInterface:
     - 自动重试机制（处理网络错误、频率限制）
     - 超时控制
     - 详细错误日志
+    - 低温度调用的响应缓存（相同提示词直接复用结果）
+    - 多个独立提示词合并为单次调用（call_llm_batch）
     """
 
+    # 生成温度不高于该值时缓存响应（高温度调用期望输出多样，不缓存）
+    CACHE_MAX_TEMPERATURE = 0.3
+    # 响应缓存有效期（秒）
+    CACHE_TTL = 86400
+    # 重试等待上限（秒）
+    RETRY_MAX_DELAY = 30.0
+
+    # call_llm_batch 每次合并的提示词数
+    BATCH_SIZE = 6
+    # call_llm_batch 合并提示词的固定前缀
+    BATCH_PROMPT_HEADER = (
+        "请逐一回答以下各编号问题，问题之间相互独立。"
+        '仅返回JSON数组：[{"id": 编号, "answer": "回答内容"}]，每个问题对应一项。\n'
+    )
+
+    # 毒性预测近似缓存：各水质参数差值均在容差内（且历史统计相同）时复用预测结果
+    TOXICITY_FEATURES = ("temperature", "humidity", "ammonia_n", "nitrate_n", "ph", "rainfall")
+    TOXICITY_FEATURE_TOLERANCE = (0.5, 2.0, 0.2, 0.2, 0.05, 0.5)  # °C, %, mg/L, mg/L, pH, mm
+    # 响应解析失败时结果中的 factors 标记（此类结果不缓存）
+    PARSE_FAILURE_FACTORS = ("数据解析失败", "响应格式错误")
+
+    # 毒性预测提示词的固定前缀（角色、任务与输出格式），动态水质数据附在其后，
+    # 使各次请求共享相同前缀，便于服务端前缀缓存
+    TOXICITY_PROMPT_PREFIX = """
+你是一个专业的水质毒性预测专家。请根据下方给出的水质参数（及历史数据统计，如有）预测未来24小时的毒性水平。
+
+请先分析水质状况，再按照以下JSON格式返回结果：
+{
+    "predicted_toxicity": 数值,
+    "toxicity_level": "低|中|高",
+    "confidence": 0.0-1.0之间的置信度,
+    "factors": ["影响毒性的因素列表"],
+    "explanation": "详细的分析说明",
+    "recommendations": ["建议措施列表"]
+}
+"""
+
     def __init__(self):
         """初始化大模型接口"""
         # 初始化日志
@@ -81,12 +131,12 @@ class LLMInterface:
             self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
             self.retry_delay = float(os.getenv("LLM_RETRY_DELAY", "1.0"))
 
-        # 设置OpenAI客户端
+        # 设置OpenAI客户端（相同配置的实例共享同一客户端及连接池）
         try:
-            self.client = openai.OpenAI(
-                base_url=self.qwen_api_base or self.openai_api_base,
-                api_key=self.qwen_api_key or self.openai_api_key,
-                timeout=self.timeout
+            self.client = get_openai_client(
+                self.qwen_api_base or self.openai_api_base,
+                self.qwen_api_key or self.openai_api_key,
+                self.timeout
             )
             self.model_name = self.qwen_model_name
             
@@ -97,7 +147,96 @@ class LLMInterface:
                 self.logger.error(f"LLM接口初始化失败: {e}")
             raise
 
-    def call_llm(self, prompt: str, max_tokens: int = 1000, temperature: float = 0.7) -> str:
+    @cached_property
+    def async_client(self) -> "openai.AsyncOpenAI":
+        """异步客户端（首次异步调用时获取，与同配置实例共享）"""
+        return get_async_openai_client(
+            self.qwen_api_base or self.openai_api_base,
+            self.qwen_api_key or self.openai_api_key,
+            self.timeout
+        )
+
+    def _cache_lookup(self, prompt: str, max_tokens: int, temperature: float, cache: bool):
+        """
+        查询响应缓存
+
+        Returns:
+            (缓存对象（不使用缓存时为 None）, 缓存键, 缓存的响应（未命中时为 None）)
+        """
+        if not (cache and USE_ENHANCED_FEATURES and temperature <= self.CACHE_MAX_TEMPERATURE):
+            return None, None, None
+        response_cache = get_response_cache()
+        cache_key = make_cache_key("call_llm", self.model_name, prompt, max_tokens, temperature)
+        return response_cache, cache_key, response_cache.get(cache_key)
+
+    @staticmethod
+    def _retry_after(error: Exception) -> float:
+        """读取频率限制响应中服务端建议的等待时间（秒），未提供时为 0"""
+        response = getattr(error, "response", None)
+        if response is None:
+            return 0.0
+        headers = response.headers
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000
+            return float(headers.get("retry-after", 0))
+        except ValueError:
+            return 0.0  # HTTP日期格式等无法解析时按指数退避处理
+
+    def _retry_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """
+        记录失败并返回重试前的等待时间（秒）
+
+        等待时间为带全抖动的指数退避 uniform(0, min(上限, retry_delay * 2^attempt))，
+        避免并发请求同时重试；频率限制时不少于服务端 Retry-After。
+
+        Returns:
+            等待秒数；None 表示不应重试（API错误）
+        """
+        delay = random.uniform(0, min(self.RETRY_MAX_DELAY, self.retry_delay * 2 ** attempt))
+        if isinstance(error, openai.APITimeoutError):
+            if self.logger:
+                self.logger.warning(
+                    f"LLM请求超时 (尝试 {attempt + 1}/{self.max_retries}): {error}"
+                )
+            return delay
+        if isinstance(error, openai.RateLimitError):
+            if self.logger:
+                self.logger.warning(
+                    f"LLM频率限制 (尝试 {attempt + 1}/{self.max_retries}): {error}"
+                )
+            return max(delay, self._retry_after(error))
+        if isinstance(error, openai.APIError):
+            if self.logger:
+                self.logger.error(f"LLM API错误: {error}")
+            # API错误通常不需要重试
+            return None
+        if self.logger:
+            self.logger.error(
+                f"LLM调用异常 (尝试 {attempt + 1}/{self.max_retries}): {error}"
+            )
+        return delay
+
+    def _on_failure(self, last_error: Exception) -> str:
+        """所有重试失败后的处理：增强模式抛出对应异常，兼容模式返回错误消息"""
+        error_msg = f"LLM调用失败（已重试{self.max_retries}次）: {last_error}"
+        if self.logger:
+            self.logger.error(error_msg)
+        
+        # 根据增强功能决定是否抛出异常
+        if USE_ENHANCED_FEATURES:
+            if isinstance(last_error, openai.APITimeoutError):
+                raise LLMTimeoutError(self.timeout, self.model_name)
+            elif isinstance(last_error, openai.RateLimitError):
+                raise LLMRateLimitError(model_name=self.model_name)
+            else:
+                raise LLMError(error_msg, self.model_name)
+        else:
+            # 兼容模式：返回错误消息
+            return f"抱歉，模型调用出现问题: {str(last_error)}"
+
+    def call_llm(self, prompt: str, max_tokens: int = 1000, temperature: float = 0.7,
+                 cache: bool = True) -> str:
         """
         调用大模型API（带重试机制）
 
@@ -105,6 +244,7 @@ class LLMInterface:
             prompt: 输入提示
             max_tokens: 最大输出token数
             temperature: 生成温度
+            cache: 是否使用响应缓存（仅 temperature <= CACHE_MAX_TEMPERATURE 时生效）
 
         Returns:
             模型生成的文本
@@ -114,6 +254,10 @@ class LLMInterface:
             LLMTimeoutError: 请求超时
             LLMRateLimitError: 频率限制
         """
+        response_cache, cache_key, cached = self._cache_lookup(prompt, max_tokens, temperature, cache)
+        if cached is not None:
+            return cached
+        
         last_error = None
         
         for attempt in range(self.max_retries):
@@ -137,59 +281,244 @@ class LLMInterface:
                         f"提示词: {len(prompt)}字符"
                     )
                 
-                return response.choices[0].message.content
+                content = response.choices[0].message.content
+                if response_cache is not None and content is not None:
+                    response_cache.set(cache_key, content)
+                return content
                 
-            except openai.Timeout as e:
+            except Exception as e:
                 last_error = e
-                if self.logger:
-                    self.logger.warning(
-                        f"LLM请求超时 (尝试 {attempt + 1}/{self.max_retries}): {e}"
-                    )
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    break
                 if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay * (attempt + 1))
-                    
-            except openai.RateLimitError as e:
-                last_error = e
+                    time.sleep(delay)
+        
+        # 所有重试都失败
+        return self._on_failure(last_error)
+
+    async def acall_llm(self, prompt: str, max_tokens: int = 1000, temperature: float = 0.7,
+                        cache: bool = True) -> str:
+        """调用大模型API（异步；参数、重试与缓存行为同 call_llm）"""
+        response_cache, cache_key, cached = self._cache_lookup(prompt, max_tokens, temperature, cache)
+        if cached is not None:
+            return cached
+        
+        last_error = None
+        
+        for attempt in range(self.max_retries):
+            try:
+                start_time = time.time()
+                
+                response = await self.async_client.chat.completions.create(
+                    model=self.model_name,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                )
+                
                 if self.logger:
-                    self.logger.warning(
-                        f"LLM频率限制 (尝试 {attempt + 1}/{self.max_retries}): {e}"
+                    self.logger.debug(
+                        f"LLM异步调用成功 - 耗时: {time.time() - start_time:.2f}秒, "
+                        f"提示词: {len(prompt)}字符"
                     )
-                # 频率限制时等待更长时间
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay * (attempt + 1) * 2)
-                    
-            except openai.APIError as e:
-                last_error = e
-                if self.logger:
-                    self.logger.error(f"LLM API错误: {e}")
-                # API错误通常不需要重试
-                break
+                
+                content = response.choices[0].message.content
+                if response_cache is not None and content is not None:
+                    response_cache.set(cache_key, content)
+                return content
                 
             except Exception as e:
                 last_error = e
-                if self.logger:
-                    self.logger.error(
-                        f"LLM调用异常 (尝试 {attempt + 1}/{self.max_retries}): {e}"
-                    )
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    break
                 if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
+                    await asyncio.sleep(delay)
         
-        # 所有重试都失败
-        error_msg = f"LLM调用失败（已重试{self.max_retries}次）: {last_error}"
-        if self.logger:
-            self.logger.error(error_msg)
+        return self._on_failure(last_error)
+
+    async def acall_llm_many(self, prompts: List[str], max_tokens: int = 1000,
+                             temperature: float = 0.7, concurrency: Optional[int] = None,
+                             cache: bool = True) -> List[Any]:
+        """
+        并发调用多个相互独立的提示词，总耗时约为最慢的单次调用
+
+        Args:
+            prompts: 提示词列表
+            concurrency: 最大并发请求数，默认 llm_config.MAX_CONCURRENCY
+            cache: 是否使用响应缓存
+
+        Returns:
+            List: 与 prompts 顺序一致的结果；单个调用失败时对应位置为异常对象
+        """
+        if concurrency is None:
+            concurrency = llm_config.MAX_CONCURRENCY if USE_ENHANCED_FEATURES and llm_config else 8
+        semaphore = asyncio.Semaphore(max(1, concurrency))
         
-        # 根据增强功能决定是否抛出异常
-        if USE_ENHANCED_FEATURES:
-            if isinstance(last_error, openai.Timeout):
-                raise LLMTimeoutError(self.timeout, self.model_name)
-            elif isinstance(last_error, openai.RateLimitError):
-                raise LLMRateLimitError(model_name=self.model_name)
+        async def call(prompt: str) -> str:
+            async with semaphore:
+                return await self.acall_llm(prompt, max_tokens, temperature, cache)
+        
+        return await asyncio.gather(*(call(prompt) for prompt in prompts), return_exceptions=True)
+
+    def call_llm_batch(self, prompts: List[str], max_tokens: int = 1000, temperature: float = 0.7,
+                       cache: bool = True, batch_size: Optional[int] = None) -> List[str]:
+        """
+        将多个相互独立的提示词合并为一次调用（每次最多 batch_size 个），
+        分摊固定指令预填充与网络往返开销
+
+        模型需返回 [{"id": 序号, "answer": 回答}] 形式的JSON数组；合并请求失败、
+        响应中缺失或无法解析的条目回退为单独的 call_llm 调用。缓存按单个提示词读写，与 call_llm 共享。
+
+        Args:
+            prompts: 提示词列表
+            max_tokens: 每个提示词的最大输出token数
+            temperature: 生成温度
+            cache: 是否使用响应缓存
+            batch_size: 每次合并的提示词数，默认 BATCH_SIZE
+
+        Returns:
+            List[str]: 与 prompts 顺序一致的回答
+        """
+        batch_size = max(1, batch_size or self.BATCH_SIZE)
+        answers: List[Optional[str]] = [None] * len(prompts)
+        pending = []
+        for i, prompt in enumerate(prompts):
+            response_cache, cache_key, cached = self._cache_lookup(prompt, max_tokens, temperature, cache)
+            if cached is not None:
+                answers[i] = cached
             else:
-                raise LLMError(error_msg, self.model_name)
-        else:
-            # 兼容模式：返回错误消息
-            return f"抱歉，模型调用出现问题: {str(last_error)}"
+                pending.append((i, response_cache, cache_key))
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            if len(chunk) > 1:
+                combined = self.BATCH_PROMPT_HEADER + "\n".join(
+                    f"[{n}] {prompts[i]}" for n, (i, _, _) in enumerate(chunk, 1)
+                )
+                try:
+                    response = self.call_llm(combined, max_tokens * len(chunk), temperature, cache=False)
+                except LLMError as e:
+                    # 增强模式下合并请求失败会抛出异常，整批改为逐个调用
+                    if self.logger:
+                        self.logger.warning(f"合并调用失败，改为逐个调用: {e}")
+                    response = ""
+                items = self._extract_json(response or "", list) or []
+                by_id = {
+                    str(item.get("id")): item.get("answer")
+                    for item in items if isinstance(item, dict)
+                }
+                for n, (i, response_cache, cache_key) in enumerate(chunk, 1):
+                    answer = by_id.get(str(n))
+                    if answer is None:
+                        continue
+                    if not isinstance(answer, str):
+                        answer = json.dumps(answer, ensure_ascii=False)
+                    answers[i] = answer
+                    if response_cache is not None:
+                        response_cache.set(cache_key, answer)
+
+            for i, _, _ in chunk:
+                if answers[i] is None:
+                    if len(chunk) > 1 and self.logger:
+                        self.logger.warning(f"合并调用未返回第{i + 1}个提示词的回答，改为单独调用")
+                    answers[i] = self.call_llm(prompts[i], max_tokens, temperature, cache)
+        return answers
+
+    def submit_batch(self, requests: Dict[str, List[Dict[str, str]]],
+                     max_tokens: int = 1000, temperature: float = 0.3,
+                     completion_window: str = "24h") -> str:
+        """
+        提交离线批量任务（Batch API，适用于可延迟完成的定时报告等场景）
+
+        Args:
+            requests: custom_id -> 消息列表（OpenAI chat 格式）
+            max_tokens: 最大输出token数
+            temperature: 生成温度
+            completion_window: 完成时限
+
+        Returns:
+            str: 批量任务ID
+        """
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model_name,
+                    "messages": messages,
+                    "max_tokens": max_tokens,
+                    "temperature": temperature
+                }
+            }, ensure_ascii=False)
+            for custom_id, messages in requests.items()
+        ]
+        batch_file = self.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=completion_window
+        )
+
+        if self.logger:
+            self.logger.info(f"批量任务已提交 - ID: {batch.id}, 请求数: {len(lines)}")
+        return batch.id
+
+    def collect_batch(self, batch_id: str, poll_interval: float = 30.0,
+                      max_poll_interval: float = 600.0,
+                      timeout: Optional[float] = None) -> Dict[str, str]:
+        """
+        等待批量任务完成并读取结果（轮询间隔指数退避）
+
+        Args:
+            batch_id: 批量任务ID
+            poll_interval: 初始轮询间隔（秒）
+            max_poll_interval: 最大轮询间隔（秒）
+            timeout: 最长等待时间（秒），None 表示一直等待
+
+        Returns:
+            Dict[str, str]: custom_id -> 模型输出（单条请求失败时为错误说明）
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        interval = poll_interval
+
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status == "completed":
+                break
+            if batch.status in ("failed", "expired", "cancelled"):
+                error_msg = f"批量任务 {batch_id} 未完成: {batch.status}"
+                if self.logger:
+                    self.logger.error(error_msg)
+                if USE_ENHANCED_FEATURES:
+                    raise LLMError(error_msg, self.model_name)
+                raise RuntimeError(error_msg)
+            if deadline is not None and time.monotonic() + interval > deadline:
+                if USE_ENHANCED_FEATURES:
+                    raise LLMTimeoutError(timeout, self.model_name)
+                raise TimeoutError(f"批量任务 {batch_id} 等待超时 (>{timeout}秒)")
+            time.sleep(interval)
+            interval = min(interval * 2, max_poll_interval)
+
+        results = {}
+        if batch.output_file_id:
+            for line in self.client.files.content(batch.output_file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    results[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+                else:
+                    results[record["custom_id"]] = f"批量请求失败: {record.get('error') or response.get('body')}"
+        return results
 
     def predict_toxicity_with_llm(self, input_data: Dict[str, Any], historical_data: Dict[str, Any] = None) -> Dict[str, Any]:
         """
@@ -202,6 +531,16 @@ class LLMInterface:
         Returns:
             包含预测结果的字典
         """
+        # 水质参数相近的预测直接复用
+        prediction_cache = get_prediction_cache() if USE_ENHANCED_FEATURES else None
+        if prediction_cache is not None:
+            features = [float(input_data.get(name, 0) or 0) for name in self.TOXICITY_FEATURES]
+            history_key = {k: round(float(v), 2) for k, v in (historical_data or {}).items()
+                           if isinstance(v, (int, float))}
+            cached = prediction_cache.get(features, self.model_name, history_key)
+            if cached is not None:
+                return dict(cached)
+
         # 构建提示词
         prompt = self._build_toxicity_prediction_prompt(input_data, historical_data)
 
@@ -209,13 +548,14 @@ class LLMInterface:
         llm_response = self.call_llm(prompt, max_tokens=500, temperature=0.3)
 
         # 解析响应
-        return self._parse_llm_response(llm_response)
+        result = self._parse_llm_response(llm_response)
+        if prediction_cache is not None and not set(result.get("factors") or ()) & set(self.PARSE_FAILURE_FACTORS):
+            prediction_cache.set(features, dict(result), self.model_name, history_key)
+        return result
 
     def _build_toxicity_prediction_prompt(self, input_data: Dict[str, Any], historical_data: Dict[str, Any] = None) -> str:
-        """构建毒性预测的提示词"""
-        prompt = f"""
-你是一个专业的水质毒性预测专家。请根据以下水质参数预测未来24小时的毒性水平。
-
+        """构建毒性预测的提示词（固定前缀 + 本次水质数据）"""
+        prompt = self.TOXICITY_PROMPT_PREFIX + f"""
 当前水质参数：
 - 温度: {input_data.get('temperature', 0)}°C
 - 湿度: {input_data.get('humidity', 0)}%
@@ -223,7 +563,6 @@ class LLMInterface:
 - 硝氮: {input_data.get('nitrate_n', 0)} mg/L
 - pH值: {input_data.get('ph', 0)}
 - 降雨量: {input_data.get('rainfall', 0)} mm
-
 """
 
         if historical_data:
@@ -233,70 +572,270 @@ class LLMInterface:
 - 毒性标准差: {historical_data.get('std_toxicity', 0):.2f}
 - 最大毒性: {historical_data.get('max_toxicity', 0):.2f}
 - 最小毒性: {historical_data.get('min_toxicity', 0):.2f}
-
 """
+        return prompt
 
-        prompt += """
-请基于以上信息，分析水质状况并预测未来24小时的毒性水平。
+    @staticmethod
+    def _extract_json(text: str, container: type = dict) -> Any:
+        """
+        提取文本中第一个完整的JSON对象（container=dict）或数组（container=list）
 
-请按照以下JSON格式返回结果：
-{
-    "predicted_toxicity": 数值,
-    "toxicity_level": "低|中|高",
-    "confidence": 0.0-1.0之间的置信度,
-    "factors": ["影响毒性的因素列表"],
-    "explanation": "详细的分析说明",
-    "recommendations": ["建议措施列表"]
-}
-"""
-        return prompt
+        从每个起始括号处尝试 raw_decode，由解码器处理字符串内的括号与转义，
+        响应中含多段JSON或前后附带说明文字时也能取出完整对象。
+
+        Returns:
+            解析结果；不存在合法的对应类型JSON时为 None
+        """
+        opening = '{' if container is dict else '['
+        idx = text.find(opening)
+        while idx != -1:
+            try:
+                obj, _ = _JSON_DECODER.raw_decode(text, idx)
+                if isinstance(obj, container):
+                    return obj
+            except json.JSONDecodeError:
+                pass
+            idx = text.find(opening, idx + 1)
+        return None
 
     def _parse_llm_response(self, response: str) -> Dict[str, Any]:
         """解析大模型响应"""
-        try:
-            # 尝试提取JSON部分
-            start_idx = response.find('{')
-            end_idx = response.rfind('}') + 1
-
-            if start_idx != -1 and end_idx != 0:
-                json_str = response[start_idx:end_idx]
-                result = json.loads(json_str)
-
-                # 确保必要字段存在
-                if 'predicted_toxicity' not in result:
-                    result['predicted_toxicity'] = 2.0
-                if 'toxicity_level' not in result:
-                    result['toxicity_level'] = '中'
-                if 'confidence' not in result:
-                    result['confidence'] = 0.7
-
-                return result
-            else:
-                # 如果没有JSON格式，返回默认值
-                return {
-                    "predicted_toxicity": 2.0,
-                    "toxicity_level": "中",
-                    "confidence": 0.5,
-                    "factors": ["数据解析失败"],
-                    "explanation": "无法解析模型响应",
-                    "recommendations": ["请检查输入数据"]
-                }
-        except json.JSONDecodeError:
+        if '{' not in response or '}' not in response:
+            # 如果没有JSON格式，返回默认值
+            return {
+                "predicted_toxicity": 2.0,
+                "toxicity_level": "中",
+                "confidence": 0.5,
+                "factors": [self.PARSE_FAILURE_FACTORS[0]],
+                "explanation": "无法解析模型响应",
+                "recommendations": ["请检查输入数据"]
+            }
+
+        result = self._extract_json(response)
+        if result is None:
             # JSON解析失败，返回错误信息
             return {
                 "predicted_toxicity": 2.0,
                 "toxicity_level": "中",
                 "confidence": 0.3,
-                "factors": ["响应格式错误"],
+                "factors": [self.PARSE_FAILURE_FACTORS[1]],
                 "explanation": f"模型响应: {response[:200]}...",
                 "recommendations": ["请重试预测"]
             }
 
+        # 确保必要字段存在
+        result.setdefault('predicted_toxicity', 2.0)
+        result.setdefault('toxicity_level', '中')
+        result.setdefault('confidence', 0.7)
+        return result
+
     def chat(self, message: str) -> str:
         """与大模型聊天"""
         return self.call_llm(message, max_tokens=500, temperature=0.7)
 
 
+# 从任意位置解码JSON（_extract_json 使用）
+_JSON_DECODER = json.JSONDecoder()
+
+
+@lru_cache(maxsize=1)
+def get_response_cache():
+    """获取 call_llm 共享的响应缓存（磁盘持久化，跨进程复用）"""
+    return ResponseCache("llm_responses", ttl=LLMInterface.CACHE_TTL, persistent=True)
+
+
+@lru_cache(maxsize=1)
+def get_prediction_cache():
+    """获取 predict_toxicity_with_llm 共享的水质参数近似缓存"""
+    return VectorCache(LLMInterface.TOXICITY_FEATURE_TOLERANCE, ttl=LLMInterface.CACHE_TTL)
+
+
+class _LoopLocalAsyncClient(httpx.AsyncClient):
+    """
+    按事件循环分配连接池的 httpx.AsyncClient
+
+    异步连接绑定在首次使用它的事件循环上，同步包装每次 asyncio.run 都会新建循环，
+    共享单个 AsyncClient 会在第二个循环中复用已关闭循环的连接（Event loop is closed）。
+    本类对外作为一个客户端传给 openai / LangChain，实际请求交给当前运行循环专属的
+    AsyncClient。
+
+    连接持有对所属循环的引用，不能依赖弱引用回收，需显式关闭：
+    - 每个循环的客户端登记一个守护异步生成器，asyncio.run 退出前的 shutdown_asyncgens
+      会结束它，从而在循环关闭前 aclose 该客户端
+    - 未经 shutdown_asyncgens 直接关闭的循环，在下次取客户端时移除，交由垃圾回收
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._client_kwargs = kwargs
+        # 事件循环 -> (客户端, 守护异步生成器)
+        self._loop_clients: Dict[asyncio.AbstractEventLoop, tuple] = {}
+        self._loop_lock = threading.Lock()
+
+    async def _current_client(self) -> httpx.AsyncClient:
+        """当前运行循环专属的客户端（不存在时创建）"""
+        loop = asyncio.get_running_loop()
+        with self._loop_lock:
+            for closed in [other for other in self._loop_clients if other.is_closed()]:
+                del self._loop_clients[closed]
+            entry = self._loop_clients.get(loop)
+            if entry is not None:
+                return entry[0]
+            client = httpx.AsyncClient(**self._client_kwargs)
+            guard = self._close_with_loop(loop, client)
+            self._loop_clients[loop] = (client, guard)
+        # 首次迭代时生成器登记到当前循环，循环结束时由 shutdown_asyncgens 关闭
+        await guard.__anext__()
+        return client
+
+    async def _close_with_loop(self, loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient):
+        """守护异步生成器：被结束时移除并关闭该循环的客户端"""
+        try:
+            yield
+        finally:
+            with self._loop_lock:
+                self._loop_clients.pop(loop, None)
+            await client.aclose()
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        client = await self._current_client()
+        return await client.send(request, **kwargs)
+
+    async def aclose(self):
+        """关闭当前循环的连接池"""
+        with self._loop_lock:
+            entry = self._loop_clients.get(asyncio.get_running_loop())
+        if entry is not None:
+            await entry[1].aclose()
+
+
+@lru_cache(maxsize=1)
+def get_http_clients():
+    """
+    获取各智能体共享的HTTP客户端（同步、异步各一个）
+
+    所有聊天模型共用同一连接池，避免每个客户端各自建立TCP/TLS连接；
+    安装 h2 时启用 HTTP/2 多路复用。同步客户端在进程退出时关闭；
+    异步客户端按事件循环分配连接池（见 _LoopLocalAsyncClient），随循环释放。
+
+    Returns:
+        (httpx.Client, httpx.AsyncClient)
+    """
+    if USE_ENHANCED_FEATURES and llm_config:
+        max_connections, timeout = llm_config.HTTP_MAX_CONNECTIONS, llm_config.REQUEST_TIMEOUT
+    else:
+        max_connections = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32"))
+        timeout = int(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+
+    limits = httpx.Limits(max_connections=max_connections,
+                          max_keepalive_connections=max_connections)
+    client = httpx.Client(http2=HAS_H2, limits=limits, timeout=timeout)
+    async_client = _LoopLocalAsyncClient(http2=HAS_H2, limits=limits, timeout=timeout)
+    atexit.register(client.close)
+    return client, async_client
+
+
+def latency_extra_body(base_url: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    按服务商返回低延迟推理的附加请求参数（未启用 AQUAMIND_LATENCY_MODE 或服务商未知时为 None）
+
+    - DashScope: 关闭联网搜索与思考模式，减少首字延迟
+    - Bedrock: performanceConfig 延迟优化配置
+    """
+    if USE_ENHANCED_FEATURES and llm_config:
+        latency_mode = llm_config.LATENCY_MODE
+    else:
+        latency_mode = os.getenv("AQUAMIND_LATENCY_MODE", "False").lower() == "true"
+
+    if not latency_mode or not base_url:
+        return None
+    if "dashscope" in base_url:
+        return {"enable_search": False, "enable_thinking": False}
+    if "bedrock" in base_url:
+        return {"performanceConfig": {"latency": "optimized"}}
+    return None
+
+
+@lru_cache(maxsize=8)
+def get_openai_client(base_url: Optional[str], api_key: Optional[str], timeout: float):
+    """
+    获取共享的 openai.OpenAI 客户端
+
+    相同 (base_url, api_key, timeout) 的 LLMInterface 实例复用同一客户端，
+    并与 LangChain 聊天模型共用 get_http_clients 的连接池，避免每次实例化重新建立TCP/TLS连接。
+
+    Returns:
+        openai.OpenAI
+    """
+    http_client, _ = get_http_clients()
+    # 重试由 LLMInterface 统一处理（LLM_MAX_RETRIES），关闭SDK内置重试避免重试次数叠加
+    return openai.OpenAI(base_url=base_url, api_key=api_key, timeout=timeout,
+                         http_client=http_client, max_retries=0)
+
+
+@lru_cache(maxsize=8)
+def get_async_openai_client(base_url: Optional[str], api_key: Optional[str], timeout: float):
+    """获取共享的 openai.AsyncOpenAI 客户端（使用 get_http_clients 的异步连接池）"""
+    _, http_async_client = get_http_clients()
+    return openai.AsyncOpenAI(base_url=base_url, api_key=api_key, timeout=timeout,
+                              http_client=http_async_client, max_retries=0)
+
+
+@lru_cache(maxsize=16)
+def get_chat_model(api_key: Optional[str], base_url: Optional[str],
+                   model: str, temperature: float, latency_optimized: bool = False):
+    """
+    获取共享的 LangChain ChatOpenAI 客户端
+
+    相同 (api_key, base_url, model, temperature, latency_optimized) 的调用复用同一实例，
+    所有实例共用 get_http_clients 的连接池。
+
+    Args:
+        latency_optimized: 是否附加低延迟推理参数（见 latency_extra_body）
+
+    Returns:
+        ChatOpenAI: LangChain 聊天模型
+    """
+    from langchain_openai import ChatOpenAI
+
+    http_client, http_async_client = get_http_clients()
+    return ChatOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        model=model,
+        temperature=temperature,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        extra_body=latency_extra_body(base_url) if latency_optimized else None
+    )
+
+
+def build_system_message(content: str):
+    """
+    构建静态系统消息
+
+    系统提示词作为固定前缀直接以消息对象放入提示词模板，不参与变量格式化；
+    启用 ENABLE_PROMPT_CACHE 时附加 cache_control 标记，使服务端缓存该前缀。
+
+    Returns:
+        SystemMessage: LangChain 系统消息
+    """
+    from langchain_core.messages import SystemMessage
+
+    if USE_ENHANCED_FEATURES and llm_config:
+        enable_prompt_cache = llm_config.ENABLE_PROMPT_CACHE
+    else:
+        enable_prompt_cache = os.getenv("ENABLE_PROMPT_CACHE", "False").lower() == "true"
+
+    if enable_prompt_cache:
+        return SystemMessage(content=[{
+            "type": "text",
+            "text": content,
+            "cache_control": {"type": "ephemeral"}
+        }])
+    return SystemMessage(content=content)
+
+
 def test_llm_interface():
     """测试大模型接口"""
     print("初始化大模型接口...")
@@ -14,6 +14,7 @@
 import sys
 import os
 import argparse
+import asyncio
 import time
 import json
 import logging
@@ -107,6 +108,7 @@ def main():
     parser.add_argument("--input", type=str, help="用户输入", default=None)
     parser.add_argument("--demo", action="store_true", help="运行演示")
     parser.add_argument("--batch", type=str, help="批量测试文件路径")
+    parser.add_argument("--concurrency", type=int, default=4, help="批量测试的最大并发用例数")
     parser.add_argument("--log", type=str, help="日志文件路径", default=None)
     parser.add_argument("--no-session", action="store_true", help="禁用会话记录")
     args = parser.parse_args()
@@ -128,7 +130,7 @@ def main():
     try:
         if args.batch:
             # 批量测试模式
-            run_batch_test(orchestrator, args.batch, session, logger)
+            run_batch_test(orchestrator, args.batch, session, logger, args.concurrency)
         elif args.demo:
             # 演示模式
             run_demo(orchestrator, session, logger)
@@ -260,9 +262,29 @@ def run_interactive(orchestrator: MainOrchestrator, session: SessionManager = No
                 logger.error(f"交互异常: {e}", exc_info=True)
 
 
+async def _run_test_cases(orchestrator: MainOrchestrator, test_cases: List[Dict[str, Any]],
+                          concurrency: int) -> List[tuple]:
+    """并发执行测试用例（用例间相互独立），返回与用例顺序一致的 (输出, 响应时间)"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run_case(i: int, user_input: str) -> tuple:
+        async with semaphore:
+            print(f"\n[测试 {i}/{len(test_cases)}] {user_input[:50]}...")
+            start_time = time.time()
+            try:
+                result = await orchestrator.arun(user_input)
+            except Exception as e:
+                result = f"执行失败: {e}"
+            return result, time.time() - start_time
+    
+    return await asyncio.gather(*(
+        run_case(i, test_case.get("input", "")) for i, test_case in enumerate(test_cases, 1)
+    ))
+
+
 def run_batch_test(orchestrator: MainOrchestrator, batch_file: str, 
-                   session: SessionManager = None, logger = None):
-    """批量测试模式"""
+                   session: SessionManager = None, logger = None, concurrency: int = 4):
+    """批量测试模式（用例并发执行，最多 concurrency 个同时进行）"""
     print("\n" + "=" * 60)
     print(f"批量测试模式: {batch_file}")
     print("=" * 60)
@@ -271,19 +293,17 @@ def run_batch_test(orchestrator: MainOrchestrator, batch_file: str,
         with open(batch_file, 'r', encoding='utf-8') as f:
             test_cases = json.load(f)
         
-        print(f"\n加载了 {len(test_cases)} 个测试用例\n")
+        print(f"\n加载了 {len(test_cases)} 个测试用例 (并发数: {concurrency})\n")
+        
+        batch_start = time.time()
+        outputs = asyncio.run(_run_test_cases(orchestrator, test_cases, concurrency))
+        total_time = time.time() - batch_start
         
         results = []
-        for i, test_case in enumerate(test_cases, 1):
+        for i, (test_case, (result, response_time)) in enumerate(zip(test_cases, outputs), 1):
             user_input = test_case.get("input", "")
             expected_intent = test_case.get("intent", "unknown")
             
-            print(f"\n[测试 {i}/{len(test_cases)}] {user_input[:50]}...")
-            
-            start_time = time.time()
-            result = orchestrator.run(user_input)
-            response_time = time.time() - start_time
-            
             actual_intent = orchestrator._identify_intent(user_input)
             success = (actual_intent == expected_intent)
             
@@ -299,7 +319,7 @@ def run_batch_test(orchestrator: MainOrchestrator, batch_file: str,
             results.append(test_result)
             
             status = "✓" if success else "✗"
-            print(f"{status} 意图: {actual_intent} (预期: {expected_intent}), 耗时: {response_time:.2f}秒")
+            print(f"[测试 {i}] {status} 意图: {actual_intent} (预期: {expected_intent}), 耗时: {response_time:.2f}秒")
             
             if session:
                 session.add_interaction(user_input, result, response_time, actual_intent)
@@ -318,6 +338,7 @@ def run_batch_test(orchestrator: MainOrchestrator, batch_file: str,
         print(f"总测试数: {len(results)}")
         print(f"成功: {success_count} / {len(results)} ({success_count/len(results)*100:.1f}%)")
         print(f"平均响应时间: {avg_time:.2f}秒")
+        print(f"总耗时: {total_time:.2f}秒")
         
         # 保存测试结果
         result_file = f"batch_test_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
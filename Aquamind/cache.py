@@ -0,0 +1,346 @@
+"""
+Aquamind 缓存模块
+提供带有效期的键值缓存，用于复用智能体规划结果和LLM响应，
+文本相同仅数值略有差异时的近似匹配缓存，数值特征向量的近邻匹配缓存，
+并发相同请求的合并（single-flight），以及按秒缓存的时间戳格式化
+
+后端:
+- 安装 diskcache 且 persistent=True 时使用磁盘缓存（跨进程持久化）
+- 未安装 diskcache 且 persistent=True 时使用 sqlite3 文件（标准库，跨进程持久化）
+- 否则使用进程内LRU缓存
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import system_config, CACHE_DIR
+
+try:
+    import diskcache
+    HAS_DISKCACHE = True
+except ImportError:
+    diskcache = None
+    HAS_DISKCACHE = False
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    根据任意可JSON序列化的参数生成缓存键
+
+    Returns:
+        str: blake2b 摘要（32位十六进制）
+    """
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# 时间戳格式 -> (整秒, 格式化结果)
+_TIMESTAMP_CACHE: Dict[str, Tuple[int, str]] = {}
+
+
+def now_str(fmt: str = "%Y-%m-%d %H:%M:%S") -> str:
+    """
+    当前本地时间的格式化字符串（同一秒内的重复调用直接复用结果）
+
+    Args:
+        fmt: strftime 格式，精度不应高于秒
+    """
+    second = int(time.time())
+    cached = _TIMESTAMP_CACHE.get(fmt)
+    if cached is not None and cached[0] == second:
+        return cached[1]
+    text = time.strftime(fmt, time.localtime(second))
+    _TIMESTAMP_CACHE[fmt] = (second, text)
+    return text
+
+
+class ResponseCache:
+    """
+    带有效期的键值缓存
+
+    Args:
+        namespace: 缓存命名空间（磁盘缓存时作为子目录名/数据库文件名）
+        ttl: 有效期（秒），默认使用 system_config.CACHE_TTL
+        max_entries: 进程内缓存的最大条目数
+        persistent: 是否优先使用磁盘缓存
+    """
+
+    SIZE_LIMIT = 1 << 30  # 磁盘缓存上限 1GB
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None,
+                 max_entries: int = 1024, persistent: bool = False):
+        self.namespace = namespace
+        self.ttl = system_config.CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries
+        self.enabled = system_config.ENABLE_CACHE
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._disk = None
+        self._sqlite: Optional[sqlite3.Connection] = None
+        if self.enabled and persistent:
+            if HAS_DISKCACHE:
+                self._disk = diskcache.Cache(
+                    directory=str(CACHE_DIR / namespace),
+                    size_limit=self.SIZE_LIMIT
+                )
+            else:
+                self._sqlite = self._open_sqlite(namespace)
+
+    @staticmethod
+    def _open_sqlite(namespace: str) -> sqlite3.Connection:
+        """打开（或创建）sqlite3 缓存文件"""
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(CACHE_DIR / f"{namespace}.sqlite"), check_same_thread=False)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+        return conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """读取缓存，未命中或已过期时返回 default"""
+        if not self.enabled:
+            return default
+        if self._disk is not None:
+            return self._disk.get(key, default)
+        if self._sqlite is not None:
+            with self._lock:
+                row = self._sqlite.execute(
+                    "SELECT value FROM cache WHERE key = ? AND expires_at >= ?",
+                    (key, time.time())
+                ).fetchone()
+            return pickle.loads(row[0]) if row else default
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._memory[key]
+                return default
+            self._memory.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        """写入缓存"""
+        if not self.enabled:
+            return
+        if self._disk is not None:
+            self._disk.set(key, value, expire=self.ttl)
+            return
+        if self._sqlite is not None:
+            with self._lock:
+                self._sqlite.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, pickle.dumps(value), time.time() + self.ttl)
+                )
+                self._sqlite.commit()
+            return
+
+        with self._lock:
+            self._memory[key] = (time.monotonic() + self.ttl, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        if self._disk is not None:
+            self._disk.clear()
+        with self._lock:
+            if self._sqlite is not None:
+                self._sqlite.execute("DELETE FROM cache")
+                self._sqlite.commit()
+            self._memory.clear()
+
+    def __len__(self) -> int:
+        if self._disk is not None:
+            return len(self._disk)
+        if self._sqlite is not None:
+            with self._lock:
+                return self._sqlite.execute(
+                    "SELECT COUNT(*) FROM cache WHERE expires_at >= ?", (time.time(),)
+                ).fetchone()[0]
+        return len(self._memory)
+
+
+class ApproximateCache:
+    """
+    数值容差近似匹配缓存（进程内）
+
+    文本中的数值被替换为占位符作为模板；模板相同且各数值的相对偏差均不超过
+    rel_tol 时视为命中（如 "毒性2.43" 与 "毒性2.45"）。用于在精确匹配未命中时
+    复用数值相近工况下的LLM响应。
+
+    Args:
+        rel_tol: 数值相对容差
+        ttl: 有效期（秒），默认使用 system_config.CACHE_TTL
+        max_templates: 最多保留的模板数（按最近使用淘汰）
+        max_per_template: 每个模板最多保留的数值组合数（淘汰最早写入者）
+    """
+
+    NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+    def __init__(self, rel_tol: float = 0.02, ttl: Optional[float] = None,
+                 max_templates: int = 256, max_per_template: int = 8):
+        self.rel_tol = rel_tol
+        self.ttl = system_config.CACHE_TTL if ttl is None else ttl
+        self.max_templates = max_templates
+        self.max_per_template = max_per_template
+        self.enabled = system_config.ENABLE_CACHE
+
+        self._lock = threading.Lock()
+        # 模板键 -> [(过期时间, 数值元组, 值)]
+        self._entries: "OrderedDict[str, List[tuple]]" = OrderedDict()
+
+    def _split(self, text: str, extra: tuple) -> Tuple[str, Tuple[float, ...]]:
+        """拆分为模板键（含附加键）与数值元组"""
+        template = self.NUMBER_RE.sub("#", text)
+        numbers = tuple(float(m) for m in self.NUMBER_RE.findall(text))
+        return make_cache_key(template, *extra), numbers
+
+    def get(self, text: str, *extra: Any, default: Any = None) -> Any:
+        """查找数值在容差内的缓存值（extra 为需精确匹配的附加键）"""
+        if not self.enabled:
+            return default
+        key, numbers = self._split(text, extra)
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return default
+            entries[:] = [entry for entry in entries if entry[0] >= now]
+            self._entries.move_to_end(key)
+            for _, cached_numbers, value in reversed(entries):
+                if all(math.isclose(a, b, rel_tol=self.rel_tol)
+                       for a, b in zip(numbers, cached_numbers)):
+                    return value
+            return default
+
+    def set(self, text: str, value: Any, *extra: Any):
+        """写入缓存"""
+        if not self.enabled:
+            return
+        key, numbers = self._split(text, extra)
+        with self._lock:
+            entries = self._entries.setdefault(key, [])
+            entries.append((time.monotonic() + self.ttl, numbers, value))
+            del entries[:-self.max_per_template]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_templates:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+
+class VectorCache:
+    """
+    数值特征向量近邻匹配缓存（进程内）
+
+    查询向量与某条缓存向量在每一维上的差值均不超过对应容差时视为命中，
+    多条命中时取（按容差归一化后）最近的一条。用于输入仅为少量数值、
+    数值相近即可复用结果的场景。
+
+    Args:
+        tolerance: 各维绝对容差
+        ttl: 有效期（秒），默认使用 system_config.CACHE_TTL
+        max_entries: 最大条目数（满后覆盖最早写入者）
+    """
+
+    def __init__(self, tolerance: Any, ttl: Optional[float] = None, max_entries: int = 256):
+        self.tolerance = np.asarray(tolerance, dtype=np.float64)
+        self.ttl = system_config.CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries
+        self.enabled = system_config.ENABLE_CACHE
+
+        self._lock = threading.Lock()
+        # 环形缓冲：向量矩阵（已按容差归一化）、过期时间、附加键、值
+        self._vectors = np.full((max_entries, self.tolerance.shape[0]), np.nan)
+        self._expires = np.full(max_entries, -np.inf)
+        self._extras: List[Optional[str]] = [None] * max_entries
+        self._values: List[Any] = [None] * max_entries
+        self._next = 0
+
+    def get(self, vector: Any, *extra: Any, default: Any = None) -> Any:
+        """查找近邻缓存值（extra 为需精确匹配的附加键）"""
+        if not self.enabled:
+            return default
+        query = np.asarray(vector, dtype=np.float64) / self.tolerance
+        extra_key = make_cache_key(*extra)
+        with self._lock:
+            distance = np.abs(self._vectors - query).max(axis=1)  # NaN（空槽）比较结果为 False
+            candidates = np.flatnonzero((distance <= 1.0) & (self._expires >= time.monotonic()))
+            for i in candidates[np.argsort(distance[candidates])]:
+                if self._extras[i] == extra_key:
+                    return self._values[i]
+        return default
+
+    def set(self, vector: Any, value: Any, *extra: Any):
+        """写入缓存"""
+        if not self.enabled:
+            return
+        row = np.asarray(vector, dtype=np.float64) / self.tolerance
+        with self._lock:
+            i = self._next
+            self._vectors[i] = row
+            self._expires[i] = time.monotonic() + self.ttl
+            self._extras[i] = make_cache_key(*extra)
+            self._values[i] = value
+            self._next = (i + 1) % self.max_entries
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._vectors.fill(np.nan)
+            self._expires.fill(-np.inf)
+            self._extras = [None] * self.max_entries
+            self._values = [None] * self.max_entries
+            self._next = 0
+
+
+class SingleFlight:
+    """
+    并发请求合并（single-flight）
+
+    同一事件循环中相同键的并发请求只执行一次，其余请求等待并共享其结果；
+    请求完成后即移除，不做结果缓存（缓存请配合 ResponseCache 使用）。
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行（或加入进行中的）请求
+
+        Args:
+            key: 请求键，相同键视为相同请求
+            factory: 无参协程函数，实际发起请求
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: 单个调用方被取消时不影响共享同一请求的其他调用方
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
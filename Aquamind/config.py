@@ -17,6 +17,7 @@ DATA_DIR = PROJECT_ROOT / "Data"
 REPORT_DIR = PROJECT_ROOT / "Report"
 LOG_DIR = PROJECT_ROOT / "logs"
 SESSION_DIR = PROJECT_ROOT / "sessions"
+CACHE_DIR = PROJECT_ROOT / ".aquamind_cache"  # 磁盘缓存目录（按需创建）
 
 # 确保目录存在
 for directory in [DATA_DIR, REPORT_DIR, LOG_DIR, SESSION_DIR]:
@@ -44,6 +45,18 @@ class LLMConfig:
     MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
     RETRY_DELAY: float = float(os.getenv("LLM_RETRY_DELAY", "1.0"))  # 秒
     
+    # 显式上下文缓存：为静态系统提示词附加 cache_control 标记（需服务端支持，如 DashScope）
+    ENABLE_PROMPT_CACHE: bool = os.getenv("ENABLE_PROMPT_CACHE", "False").lower() == "true"
+    
+    # 低延迟推理：按服务商附加低延迟请求参数（DashScope 关闭联网搜索与思考模式，Bedrock 延迟优化配置）
+    LATENCY_MODE: bool = os.getenv("AQUAMIND_LATENCY_MODE", "False").lower() == "true"
+    
+    # 各智能体共享的HTTP连接池大小
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32"))
+    
+    # 批量异步调用（arun_many 等）的最大并发请求数，受服务端限流约束
+    MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    
     @classmethod
     def validate(cls) -> bool:
         """验证配置是否完整"""
@@ -62,6 +75,7 @@ class SystemConfig:
     DEBUG_MODE: bool = os.getenv("DEBUG_MODE", "False").lower() == "true"
     ENABLE_CACHE: bool = os.getenv("ENABLE_CACHE", "True").lower() == "true"
     CACHE_TTL: int = int(os.getenv("CACHE_TTL", "300"))  # 缓存有效期（秒）
+    PLAN_CACHE_TTL: int = int(os.getenv("PLAN_CACHE_TTL", "3600"))  # 协调器规划结果缓存有效期（秒）
     
     # 并发配置
     MAX_CONCURRENT_AGENTS: int = int(os.getenv("MAX_CONCURRENT_AGENTS", "5"))
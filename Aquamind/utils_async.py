@@ -0,0 +1,31 @@
+"""
+异步辅助工具
+各智能体同步接口（run 等）执行其异步实现（arun 等）的统一入口
+
+说明:
+- 调用方不在事件循环中时直接 asyncio.run
+- 调用方已处于事件循环中（Jupyter、Web 框架处理函数等）时无法嵌套 asyncio.run，
+  改在工作线程中用新的事件循环执行并阻塞等待结果，行为与同步实现一致
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    同步执行协程并返回结果（协程内的异常原样抛出）
+
+    Args:
+        coro: 待执行的协程对象
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="run-sync") as executor:
+        return executor.submit(asyncio.run, coro).result()
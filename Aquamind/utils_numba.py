@@ -0,0 +1,168 @@
+"""
+数值计算内核
+批量控制计算使用的数值内核，安装 numba 时自动JIT编译
+
+说明:
+- 内核均以显式循环编写，numba 可编译为机器码
+- 未安装 numba 时回退为普通 Python 函数，结果一致
+- 标量路径请继续使用各智能体的原有方法，避免JIT调度开销
+"""
+
+import math
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """numba 不可用时的空装饰器"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True)
+def fallback_turntable_batch(toxicity: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量计算转盘回退控制参数
+
+    Returns:
+        (频率数组 Hz, 活跃反应器数量数组)
+    """
+    n = toxicity.shape[0]
+    frequency = np.empty(n, dtype=np.float64)
+    reactors = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        tox = toxicity[i]
+        if tox > 3.0:
+            frequency[i] = 40.0
+            reactors[i] = 3
+        elif tox > 1.5:
+            frequency[i] = 25.0
+            reactors[i] = 2
+        else:
+            frequency[i] = 10.0
+            reactors[i] = 2
+    return frequency, reactors
+
+
+@njit(cache=True)
+def fallback_mbr_batch(tmp: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    批量计算MBR回退控制参数
+
+    Returns:
+        (曝气量数组 m³/h, 通量设定数组 LMH, 反洗标志数组)
+    """
+    n = tmp.shape[0]
+    aeration = np.empty(n, dtype=np.float64)
+    flux = np.empty(n, dtype=np.float64)
+    backwash = np.empty(n, dtype=np.bool_)
+    for i in range(n):
+        value = tmp[i]
+        if value > 30.0:
+            aeration[i] = 70.0
+            flux[i] = 15.0
+        elif value > 20.0:
+            aeration[i] = 55.0
+            flux[i] = 18.0
+        else:
+            aeration[i] = 50.0
+            flux[i] = 20.0
+        backwash[i] = value > 30.0
+    return aeration, flux, backwash
+
+
+@njit(cache=True)
+def fallback_regeneration_batch(efficiency: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    批量计算再生回退控制参数
+
+    Returns:
+        (再生需求标志数组, 炉温数组 °C, 进料速度数组 kg/h)
+    """
+    n = efficiency.shape[0]
+    need_regen = np.empty(n, dtype=np.bool_)
+    temperature = np.empty(n, dtype=np.float64)
+    feed_rate = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        if efficiency[i] < 70.0:
+            need_regen[i] = True
+            temperature[i] = 800.0
+            feed_rate[i] = 30.0
+        else:
+            need_regen[i] = False
+            temperature[i] = 0.0
+            feed_rate[i] = 0.0
+    return need_regen, temperature, feed_rate
+
+
+
+@njit(cache=True)
+def mbr_control_batch(tmp: np.ndarray, aeration: np.ndarray, design_flux: float,
+                      tmp_warning: float, tmp_alarm: float):
+    """
+    批量计算MBR污染状态与控制参数（与 MBRAgent 标量决策规则一致）
+
+    Returns:
+        (污染状态码数组 0正常/1关注/2预警/3严重（即报警等级）,
+         曝气量数组 m³/h, 通量设定数组 LMH, 反洗标志数组, 化学清洗标志数组)
+    """
+    n = tmp.shape[0]
+    status = np.empty(n, dtype=np.int8)
+    aeration_rate = np.empty(n, dtype=np.float64)
+    flux = np.empty(n, dtype=np.float64)
+    backwash = np.empty(n, dtype=np.bool_)
+    chemical_clean = np.empty(n, dtype=np.bool_)
+    for i in range(n):
+        value = tmp[i]
+        if value >= tmp_alarm:
+            status[i] = 3
+            aeration_rate[i] = aeration[i] * 1.5
+            flux[i] = 0.0
+            backwash[i] = True
+            chemical_clean[i] = True
+        elif value >= tmp_warning:
+            status[i] = 2
+            aeration_rate[i] = aeration[i] * 1.2
+            flux[i] = design_flux * 0.75
+            backwash[i] = True
+            chemical_clean[i] = False
+        elif value >= tmp_warning * 0.8:
+            status[i] = 1
+            aeration_rate[i] = aeration[i] * 1.1
+            flux[i] = design_flux * 0.9
+            backwash[i] = False
+            chemical_clean[i] = False
+        else:
+            status[i] = 0
+            aeration_rate[i] = aeration[i]
+            flux[i] = design_flux
+            backwash[i] = False
+            chemical_clean[i] = False
+    return status, aeration_rate, flux, backwash, chemical_clean
+
+
+@njit(cache=True)
+def turntable_removal_rate_batch(frequency: np.ndarray, toxicity: np.ndarray,
+                                 rpm_per_hz: float) -> np.ndarray:
+    """
+    批量计算转盘预期去除率（与 TurntableAgent._removal_rate 一致）
+
+    Returns:
+        预期去除率数组 (%)
+    """
+    n = frequency.shape[0]
+    removal = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        k = 0.05 * (1 + frequency[i] * rpm_per_hz / 1000)
+        value = (1 - math.exp(-k * 15.0)) * 100
+        if toxicity[i] > 3.0:
+            value *= 0.9
+        removal[i] = min(95.0, max(30.0, value))
+    return removal
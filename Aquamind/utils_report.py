@@ -0,0 +1,71 @@
+"""
+报告写盘工具
+各总控智能体共用的报告保存入口，报告在后台线程写入 Report 目录
+
+说明:
+- 单线程写盘保证按提交顺序写入，提交后立即返回报告路径，不阻塞请求
+- 文件名精确到微秒，并发请求（如批量测试）在同一秒内生成的报告互不覆盖
+- 写入失败时记录错误日志（否则异常随 Future 丢失）
+"""
+
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Report")
+
+
+class ReportWriter:
+    """报告后台写盘"""
+
+    def __init__(self, report_dir: str = REPORT_DIR):
+        """
+        Args:
+            report_dir: 报告保存目录（首次写入时创建）
+        """
+        self.report_dir = report_dir
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-writer")
+        self._dir_ready = False
+
+    def submit(self, report: str) -> str:
+        """
+        提交报告写盘
+
+        Args:
+            report: 报告内容
+
+        Returns:
+            str: 报告文件路径
+        """
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        report_path = os.path.join(self.report_dir, f"Report_{timestamp}.md")
+        future = self._executor.submit(self._write, report_path, report)
+        future.add_done_callback(lambda f: self._check_written(report_path, f))
+        return report_path
+
+    def _write(self, report_path: str, report: str):
+        """写入报告文件（在后台线程中执行，报告目录只在首次写入时创建）"""
+        if not self._dir_ready:
+            os.makedirs(self.report_dir, exist_ok=True)
+            self._dir_ready = True
+
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(report)
+
+    @staticmethod
+    def _check_written(report_path: str, future: Future):
+        """后台写盘完成回调：写入失败时记录错误"""
+        error = future.exception()
+        if error is not None:
+            logger.error(f"报告保存失败: {report_path} - {error}")
+
+
+@lru_cache(maxsize=1)
+def get_report_writer() -> ReportWriter:
+    """获取各总控智能体共享的报告写盘器"""
+    return ReportWriter()